@@ -3,8 +3,12 @@ import os
 import logging
 import json
 from fastapi import APIRouter, HTTPException
-from openai import OpenAI
 from schemas.agent import ConversationalRequest, AgentResponse
+from llm import gateway as llm_gateway
+from llm.resilience import UpstreamUnavailableError
+from agents import slot_filling
+from agents.history import compactor as history_compactor
+from llm import metrics as llm_metrics
 from dotenv import load_dotenv
 
 # --- Setup ---
@@ -12,6 +16,9 @@ load_dotenv()
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Answer routine slot-filling turns locally and only call the LLM for ambiguous or free-form ones.
+SLOT_FILLING_ENABLED = os.getenv("CONVERSATIONAL_SLOT_FILLING", "true").lower() in ("1", "true", "yes")
+
 # --- Conversational Agent Endpoint ---
 @router.post("/", response_model=AgentResponse)
 async def run_conversational_agent(request: ConversationalRequest):
@@ -19,11 +26,16 @@ async def run_conversational_agent(request: ConversationalRequest):
     Manages the conversational flow, gathering details before itinerary generation.
     """
     logger.info(f"Conversational Agent received messages: {request.messages}")
-    try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    if SLOT_FILLING_ENABLED:
+        local_reply = slot_filling.next_reply(request.messages)
+        if local_reply is not None:
+            logger.info(f"Conversational Agent answered locally: {local_reply}")
+            llm_metrics.LOCAL_ANSWERS.inc(agent="conversational")
+            return {"response": local_reply}
 
-        # Create a string representation of the chat history
-        chat_history = "\n".join([f"{msg.sender}: {msg.content}" for msg in request.messages])
+    try:
+        # Recent turns verbatim plus a rolling summary of older ones, within the token budget
+        chat_history = await history_compactor.build(request.messages, request.session_id)
 
         # This detailed prompt turns the AI into a state machine.
         # It analyzes the history and determines what to ask next.
@@ -47,7 +59,8 @@ async def run_conversational_agent(request: ConversationalRequest):
         What is the very next thing you should say?
         """
 
-        response = client.chat.completions.create(
+        response = await llm_gateway.chat_completion(
+            "conversational",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a helpful travel planning assistant."},
@@ -61,6 +74,9 @@ async def run_conversational_agent(request: ConversationalRequest):
         # The schema expects a 'response' field, so we wrap it correctly.
         return {"response": follow_up_question}
 
+    except UpstreamUnavailableError as e:
+        logger.warning(f"Conversational Agent upstream unavailable: {e}")
+        raise e.to_http_exception()
     except Exception as e:
         logger.error(f"Error in Conversational Agent: {e}")
         raise HTTPException(status_code=500, detail="Error in conversational agent.")
@@ -1,8 +1,16 @@
 # File: backend/agents/emotional.py
 from fastapi import APIRouter, HTTPException
 from schemas.agent import AgentRequest, MoodResponse
-from openai import AsyncOpenAI
+from llm import gateway as llm_gateway
+from llm.resilience import UpstreamUnavailableError
+from llm.batching import MicroBatcher
+from agents import mood_classifier
+from llm import metrics as llm_metrics
+from typing import List, Union
+import asyncio
 import logging
+import json
+import os
 
 router = APIRouter()
 
@@ -31,33 +39,142 @@ Then, suggest a UI accent color that reflects this mood. The color should be a h
 Respond with a JSON object containing two keys: "mood" and "color_suggestion".
 """
 
+BATCH_PROMPT_SUFFIX = """
+You will receive several numbered texts, one per line, each encoded as a JSON string.
+Classify each text independently.
+Respond with a JSON object with a single key "results": an array containing one object per text,
+each with the keys "index" (the text's number), "mood" and "color_suggestion".
+"""
+
+# --- Micro-batching ---
+# Off by default. When enabled, requests arriving within EMOTIONAL_BATCH_WINDOW_MS of each other
+# are classified together in a single completion.
+BATCHING_ENABLED = os.getenv("EMOTIONAL_BATCHING", "false").lower() in ("1", "true", "yes")
+BATCH_WINDOW_MS = float(os.getenv("EMOTIONAL_BATCH_WINDOW_MS", "15"))
+BATCH_MAX_SIZE = int(os.getenv("EMOTIONAL_BATCH_MAX_SIZE", "16"))
+
+
+async def classify_mood(text: str) -> MoodResponse:
+    """Classifies one text with its own completion."""
+    response = await llm_gateway.chat_completion(
+        "emotional",
+        coalesce_on=text,
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": EMOTIONAL_AGENT_PROMPT},
+            {"role": "user", "content": text},
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.2,
+    )
+
+    mood_data = response.choices[0].message.content
+    logger.info(f"Emotional Agent received OpenAI response: {mood_data}")
+
+    # The response is a JSON string, so we directly model_validate it.
+    return MoodResponse.model_validate_json(mood_data)
+
+
+async def classify_mood_batch(texts: List[str]) -> List[Union[MoodResponse, Exception]]:
+    """
+    Classifies several texts in one JSON-mode completion. Texts the model
+    skipped or answered malformed are retried individually.
+    """
+    if len(texts) == 1:
+        return [await classify_mood(texts[0])]
+
+    numbered_texts = "\n".join(f"{i}: {json.dumps(text)}" for i, text in enumerate(texts))
+    response = await llm_gateway.chat_completion(
+        "emotional",
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": EMOTIONAL_AGENT_PROMPT + BATCH_PROMPT_SUFFIX},
+            {"role": "user", "content": numbered_texts},
+        ],
+        response_format={"type": "json_object"},
+        temperature=0.2,
+    )
+    batch_data = json.loads(response.choices[0].message.content or "{}")
+    logger.info(f"Emotional Agent classified a batch of {len(texts)} texts")
+
+    results: List[Union[MoodResponse, Exception, None]] = [None] * len(texts)
+    for item in batch_data.get("results", []):
+        try:
+            index = int(item["index"])
+            if 0 <= index < len(texts):
+                results[index] = MoodResponse.model_validate(item)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Ignoring malformed batch mood result {item!r}: {e}")
+
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        logger.warning(f"Emotional batch missed {len(missing)} of {len(texts)} texts; classifying them individually")
+        retried = await asyncio.gather(*(classify_mood(texts[i]) for i in missing), return_exceptions=True)
+        for i, result in zip(missing, retried):
+            results[i] = result
+    return results
+
+
+# --- Local Fast Path ---
+# Texts the lexicon classifier scores at or above this confidence skip the LLM entirely.
+LOCAL_CLASSIFIER_ENABLED = os.getenv("EMOTIONAL_LOCAL_CLASSIFIER", "true").lower() in ("1", "true", "yes")
+LOCAL_CONFIDENCE_THRESHOLD = float(os.getenv("EMOTIONAL_CONFIDENCE_THRESHOLD", "0.55"))
+local_stats = {"local": 0, "llm_fallback": 0}
+
+
+mood_batcher = MicroBatcher(
+    "emotional",
+    classify_mood_batch,
+    window=BATCH_WINDOW_MS / 1000,
+    max_batch_size=BATCH_MAX_SIZE,
+) if BATCHING_ENABLED else None
+
+
 @router.post("/", response_model=MoodResponse)
 async def run_emotional_agent(request: AgentRequest):
     """
     Detects the emotional tone of the user's input and suggests a responsive UI color.
     """
     logger.info(f"Emotional Agent received prompt: {request.prompt}")
+    mood = None
     try:
-        # Initialize client inside the endpoint
-        client = AsyncOpenAI()
-
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": EMOTIONAL_AGENT_PROMPT},
-                {"role": "user", "content": request.prompt},
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.2,
-        )
-        
-        mood_data = response.choices[0].message.content
-        logger.info(f"Emotional Agent received OpenAI response: {mood_data}")
-
-        # The response is a JSON string, so we directly model_validate it.
-        return MoodResponse.model_validate_json(mood_data)
+        if LOCAL_CLASSIFIER_ENABLED and request.prompt:
+            mood, confidence = mood_classifier.get_classifier().classify(request.prompt)
+            if confidence >= LOCAL_CONFIDENCE_THRESHOLD:
+                local_stats["local"] += 1
+                llm_metrics.LOCAL_ANSWERS.inc(agent="emotional")
+                logger.info(f"Emotional Agent classified locally as {mood.mood} (confidence {confidence:.2f})")
+                return mood
+            local_stats["llm_fallback"] += 1
+
+        if mood_batcher is not None:
+            return await mood_batcher.submit(request.prompt)
+        return await classify_mood(request.prompt)
 
+    except UpstreamUnavailableError as e:
+        if mood is not None:
+            # A low-confidence local answer beats an error while the LLM is unavailable.
+            logger.warning(f"Emotional Agent upstream unavailable, using local classification: {e}")
+            return mood
+        raise e.to_http_exception()
     except Exception as e:
         logger.error(f"Error in Emotional Agent: {e}")
         raise HTTPException(status_code=500, detail="Failed to analyze mood from Emotional Agent.")
 
+
+@router.get("/local/stats")
+async def get_local_classifier_stats():
+    """Returns how many requests the local classifier answered versus sent to the LLM."""
+    return {
+        "enabled": LOCAL_CLASSIFIER_ENABLED,
+        "confidence_threshold": LOCAL_CONFIDENCE_THRESHOLD,
+        **local_stats,
+    }
+
+
+@router.get("/batch/stats")
+async def get_mood_batch_stats():
+    """Returns micro-batching counters, or {"enabled": false} when batching is off."""
+    if mood_batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **mood_batcher.stats()}
@@ -0,0 +1,274 @@
+# File: backend/agents/gazetteer.py
+import os
+import re
+import csv
+import logging
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), "data", "swiss_gazetteer.tsv")
+
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+# Places kept per trie node; autocomplete never returns more than this.
+MAX_SUGGESTIONS = 10
+# A match at the start of a name ranks above one at a later word
+# ("lu" -> Lucerne and Lugano before Lake Lucerne).
+NAME_START_BONUS = 1000
+# Resolving a name on its own only accepts a fuzzy match that spans the whole
+# alias: the same number of words, and either trigram (Dice) similarity of at
+# least RESOLVE_MIN_SIMILARITY at a similar length or a few typos (see
+# _max_typos). Anything looser ("Hotel Zurich", "Bahnhofstrasse 10 Zurich") is
+# left to the geocode cache and Mapbox. Autocomplete suggestions are looser.
+RESOLVE_MIN_SIMILARITY = float(os.getenv("GAZETTEER_MIN_SIMILARITY", "0.85"))
+RESOLVE_MIN_LENGTH_RATIO = 0.85
+RESOLVE_CANDIDATES = 10
+SUGGEST_MIN_SIMILARITY = 0.3
+# Shorter aliases (airport codes such as "sir" or "lai") are common words in free text.
+MENTION_MIN_ALIAS_LENGTH = 4
+MENTION_MAX_WORDS = 4
+
+
+def normalize_name(text: str) -> str:
+    """Folds case, accents and punctuation: "St. Moritz" -> "st moritz", "Zürich" -> "zurich"."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower().replace("'", "").replace("’", "")
+    return _NON_ALNUM_RE.sub(" ", text).strip()
+
+
+def _trigrams(normalized: str) -> List[str]:
+    padded = f"  {normalized} "
+    return sorted({padded[i:i + 3] for i in range(len(padded) - 2)})
+
+
+def _max_typos(length: int) -> int:
+    # Short names differ from other places by a single letter ("bern"/"berg").
+    return 0 if length < 5 else 1 if length < 9 else 2
+
+
+def _typo_distance(a: str, b: str) -> int:
+    """Edit distance counting insertions, deletions, substitutions and adjacent transpositions."""
+    previous2: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class Gazetteer:
+    """
+    Offline index of Swiss places for resolving and autocompleting names.
+
+    Places live in parallel arrays (names, kinds, cantons, an N x 2 float
+    coordinate array and ranks). Every alias is normalized and indexed twice:
+
+    * a prefix trie over each word-start suffix of the alias, where every
+      node stores its best places (name-start matches first, then by rank),
+      so autocomplete is a walk of len(prefix) nodes plus a slice;
+    * a trigram index (trigram -> alias ids) for typo-tolerant lookups,
+      scored as Dice similarity with one bincount over the postings.
+    """
+
+    def __init__(self, rows: List[Dict[str, str]]):
+        self.names: List[str] = []
+        self.kinds: List[str] = []
+        self.cantons: List[str] = []
+        self.coordinates = np.zeros((len(rows), 2), dtype=np.float64)
+        self.ranks = np.zeros(len(rows), dtype=np.int32)
+
+        alias_texts: List[str] = []
+        alias_places: List[int] = []
+        self._exact: Dict[str, int] = {}
+        for place_id, row in enumerate(rows):
+            self.names.append(row["name"])
+            self.kinds.append(row["kind"])
+            self.cantons.append(row.get("canton") or "")
+            self.coordinates[place_id] = (float(row["longitude"]), float(row["latitude"]))
+            self.ranks[place_id] = int(row["rank"])
+            aliases = [row["name"]] + [a for a in (row.get("aliases") or "").split("|") if a.strip()]
+            for alias in dict.fromkeys(normalize_name(a) for a in aliases):
+                if not alias:
+                    continue
+                alias_texts.append(alias)
+                alias_places.append(place_id)
+                current = self._exact.get(alias)
+                if current is None or self.ranks[place_id] > self.ranks[current]:
+                    self._exact[alias] = place_id
+
+        self.alias_texts = alias_texts
+        self.alias_places = np.array(alias_places, dtype=np.int32)
+        self._build_trie()
+        self._build_trigrams()
+
+    @classmethod
+    def from_file(cls, path: str = GAZETTEER_PATH) -> "Gazetteer":
+        with open(path, encoding="utf-8", newline="") as f:
+            reader = csv.DictReader((line for line in f if not line.startswith("#")), delimiter="\t")
+            rows = list(reader)
+        gazetteer = cls(rows)
+        logger.info(f"Loaded gazetteer with {len(gazetteer.names)} places and {len(gazetteer.alias_texts)} aliases from {path}")
+        return gazetteer
+
+    # --- Index Construction ---
+
+    def _build_trie(self):
+        self._children: List[Dict[str, int]] = [{}]
+        candidates: List[Dict[int, int]] = [{}]
+        for alias, place_id in zip(self.alias_texts, self.alias_places.tolist()):
+            starts = [0] + [m.end() for m in re.finditer(" ", alias)]
+            for start in starts:
+                priority = int(self.ranks[place_id]) + (NAME_START_BONUS if start == 0 else 0)
+                node = 0
+                for ch in alias[start:]:
+                    child = self._children[node].get(ch)
+                    if child is None:
+                        child = len(self._children)
+                        self._children[node][ch] = child
+                        self._children.append({})
+                        candidates.append({})
+                    node = child
+                    if priority > candidates[node].get(place_id, -1):
+                        candidates[node][place_id] = priority
+        # Keep only each node's best places, already in result order.
+        self._top: List[np.ndarray] = [
+            np.array(sorted(best, key=lambda p: (-best[p], self.names[p]))[:MAX_SUGGESTIONS], dtype=np.int32)
+            for best in candidates
+        ]
+
+    def _build_trigrams(self):
+        postings: Dict[str, List[int]] = {}
+        counts = np.zeros(len(self.alias_texts), dtype=np.int32)
+        for alias_id, alias in enumerate(self.alias_texts):
+            grams = _trigrams(alias)
+            counts[alias_id] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(alias_id)
+        self._postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self._gram_counts = counts
+
+    # --- Lookups ---
+
+    def _prefix(self, normalized: str) -> np.ndarray:
+        node = 0
+        for ch in normalized:
+            node = self._children[node].get(ch)
+            if node is None:
+                return np.empty(0, dtype=np.int32)
+        return self._top[node]
+
+    def _alias_similarity(self, normalized: str) -> Optional[np.ndarray]:
+        """Trigram (Dice) similarity of the text to every alias, or None when no trigram is shared."""
+        grams = _trigrams(normalized)
+        postings = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not postings:
+            return None
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.alias_texts))
+        return 2.0 * shared / (len(grams) + self._gram_counts)
+
+    def similar(self, normalized: str, min_similarity: float, limit: int) -> List[Tuple[int, float]]:
+        """(place_id, similarity) of the places whose best alias is trigram-similar to the text."""
+        similarity = self._alias_similarity(normalized)
+        if similarity is None:
+            return []
+        best = np.zeros(len(self.names), dtype=np.float64)
+        np.maximum.at(best, self.alias_places, similarity)
+        matches = np.flatnonzero(best >= min_similarity)
+        order = np.lexsort((-self.ranks[matches], -best[matches]))[:limit]
+        return [(int(matches[i]), float(best[matches[i]])) for i in order]
+
+    def _whole_name_match(self, normalized: str) -> Optional[Tuple[int, float]]:
+        """(place_id, similarity) of an alias the text misspells as a whole, if any."""
+        similarity = self._alias_similarity(normalized)
+        if similarity is None:
+            return None
+        candidates = np.flatnonzero(similarity >= SUGGEST_MIN_SIMILARITY)
+        candidates = candidates[np.argsort(-similarity[candidates], kind="stable")][:RESOLVE_CANDIDATES]
+        words = len(normalized.split())
+        best: Optional[Tuple[int, float]] = None
+        for alias_id in candidates.tolist():
+            alias = self.alias_texts[alias_id]
+            # Extra or missing words mean the text names something else (a hotel, a street).
+            if len(alias.split()) != words:
+                continue
+            length_ratio = min(len(alias), len(normalized)) / max(len(alias), len(normalized))
+            close = similarity[alias_id] >= RESOLVE_MIN_SIMILARITY and length_ratio >= RESOLVE_MIN_LENGTH_RATIO
+            if not close and _typo_distance(normalized, alias) > _max_typos(min(len(alias), len(normalized))):
+                continue
+            place_id = int(self.alias_places[alias_id])
+            score = float(similarity[alias_id])
+            if best is None or (score, self.ranks[place_id]) > (best[1], self.ranks[best[0]]):
+                best = (place_id, score)
+        return best
+
+    def resolve(self, place_name: str) -> Optional[Dict[str, Any]]:
+        """
+        The place a free-text name refers to: an exact (normalized) alias, or
+        a misspelling of a whole alias. Returns None for anything else, e.g.
+        addresses or businesses that merely contain a place name.
+        """
+        normalized = normalize_name(place_name)
+        if not normalized:
+            return None
+        place_id = self._exact.get(normalized)
+        if place_id is not None:
+            return self._place(place_id, "exact", 1.0)
+        match = self._whole_name_match(normalized)
+        if match is not None:
+            return self._place(match[0], "fuzzy", match[1])
+        return None
+
+    def mentions(self, text: str) -> List[int]:
+        """Ids of the places named in free text, by whole alias ("a week in st. moritz" -> St. Moritz)."""
+        words = normalize_name(text).split()
+        found: List[int] = []
+        for size in range(min(MENTION_MAX_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                phrase = " ".join(words[start:start + size])
+                place_id = self._exact.get(phrase) if len(phrase) >= MENTION_MIN_ALIAS_LENGTH else None
+                if place_id is not None and place_id not in found:
+                    found.append(place_id)
+        return found
+
+    def autocomplete(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Ranked suggestions: prefix matches first, topped up with typo-tolerant matches."""
+        normalized = normalize_name(query)
+        if not normalized:
+            return []
+        limit = max(1, min(limit, MAX_SUGGESTIONS))
+        results = [self._place(int(p), "prefix", 1.0) for p in self._prefix(normalized)[:limit]]
+        if len(results) < limit and len(normalized) >= 3:
+            seen = {result["id"] for result in results}
+            for place_id, similarity in self.similar(normalized, SUGGEST_MIN_SIMILARITY, limit):
+                if place_id not in seen and len(results) < limit:
+                    results.append(self._place(place_id, "fuzzy", similarity))
+        return results
+
+    def _place(self, place_id: int, match: str, score: float) -> Dict[str, Any]:
+        return {
+            "id": place_id,
+            "name": self.names[place_id],
+            "kind": self.kinds[place_id],
+            "canton": self.cantons[place_id] or None,
+            "coordinates": self.coordinates[place_id].tolist(),
+            "match": match,
+            "score": round(score, 3),
+        }
+
+
+_gazetteer: Optional[Gazetteer] = None
+
+
+def get_gazetteer() -> Gazetteer:
+    """Returns the shared gazetteer, loading the data file on first use."""
+    global _gazetteer
+    if _gazetteer is None:
+        _gazetteer = Gazetteer.from_file()
+    return _gazetteer
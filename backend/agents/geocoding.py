@@ -0,0 +1,57 @@
+# File: backend/agents/geocoding.py
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from auth.database import SessionLocal
+from llm import cache as llm_cache
+
+logger = logging.getLogger(__name__)
+
+# Bump when the stored value format or the geocoding parameters change.
+GEOCODE_CACHE_NAMESPACE = "geocode:v1:CH"
+
+# Place coordinates hardly ever change; keep them for 30 days in memory and on disk.
+geocode_cache = llm_cache.build_cache("geocode", default_ttl=30 * 24 * 3600, default_max_entries=4096, default_backend="disk")
+
+
+def cache_key(place_name: str) -> str:
+    """Case, accent and punctuation-insensitive key ("Zürich HB" == "zurich hb")."""
+    return llm_cache.make_key(GEOCODE_CACHE_NAMESPACE, place_name)
+
+
+async def lookup(place_name: str) -> Optional[List[float]]:
+    entry = await geocode_cache.get(cache_key(place_name))
+    return entry["coordinates"] if entry else None
+
+
+async def store(place_name: str, coordinates: List[float], source: str = "mapbox"):
+    await geocode_cache.set(cache_key(place_name), {"coordinates": coordinates, "source": source})
+
+# --- Pre-warming ---
+
+def _load_destinations() -> List[Dict[str, Any]]:
+    # services.models uses package-relative imports, so read the table directly.
+    db = SessionLocal()
+    try:
+        rows = db.execute(text(
+            "SELECT name, longitude, latitude FROM destinations "
+            "WHERE longitude IS NOT NULL AND latitude IS NOT NULL"
+        )).mappings().all()
+        return [dict(row) for row in rows]
+    finally:
+        db.close()
+
+
+async def warm_from_destinations() -> int:
+    """Seeds the cache with every destination that has coordinates. Returns the number seeded."""
+    try:
+        destinations = await asyncio.to_thread(_load_destinations)
+    except SQLAlchemyError as e:
+        logger.warning(f"Could not pre-warm the geocode cache from destinations: {e}")
+        return 0
+    for destination in destinations:
+        await store(destination["name"], [destination["longitude"], destination["latitude"]], source="destinations")
+    logger.info(f"Geocode cache pre-warmed with {len(destinations)} destinations")
+    return len(destinations)
@@ -0,0 +1,188 @@
+# File: backend/agents/history.py
+import os
+import re
+import math
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from auth.database import SessionLocal
+from chat import models as chat_models
+from llm import gateway as llm_gateway
+from schemas.agent import Message
+
+logger = logging.getLogger(__name__)
+
+KEEP_LAST_TURNS = int(os.getenv("CONVERSATIONAL_KEEP_LAST_TURNS", "6"))
+HISTORY_TOKEN_BUDGET = int(os.getenv("CONVERSATIONAL_HISTORY_TOKEN_BUDGET", "1200"))
+# Share of the budget the summary may use before recent turns are trimmed instead.
+SUMMARY_BUDGET_SHARE = 0.4
+MESSAGE_OVERHEAD_TOKENS = 4
+EXTRACT_MAX_CHARS = 160
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a travel-planning chat between a user and a Swiss travel concierge.
+Update the existing summary with the new messages. Keep every concrete detail the concierge needs:
+destinations, trip style, number of travelers, dates, flight status, budget, preferences and requested changes.
+Write at most 120 words of plain text. Respond with the updated summary only.
+"""
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap local token estimate for English chat text, without a tokenizer.
+
+    Takes the larger of the ~4 characters-per-token rule and a word/punctuation
+    count scaled for sub-word splits, which keeps short, punctuation-heavy
+    messages from being underestimated.
+    """
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / 4), math.ceil(len(_WORD_RE.findall(text)) * 0.75))
+
+
+def format_message(message: Message) -> str:
+    return f"{message.sender}: {message.content}"
+
+
+def _message_tokens(message: Message) -> int:
+    return estimate_tokens(format_message(message)) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _extract(messages: List[Message]) -> str:
+    """Local stand-in for turns not yet folded into the stored summary: the start of each message."""
+    lines = []
+    for message in messages:
+        content = " ".join(message.content.split())
+        if len(content) > EXTRACT_MAX_CHARS:
+            content = content[:EXTRACT_MAX_CHARS].rsplit(" ", 1)[0] + "..."
+        lines.append(f"{message.sender}: {content}")
+    return "\n".join(lines)
+
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    """Keeps the most recent part of `text` that fits in `budget` tokens."""
+    if estimate_tokens(text) <= budget:
+        return text
+    lines = text.splitlines()
+    kept: List[str] = []
+    used = 0
+    for line in reversed(lines):
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(reversed(kept))
+
+# --- Summary Storage ---
+
+def _load_summary(session_id: int) -> Tuple[Optional[str], int]:
+    db = SessionLocal()
+    try:
+        session = db.query(chat_models.ChatSession).filter(chat_models.ChatSession.id == session_id).first()
+        if not session:
+            return None, 0
+        return session.history_summary, session.history_summary_count or 0
+    finally:
+        db.close()
+
+
+def _store_summary(session_id: int, summary: str, count: int):
+    db = SessionLocal()
+    try:
+        db.query(chat_models.ChatSession).filter(chat_models.ChatSession.id == session_id).update(
+            {"history_summary": summary, "history_summary_count": count}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+class HistoryCompactor:
+    """
+    Builds the chat-history block for the conversational prompt within a token budget.
+
+    The last `keep_last` messages are kept verbatim. Older messages are
+    represented by a rolling summary stored on the chat session. The
+    summary is updated with an LLM call in the background after the
+    response, so the request path never waits for it. Older messages the
+    stored summary does not cover yet are shown as short extracts until
+    the background update lands.
+    """
+
+    def __init__(self, keep_last: int = KEEP_LAST_TURNS, token_budget: int = HISTORY_TOKEN_BUDGET):
+        self.keep_last = max(1, keep_last)
+        self.token_budget = token_budget
+        self._refreshing: set = set()
+        self._tasks: set = set()
+
+    async def build(self, messages: List[Message], session_id: Optional[int] = None) -> str:
+        older, recent = messages[:-self.keep_last], messages[-self.keep_last:]
+
+        summary, covered = None, 0
+        if older and session_id:
+            summary, covered = await asyncio.to_thread(_load_summary, session_id)
+            if covered > len(older):
+                # The history was edited or belongs to another conversation; ignore the stored summary.
+                summary, covered = None, 0
+        uncovered = older[covered:]
+
+        summary_parts = [part for part in (summary, _extract(uncovered) if uncovered else None) if part]
+        summary_text = "\n".join(summary_parts)
+
+        # Drop the oldest verbatim turns (always keeping the last one) until they fit the budget.
+        summary_budget = int(self.token_budget * SUMMARY_BUDGET_SHARE) if summary_text else 0
+        recent_budget = self.token_budget - min(summary_budget, estimate_tokens(summary_text))
+        while len(recent) > 1 and sum(_message_tokens(m) for m in recent) > recent_budget:
+            summary_text = "\n".join(filter(None, [summary_text, _extract(recent[:1])]))
+            recent = recent[1:]
+        summary_text = _truncate_to_tokens(summary_text, max(0, self.token_budget - sum(_message_tokens(m) for m in recent)))
+
+        if uncovered and session_id:
+            self._schedule_refresh(session_id, summary, older, covered)
+
+        sections = []
+        if summary_text:
+            sections.append(f"Summary of earlier conversation:\n{summary_text}")
+        sections.append("\n".join(format_message(m) for m in recent))
+        return "\n\n".join(sections)
+
+    def _schedule_refresh(self, session_id: int, summary: Optional[str], older: List[Message], covered: int):
+        if session_id in self._refreshing:
+            return
+        self._refreshing.add(session_id)
+        task = asyncio.ensure_future(self._refresh(session_id, summary, older[covered:], len(older)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, session_id: int, summary: Optional[str], new_messages: List[Message], count: int):
+        try:
+            new_text = "\n".join(format_message(m) for m in new_messages)
+            response = await llm_gateway.chat_completion(
+                "conversational_summary",
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{new_text}"},
+                ],
+                temperature=0.2,
+                max_tokens=200,
+            )
+            updated = (response.choices[0].message.content or "").strip()
+            if updated:
+                await asyncio.to_thread(_store_summary, session_id, updated, count)
+                logger.info(f"Updated history summary for session {session_id} through message {count}")
+        except Exception as e:
+            logger.warning(f"Could not update history summary for session {session_id}: {e}")
+        finally:
+            self._refreshing.discard(session_id)
+
+    async def drain(self):
+        """Waits for pending summary updates. Called on shutdown."""
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+compactor = HistoryCompactor()
@@ -0,0 +1,149 @@
+# File: backend/agents/itinerary_output.py
+import os
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from pydantic import ValidationError
+from schemas.agent import ItineraryDraft, ItineraryDay
+from llm import gateway as llm_gateway, metrics as llm_metrics
+from llm.structured import coerce_int, json_schema_response_format, loads_lenient, strict_json_schema
+
+logger = logging.getLogger(__name__)
+
+# Schema-constrained generation. Disable for models or proxies without json_schema support.
+STRICT_SCHEMA_ENABLED = os.getenv("NEURAL_STRICT_SCHEMA", "true").lower() in ("1", "true", "yes")
+REASK_MAX_TOKENS_PER_DAY = 700
+# Keys models sometimes use instead of "itinerary_draft".
+ALTERNATE_KEYS = ("itinerary", "days", "itineraryDraft")
+
+REPAIR_PROMPT = """
+You correct days of a Swiss travel itinerary that did not match the required JSON schema.
+Keep the day numbers, titles and activities the user asked for; fix only the structure and types.
+Prices are whole numbers in CHF. Respond with a JSON object whose "itinerary_draft" array contains only the corrected days.
+"""
+
+FAILED_DETAIL = "I couldn't generate a structured itinerary. Could you rephrase?"
+
+
+def response_format(include_explanation: bool = False) -> Dict[str, Any]:
+    """The neural agent's `response_format`, derived from ItineraryDraft."""
+    if not STRICT_SCHEMA_ENABLED:
+        return {"type": "json_object"}
+    schema = strict_json_schema(ItineraryDraft, exclude=None if include_explanation else {"explanation"})
+    return json_schema_response_format("itinerary_draft", schema)
+
+
+def repair_day(day_data: Any, position: int) -> Any:
+    """
+    Fixes common type slips in one day: stringified or fractional prices
+    and day numbers ("CHF 120", 85.0, "Day 2"), or a missing day number.
+    """
+    if not isinstance(day_data, dict):
+        return day_data
+    day = dict(day_data)
+    try:
+        day["day"] = coerce_int(day["day"]) if "day" in day else position
+    except ValueError:
+        pass
+    if isinstance(day.get("activities"), list):
+        activities = []
+        for activity in day["activities"]:
+            if isinstance(activity, dict) and "price" in activity:
+                try:
+                    activity = {**activity, "price": coerce_int(activity["price"])}
+                except ValueError:
+                    pass
+            activities.append(activity)
+        day["activities"] = activities
+    return day
+
+
+def parse(content: Optional[str]) -> Tuple[List[ItineraryDay], List[Tuple[Any, str]], Optional[str], bool]:
+    """
+    Parses and locally repairs the model's itinerary JSON.
+
+    Returns (valid days, [(invalid day data, error)], explanation, repaired).
+    Raises HTTPException when the output has no usable itinerary at all.
+    """
+    if not content:
+        raise HTTPException(status_code=500, detail="The AI returned an empty response.")
+    repaired = False
+    try:
+        data = json.loads(content)
+    except ValueError:
+        try:
+            data = loads_lenient(content)
+            repaired = True
+        except ValueError as e:
+            logger.error(f"Failed to parse AI response as itinerary JSON: {e}\nRaw response: {content}")
+            raise HTTPException(status_code=500, detail=FAILED_DETAIL)
+
+    if isinstance(data, list):
+        data, repaired = {"itinerary_draft": data}, True
+    days_data = data.get("itinerary_draft") if isinstance(data, dict) else None
+    if days_data is None and isinstance(data, dict):
+        alternate = next((key for key in ALTERNATE_KEYS if isinstance(data.get(key), list)), None)
+        if alternate:
+            days_data, repaired = data[alternate], True
+    if not isinstance(days_data, list):
+        logger.error(f"AI response is missing the 'itinerary_draft' array.\nRaw response: {content}")
+        raise HTTPException(status_code=500, detail=FAILED_DETAIL)
+
+    valid: List[ItineraryDay] = []
+    invalid: List[Tuple[Any, str]] = []
+    for position, day_data in enumerate(days_data, start=1):
+        fixed = repair_day(day_data, position)
+        try:
+            valid.append(ItineraryDay.model_validate(fixed))
+            repaired = repaired or fixed != day_data
+        except ValidationError as e:
+            invalid.append((day_data, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())))
+
+    explanation = data.get("explanation") if isinstance(data.get("explanation"), str) else None
+    return valid, invalid, explanation, repaired
+
+
+async def reask(prompt_text: str, invalid: List[Tuple[Any, str]]) -> List[ItineraryDay]:
+    """One bounded follow-up call that regenerates only the invalid days."""
+    broken = "\n".join(f"- {json.dumps(day_data)}\n  Errors: {error}" for day_data, error in invalid)
+    response = await llm_gateway.chat_completion(
+        "neural",
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": REPAIR_PROMPT},
+            {"role": "user", "content": f"Original request: {prompt_text}\n\nInvalid days:\n{broken}"},
+        ],
+        response_format=response_format(),
+        temperature=0,
+        max_tokens=REASK_MAX_TOKENS_PER_DAY * len(invalid),
+    )
+    valid, still_invalid, _, _ = parse(response.choices[0].message.content)
+    if still_invalid:
+        logger.warning(f"Dropping {len(still_invalid)} itinerary days that were still invalid after the re-ask")
+    return valid
+
+
+async def build_itinerary(content: Optional[str], prompt_text: str) -> ItineraryDraft:
+    """
+    Turns the model output into an ItineraryDraft. Repairs what it can
+    locally and re-asks once for days that are still invalid; if some days
+    remain unusable after that, the valid ones are returned.
+    """
+    valid, invalid, explanation, repaired = parse(content)
+    result = "repaired" if repaired else "valid"
+    if invalid:
+        logger.warning(f"Itinerary has {len(invalid)} invalid days; re-asking for them")
+        try:
+            valid.extend(await reask(prompt_text, invalid))
+            result = "reasked"
+        except HTTPException:
+            result = "partial"
+        # Keep the first version of each day, in order.
+        valid = sorted({day.day: day for day in reversed(valid)}.values(), key=lambda day: day.day)
+
+    if not valid:
+        llm_metrics.STRUCTURED_OUTPUTS.inc(agent="neural", result="failed")
+        raise HTTPException(status_code=500, detail=FAILED_DETAIL)
+    llm_metrics.STRUCTURED_OUTPUTS.inc(agent="neural", result=result)
+    return ItineraryDraft(itinerary_draft=valid, explanation=explanation)
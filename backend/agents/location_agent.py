@@ -1,67 +1,344 @@
 # File: backend/agents/location_agent.py
 import os
+import asyncio
 import logging
 import httpx
+import numpy as np
+from typing import Any, Dict, List, Literal, Optional
 from fastapi import APIRouter, HTTPException, Query
+from upstream import transport as upstream, mapbox
+from llm.resilience import UpstreamUnavailableError
+from agents import geocoding, gazetteer
+from geo import geometry
+from llm import cache as llm_cache
+from schemas.agent import ResolvedPlace, RouteMatrixRequest, RouteMatrixResponse
+from metrics.registry import REGISTRY
 
 # --- Setup ---
 router = APIRouter()
 logger = logging.getLogger(__name__)
 MAPBOX_API_KEY = os.getenv("MAPBOX_API_KEY")
+# Resolve names against the bundled Swiss gazetteer before the cache and Mapbox.
+GAZETTEER_ENABLED = os.getenv("GAZETTEER_ENABLED", "true").lower() in ("1", "true", "yes")
 
-# --- Location Agent Endpoints ---
-@router.get("/search")
-async def search_place(place_name: str = Query(..., description="The name of the place to search for in Switzerland.")):
-    """
-    Finds the coordinates for a given place name using Mapbox Geocoding.
-    """
-    if not MAPBOX_API_KEY:
+# Route endpoints are rounded to this many decimals for the cache key (4 ~ 10 m).
+ROUTE_COORDINATE_DECIMALS = int(os.getenv("ROUTE_CACHE_COORDINATE_DECIMALS", "4"))
+ROUTE_CACHE_NAMESPACE = "route:v1"
+route_cache = llm_cache.build_cache("route", default_ttl=24 * 3600, default_max_entries=2048)
+# Route matrices: largest origins x destinations accepted, and concurrent Matrix API calls per matrix.
+MATRIX_MAX_PAIRS = int(os.getenv("ROUTE_MATRIX_MAX_PAIRS", "625"))
+MATRIX_CONCURRENCY = int(os.getenv("ROUTE_MATRIX_CONCURRENCY", "4"))
+# Coordinates (origins + destinations) the Mapbox Matrix API accepts per request; driving-traffic allows fewer.
+MATRIX_MAX_COORDINATES = 25
+MATRIX_MAX_COORDINATES_TRAFFIC = 10
+# Offline estimate: straight-line distance times a road detour factor, at the profile's average speed.
+ROAD_FACTOR = float(os.getenv("ROUTE_ESTIMATE_ROAD_FACTOR", str(geometry.DEFAULT_ROAD_FACTOR)))
+# Screen pixels a simplified route may deviate by when simplifying for a zoom level.
+SIMPLIFY_TOLERANCE_PIXELS = float(os.getenv("ROUTE_SIMPLIFY_TOLERANCE_PIXELS", "1"))
+# Routes with more points than this are simplified in a worker thread to keep the event loop free.
+SIMPLIFY_OFFLOAD_POINTS = int(os.getenv("ROUTE_SIMPLIFY_OFFLOAD_POINTS", "2000"))
+
+MATRIX_PAIRS = REGISTRY.counter(
+    "route_matrix_pairs_total",
+    "Route matrix pairs by the source that answered them (cache, mapbox, estimate).",
+    ("source",),
+)
+RESOLUTIONS = REGISTRY.counter(
+    "location_resolutions_total",
+    "Place name lookups by the source that answered them (gazetteer, cache, mapbox).",
+    ("source",),
+)
+
+
+class PlaceNotFoundError(LookupError):
+    """No resolver found coordinates for a place name."""
+
+    def __init__(self, place_name: str):
+        super().__init__(f"Could not find a location for '{place_name}'.")
+        self.place_name = place_name
+
+
+def _require_api_key():
+    if not MAPBOX_API_KEY and not upstream.is_offline():
         raise HTTPException(status_code=500, detail="Mapbox API key is not configured.")
-        
+
+async def _mapbox_geocode(place_name: str):
     url = f"https://api.mapbox.com/geocoding/v5/mapbox.places/{place_name}.json"
     params = {
-        "access_token": MAPBOX_API_KEY,
         "country": "CH", # Restrict search to Switzerland
         "limit": 1
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            if not data.get("features"):
-                raise HTTPException(status_code=404, detail=f"Could not find a location for '{place_name}'.")
-            
-            # Return the coordinates of the first result
-            coordinates = data["features"][0]["geometry"]["coordinates"]
-            return {"place_name": place_name, "coordinates": coordinates}
-        except httpx.HTTPStatusError as e:
-            logger.error(f"Error calling Mapbox API: {e.response.text}")
-            raise HTTPException(status_code=e.response.status_code, detail="Error searching for location.")
+    try:
+        response = await mapbox.get_client().get("geocoding", url, params=params)
+        data = response.json()
+        if not data.get("features"):
+            raise PlaceNotFoundError(place_name)
 
-@router.get("/route")
-async def get_route(start_lon: float, start_lat: float, end_lon: float, end_lat: float):
+        # Return the coordinates of the first result
+        return data["features"][0]["geometry"]["coordinates"]
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Error calling Mapbox API: {e.response.text}")
+        raise HTTPException(status_code=e.response.status_code, detail="Error searching for location.")
+
+# --- Location Service ---
+
+async def resolve_place(place_name: str) -> ResolvedPlace:
     """
-    Calculates a driving route between two points using Mapbox Directions.
+    Finds the coordinates for a place name: the offline gazetteer first, then
+    the geocode cache, and Mapbox Geocoding only when both miss. Raises
+    PlaceNotFoundError when nothing matches.
     """
-    if not MAPBOX_API_KEY:
-        raise HTTPException(status_code=500, detail="Mapbox API key is not configured.")
+    if GAZETTEER_ENABLED:
+        match = gazetteer.get_gazetteer().resolve(place_name)
+        if match is not None:
+            RESOLUTIONS.inc(source="gazetteer")
+            return ResolvedPlace(place_name=place_name, coordinates=match["coordinates"], source="gazetteer")
+
+    coordinates = await geocoding.lookup(place_name)
+    if coordinates is not None:
+        RESOLUTIONS.inc(source="cache")
+        return ResolvedPlace(place_name=place_name, coordinates=coordinates, source="cache")
+
+    _require_api_key()
+    coordinates = await _mapbox_geocode(place_name)
+    RESOLUTIONS.inc(source="mapbox")
+    await geocoding.store(place_name, coordinates)
+    return ResolvedPlace(place_name=place_name, coordinates=coordinates, source="mapbox")
+
+async def resolve_places(*place_names: str) -> List[ResolvedPlace]:
+    """Resolves several place names concurrently, in the order given."""
+    return list(await asyncio.gather(*(resolve_place(name) for name in place_names)))
+
+# --- Location Agent Endpoints ---
+@router.get("/search", response_model=ResolvedPlace)
+async def search_place(place_name: str = Query(..., description="The name of the place to search for in Switzerland.")):
+    """
+    Finds the coordinates for a given place name (see resolve_place).
+    """
+    try:
+        return await resolve_place(place_name)
+    except PlaceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UpstreamUnavailableError as e:
+        raise e.to_http_exception()
+
+@router.get("/autocomplete")
+def autocomplete_place(
+    q: str = Query(..., min_length=1, description="What the user has typed so far."),
+    limit: int = Query(5, ge=1, le=gazetteer.MAX_SUGGESTIONS),
+):
+    """
+    Ranked place suggestions from the offline Swiss gazetteer: prefix matches
+    on any word of a name or alias, topped up with typo-tolerant matches.
+    """
+    if not GAZETTEER_ENABLED:
+        raise HTTPException(status_code=404, detail="The place gazetteer is disabled.")
+    return {"query": q, "results": gazetteer.get_gazetteer().autocomplete(q, limit)}
+
+@router.get("/cache/stats")
+async def get_geocode_cache_stats():
+    """Returns hit/miss counters, sizes and evictions for the geocode cache."""
+    return geocoding.geocode_cache.stats()
+
+async def _fetch_route(profile: str, start: List[float], end: List[float]) -> Dict[str, Any]:
+    _require_api_key()
+    url = f"https://api.mapbox.com/directions/v5/mapbox/{profile}/{start[0]},{start[1]};{end[0]},{end[1]}"
+    params = {
+        "geometries": "polyline6" # Compact on the wire and in the route cache
+    }
+    try:
+        response = await mapbox.get_client().get("directions", url, params=params)
+        data = response.json()
+        if not data.get("routes"):
+            raise HTTPException(status_code=404, detail="Could not calculate a route.")
 
-    url = f"https://api.mapbox.com/directions/v5/mapbox/driving/{start_lon},{start_lat};{end_lon},{end_lat}"
+        return data["routes"][0]
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Error calling Mapbox Directions API: {e.response.text}")
+        raise HTTPException(status_code=e.response.status_code, detail="Error calculating route.")
+
+def _route_cache_key(profile: str, start: List[float], end: List[float]) -> str:
+    return f"{ROUTE_CACHE_NAMESPACE}:{profile}:{start[0]},{start[1]};{end[0]},{end[1]}"
+
+def _round_point(point: List[float]) -> List[float]:
+    return [round(v, ROUTE_COORDINATE_DECIMALS) for v in point]
+
+async def get_route_data(profile: str, start: List[float], end: List[float]) -> Dict[str, Any]:
+    """
+    The route between two [lon, lat] points with its geometry as a polyline6
+    string. Endpoints are rounded to ROUTE_COORDINATE_DECIMALS, so requests
+    a few metres apart share one cached route.
+    """
+    start, end = _round_point(start), _round_point(end)
+    key = _route_cache_key(profile, start, end)
+    route = await route_cache.get(key)
+    if route is None:
+        route = await _fetch_route(profile, start, end)
+        await route_cache.set(key, route)
+    return route
+
+def estimate_matrix(profile: str, origins: List[List[float]], destinations: List[List[float]]):
+    """Offline (distances, durations) arrays: haversine distance times ROAD_FACTOR at the profile's average speed."""
+    distances = geometry.haversine_matrix(origins, destinations) * ROAD_FACTOR
+    return distances, distances / geometry.PROFILE_SPEEDS.get(profile, geometry.PROFILE_SPEEDS["driving"])
+
+async def _fetch_matrix(profile: str, origins: List[List[float]], destinations: List[List[float]]):
+    """One Mapbox Matrix API call: (distances, durations) as origins x destinations arrays, NaN where unroutable."""
+    coordinates = ";".join(f"{lon},{lat}" for lon, lat in origins + destinations)
+    url = f"https://api.mapbox.com/directions-matrix/v1/mapbox/{profile}/{coordinates}"
     params = {
-        "access_token": MAPBOX_API_KEY,
-        "geometries": "geojson"
+        "sources": ";".join(str(i) for i in range(len(origins))),
+        "destinations": ";".join(str(len(origins) + j) for j in range(len(destinations))),
+        "annotations": "distance,duration",
     }
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            if not data.get("routes"):
-                raise HTTPException(status_code=404, detail="Could not calculate a route.")
-            
-            return data["routes"][0]
-        except httpx.HTTPStatusError as e:
-            logger.error(f"Error calling Mapbox Directions API: {e.response.text}")
-            raise HTTPException(status_code=e.response.status_code, detail="Error calculating route.")
+    try:
+        response = await mapbox.get_client().get("matrix", url, params=params)
+        data = response.json()
+    except httpx.HTTPStatusError as e:
+        logger.error(f"Error calling Mapbox Matrix API: {e.response.text}")
+        raise HTTPException(status_code=e.response.status_code, detail="Error calculating route matrix.")
+    if data.get("code") != "Ok":
+        raise HTTPException(status_code=502, detail=f"Mapbox Matrix API answered {data.get('code')}.")
+    # Unroutable pairs come back as null.
+    distances = np.array(data["distances"], dtype=np.float64)
+    durations = np.array(data["durations"], dtype=np.float64)
+    return distances, durations
+
+def _matrix_batches(profile: str, origin_count: int, destination_count: int):
+    """
+    Splits an origins x destinations matrix into blocks of (origin slice,
+    destination slice) whose coordinates fit in one Matrix API request.
+    """
+    limit = MATRIX_MAX_COORDINATES_TRAFFIC if profile == "driving-traffic" else MATRIX_MAX_COORDINATES
+    destination_step = min(destination_count, limit - min(origin_count, limit // 2))
+    origin_step = min(origin_count, limit - destination_step)
+    for i in range(0, origin_count, origin_step):
+        for j in range(0, destination_count, destination_step):
+            yield slice(i, min(i + origin_step, origin_count)), slice(j, min(j + destination_step, destination_count))
+
+async def get_route_matrix(request: RouteMatrixRequest) -> RouteMatrixResponse:
+    """
+    Distances and durations from every origin to every destination.
+
+    Pairs come from the route cache when possible. Blocks of the matrix that
+    still have uncached pairs are fetched from the Mapbox Matrix API, up to
+    MATRIX_MAX_COORDINATES coordinates per call and MATRIX_CONCURRENCY calls
+    at a time. Pairs in a block whose call failed (upstream unavailable or
+    rate-limited, error response) or that Mapbox could not route keep the
+    offline haversine estimate, as do all pairs when `estimate_only` is set
+    or no Mapbox API key is configured. `estimated` is set whenever any pair
+    of distinct points was estimated.
+    """
+    profile = request.profile
+    origins = [_round_point(p) for p in request.origins]
+    destinations = [_round_point(p) for p in request.destinations]
+    distances, durations = estimate_matrix(profile, origins, destinations)
+    sources = np.full(distances.shape, "estimate", dtype=object)
+
+    # Identical points need no route; their estimate is already zero.
+    pairs = [(i, j) for i, origin in enumerate(origins) for j, destination in enumerate(destinations) if origin != destination]
+
+    if not request.estimate_only and pairs:
+        keys = [_route_cache_key(profile, origins[i], destinations[j]) for i, j in pairs]
+        cached = await asyncio.gather(*(route_cache.get(key) for key in keys))
+        missing = np.zeros(distances.shape, dtype=bool)
+        for (i, j), route in zip(pairs, cached):
+            if route is None:
+                missing[i, j] = True
+            else:
+                distances[i, j], durations[i, j], sources[i, j] = route["distance"], route["duration"], "cache"
+
+        batches = [(rows, cols) for rows, cols in _matrix_batches(profile, len(origins), len(destinations)) if missing[rows, cols].any()]
+        if batches and not MAPBOX_API_KEY and not upstream.is_offline():
+            # Same as Mapbox being down: answer from the estimate rather than failing the request.
+            logger.warning("Mapbox API key is not configured; route matrix falls back to estimates.")
+        elif batches:
+            semaphore = asyncio.Semaphore(MATRIX_CONCURRENCY)
+
+            async def fetch(rows: slice, cols: slice):
+                async with semaphore:
+                    try:
+                        block_distances, block_durations = await _fetch_matrix(profile, origins[rows], destinations[cols])
+                    except (UpstreamUnavailableError, HTTPException, httpx.HTTPError) as e:
+                        logger.warning(f"Route matrix block {rows.start}:{rows.stop} x {cols.start}:{cols.stop} fell back to estimates: {e}")
+                        return
+                # Fill only the pairs that were missing and that Mapbox could route.
+                fill = missing[rows, cols] & ~np.isnan(block_distances) & ~np.isnan(block_durations)
+                distances[rows, cols][fill] = block_distances[fill]
+                durations[rows, cols][fill] = block_durations[fill]
+                sources[rows, cols][fill] = "mapbox"
+
+            await asyncio.gather(*(fetch(rows, cols) for rows, cols in batches))
+
+    estimated = any(sources[i, j] == "estimate" for i, j in pairs)
+    counts = {source: int(count) for source, count in zip(*np.unique(sources, return_counts=True))}
+    for source, count in counts.items():
+        MATRIX_PAIRS.inc(count, source=source)
+    return RouteMatrixResponse(
+        profile=profile,
+        distances=np.round(distances, 1).tolist(),
+        durations=np.round(durations, 1).tolist(),
+        sources=sources.tolist(),
+        counts=counts,
+        estimated=estimated,
+    )
+
+@router.get("/route")
+async def get_route(
+    start_lon: float, start_lat: float, end_lon: float, end_lat: float,
+    profile: Literal["driving", "driving-traffic", "walking", "cycling"] = "driving",
+    geometries: Literal["geojson", "polyline6", "polyline"] = Query("geojson", description="Geometry format of the returned route."),
+    zoom: Optional[float] = Query(None, ge=0, le=22, description="Simplify the geometry for display at this map zoom level."),
+    tolerance: Optional[float] = Query(None, gt=0, description="Simplify the geometry to within this many metres (overrides zoom)."),
+    simplify: Literal["douglas-peucker", "visvalingam"] = Query("douglas-peucker", description="Simplification algorithm."),
+):
+    """
+    Calculates a route between two points using Mapbox Directions, served
+    from the route cache when the same trip was requested recently. With
+    `zoom` or `tolerance` the geometry is simplified server-side and the
+    response reports the original and returned point counts.
+    """
+    try:
+        route = await get_route_data(profile, [start_lon, start_lat], [end_lon, end_lat])
+    except UpstreamUnavailableError as e:
+        raise e.to_http_exception()
+
+    if zoom is None and tolerance is None and geometries == "polyline6":
+        return route
+    points = geometry.decode_polyline(route["geometry"], precision=6)
+    if zoom is not None or tolerance is not None:
+        if tolerance is None:
+            tolerance = geometry.zoom_tolerance(zoom, (start_lat + end_lat) / 2, SIMPLIFY_TOLERANCE_PIXELS)
+        original_point_count = len(points)
+        if original_point_count > SIMPLIFY_OFFLOAD_POINTS:
+            points = await asyncio.to_thread(geometry.simplify, points, tolerance, simplify)
+        else:
+            points = geometry.simplify(points, tolerance, simplify)
+        route = {**route, "original_point_count": original_point_count, "point_count": len(points)}
+
+    if geometries == "polyline6":
+        return {**route, "geometry": geometry.encode_polyline(points, precision=6)}
+    if geometries == "polyline":
+        return {**route, "geometry": geometry.encode_polyline(points)}
+    return {**route, "geometry": {"type": "LineString", "coordinates": geometry.to_coordinates(points)}}
+
+@router.post("/matrix", response_model=RouteMatrixResponse)
+async def post_route_matrix(request: RouteMatrixRequest):
+    """
+    Distance/duration matrix from N origins to M destinations in one request
+    (see get_route_matrix). Each pair reports whether it came from the route
+    cache, a fresh Mapbox route or the offline estimate.
+    """
+    if len(request.origins) * len(request.destinations) > MATRIX_MAX_PAIRS:
+        raise HTTPException(status_code=422, detail=f"A route matrix may have at most {MATRIX_MAX_PAIRS} origin/destination pairs.")
+    return await get_route_matrix(request)
+
+@router.get("/route/cache/stats")
+async def get_route_cache_stats():
+    """Returns hit/miss counters, sizes and evictions for the route cache."""
+    return route_cache.stats()
 
+@router.get("/mapbox/stats")
+async def get_mapbox_stats():
+    """Returns the Mapbox client's protocol and per-API rate-limit state."""
+    return mapbox.get_client().stats()
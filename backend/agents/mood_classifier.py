@@ -0,0 +1,112 @@
+# File: backend/agents/mood_classifier.py
+import os
+import re
+import json
+import logging
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from schemas.agent import MoodResponse
+
+logger = logging.getLogger(__name__)
+
+LEXICON_PATH = os.path.join(os.path.dirname(__file__), "data", "mood_lexicon.json")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+# How far back (in tokens) a negator flips a cue, e.g. "not very happy".
+NEGATION_WINDOW = 2
+NEGATION_FACTOR = -0.5
+# Prior added to Neutral so that texts without emotional cues lean Neutral.
+NEUTRAL_PRIOR = 1.0
+# Sharpness of the softmax that turns scores into a confidence.
+SOFTMAX_SCALE = 2.0
+QUESTION_MARK_WEIGHT = 1.5
+EXCLAMATION_WEIGHT = 0.75
+MAX_PUNCTUATION_HITS = 3
+
+
+def _tokenize(text: str) -> List[str]:
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower().replace("'", "").replace("’", "")
+    return _TOKEN_RE.findall(text)
+
+
+class LexiconMoodClassifier:
+    """
+    Local mood classifier over the emotional agent's fixed label set.
+
+    The lexicon is compiled once into a vocabulary index and a dense
+    (vocabulary x labels) weight matrix. Classifying a text looks up its
+    unigrams and bigrams, scales them for negation, and scores all labels
+    with a single matrix product. The softmax probability of the winning
+    label is returned as its confidence.
+    """
+
+    def __init__(self, labels: List[str], colors: Dict[str, str], weights: Dict[str, Dict[str, float]], negators: List[str]):
+        self.labels = labels
+        self.colors = colors
+        self.negators = frozenset(negators)
+        vocabulary = sorted({term for terms in weights.values() for term in terms})
+        self.vocabulary = np.array(vocabulary)
+        self._index = {term: i for i, term in enumerate(vocabulary)}
+        self._weights = np.zeros((len(vocabulary), len(labels)), dtype=np.float32)
+        for label_index, label in enumerate(labels):
+            for term, weight in weights.get(label, {}).items():
+                self._weights[self._index[term], label_index] = weight
+        self._prior = np.zeros(len(labels), dtype=np.float32)
+        self._prior[labels.index("Neutral")] = NEUTRAL_PRIOR
+        self._question_index = labels.index("Inquisitive")
+        self._exclamation_index = labels.index("Excited")
+
+    @classmethod
+    def from_file(cls, path: str = LEXICON_PATH) -> "LexiconMoodClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        classifier = cls(data["labels"], data["colors"], data["weights"], data["negators"])
+        logger.info(f"Loaded mood lexicon with {len(classifier.vocabulary)} terms from {path}")
+        return classifier
+
+    def scores(self, text: str) -> np.ndarray:
+        """Returns the raw per-label scores for a text."""
+        tokens = _tokenize(text)
+        terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        positions = list(range(len(tokens))) + list(range(len(tokens) - 1))
+
+        hits = [(self._index[term], position) for term, position in zip(terms, positions) if term in self._index]
+        scores = self._prior.copy()
+        if hits:
+            indices = np.fromiter((index for index, _ in hits), dtype=np.intp, count=len(hits))
+            multipliers = np.fromiter(
+                (NEGATION_FACTOR if self._is_negated(tokens, position) else 1.0 for _, position in hits),
+                dtype=np.float32,
+                count=len(hits),
+            )
+            scores += multipliers @ self._weights[indices]
+
+        scores[self._question_index] += QUESTION_MARK_WEIGHT * min(text.count("?"), MAX_PUNCTUATION_HITS)
+        scores[self._exclamation_index] += EXCLAMATION_WEIGHT * min(text.count("!"), MAX_PUNCTUATION_HITS)
+        return scores
+
+    def _is_negated(self, tokens: List[str], position: int) -> bool:
+        window = tokens[max(0, position - NEGATION_WINDOW):position]
+        return any(token in self.negators for token in window)
+
+    def classify(self, text: str) -> Tuple[MoodResponse, float]:
+        """Returns the predicted MoodResponse and a confidence in [0, 1]."""
+        scores = self.scores(text or "") * SOFTMAX_SCALE
+        exp_scores = np.exp(scores - scores.max())
+        probabilities = exp_scores / exp_scores.sum()
+        best = int(probabilities.argmax())
+        mood = self.labels[best]
+        return MoodResponse(mood=mood, color_suggestion=self.colors[mood]), float(probabilities[best])
+
+
+_classifier: Optional[LexiconMoodClassifier] = None
+
+
+def get_classifier() -> LexiconMoodClassifier:
+    """Returns the shared classifier, loading the lexicon on first use."""
+    global _classifier
+    if _classifier is None:
+        _classifier = LexiconMoodClassifier.from_file()
+    return _classifier
@@ -1,18 +1,41 @@
 # File: backend/agents/neural.py
-import os
+import time
+import asyncio
 import logging
 import json
-import httpx
+import hashlib
 from fastapi import APIRouter, HTTPException
-from openai import OpenAI
-from schemas.agent import AgentRequest, ItineraryDraft, ToolCallResponse, LocationRequestResponse
-from typing import Union, Dict, Any
+from fastapi.responses import StreamingResponse
+from schemas.agent import AgentRequest, ItineraryDraft, ItineraryDay, ToolCallResponse, LocationRequestResponse
+from typing import Union, Dict, Any, Optional
+from pydantic import ValidationError
 from auth.database import SessionLocal
-from chat import models as chat_models
+from chat import models as chat_models, persistence as chat_persistence
+from llm import gateway as llm_gateway, cache as llm_cache
+from llm.streaming import JSONArrayItemParser, sse_event
+from llm.resilience import UpstreamUnavailableError
+from agents import itinerary_output, location_agent
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+itinerary_cache = llm_cache.build_cache("neural", default_ttl=6 * 3600)
+
+SYSTEM_PROMPT = """
+        You are a luxury Swiss travel concierge. Your primary role is to create and modify travel itineraries.
+        You can also book rides.
+        - If the user asks to book a ride, book a taxi, or a similar transportation request, you MUST use the 'book_ride' tool.
+        - For all other requests, generate or update an itinerary.
+        - When creating an itinerary, your entire response MUST be a JSON object with a single key "itinerary_draft". Do not add any conversational text.
+        """
+
+# Appended when the caller also wants the MCP context explanation, so it comes from the same completion.
+EXPLANATION_PROMPT = """
+        - Besides "itinerary_draft", add a key "explanation": one sentence telling the user why this plan fits their request,
+          e.g. "Based on your request for luxury, we are suggesting five-star accommodations."
+        """
+# How far back in a session to look for the turn a stored explanation belongs to.
+EXPLANATION_LOOKBACK_MESSAGES = 10
 
 tools = [
     {
@@ -32,110 +55,297 @@ tools = [
     }
 ]
 
-@router.post("/", response_model=Union[ItineraryDraft, ToolCallResponse, LocationRequestResponse])
-async def run_neural_agent(request: AgentRequest):
+def _prompt_fingerprint() -> str:
+    """Short hash of everything that shapes a cached itinerary: prompts, tools and the response schema."""
+    material = json.dumps(
+        [SYSTEM_PROMPT, EXPLANATION_PROMPT, tools, itinerary_output.response_format(False), itinerary_output.response_format(True)],
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:12]
+
+# Prompt, tool and schema changes get a new namespace automatically through the fingerprint,
+# so stale itineraries are not served; bump the version when the stored entry format changes.
+ITINERARY_CACHE_NAMESPACE = f"neural:gpt-4o-mini:v2:{_prompt_fingerprint()}"
+
+# --- Helpers ---
+
+def _get_prompt_text(request: AgentRequest) -> str:
     prompt_text = request.prompt or ""
     if not prompt_text and request.messages:
         prompt_text = next((msg.content for msg in reversed(request.messages) if msg.sender == 'user'), "")
-    
+
     if not prompt_text:
         raise HTTPException(status_code=422, detail="A prompt must be provided.")
+    return prompt_text
 
-    logger.info(f"Neural Agent received prompt: '{prompt_text}' for session: {request.session_id}")
-    
-    db = SessionLocal()
-    if request.session_id:
-        try:
-            user_message = chat_models.ChatMessage(session_id=request.session_id, sender='user', content=prompt_text)
-            db.add(user_message)
-            db.commit()
-        finally:
-            db.close()
+def _build_messages(prompt_text: str, include_explanation: bool = False):
+    system_prompt = SYSTEM_PROMPT + EXPLANATION_PROMPT if include_explanation else SYSTEM_PROMPT
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt_text}]
 
-    try:
-        system_prompt = """
-        You are a luxury Swiss travel concierge. Your primary role is to create and modify travel itineraries.
-        You can also book rides.
-        - If the user asks to book a ride, book a taxi, or a similar transportation request, you MUST use the 'book_ride' tool.
-        - For all other requests, generate or update an itinerary.
-        - When creating an itinerary, your entire response MUST be a JSON object with a single key "itinerary_draft". Do not add any conversational text.
-        """
+def _coalesce_text(prompt_text: str, include_explanation: bool) -> str:
+    # Requests with and without the explanation use different prompts and must not share a completion.
+    return f"explained: {prompt_text}" if include_explanation else prompt_text
+
+def _save_user_message(session_id: Optional[int], prompt_text: str):
+    if session_id:
+        chat_persistence.save_message(session_id=session_id, sender='user', content=prompt_text)
+
+def _save_ai_message(session_id: Optional[int], ai_response_object: Any) -> Optional[asyncio.Future]:
+    """Queues the agent's answer for chat_messages; the returned future resolves to the new message id."""
+    if session_id and ai_response_object:
+        ai_message_data: Dict[str, Any] = {"session_id": session_id, "sender": 'ai'}
+        if isinstance(ai_response_object, ItineraryDraft):
+            ai_message_data["content"] = "Here is a draft of your itinerary."
+            ai_message_data["itinerary"] = json.loads(ai_response_object.model_dump_json(by_alias=True))['itinerary_draft']
+            ai_message_data["context_explanation"] = ai_response_object.explanation
+        elif isinstance(ai_response_object, ToolCallResponse):
+            ai_message_data["content"] = "Of course, I can book that ride for you. Please confirm the details on the map."
+            ai_message_data["ride_details"] = json.loads(ai_response_object.tool_params.model_dump_json())
+        elif isinstance(ai_response_object, LocationRequestResponse):
+            ai_message_data["content"] = ai_response_object.message
+
+        return chat_persistence.save_message(**ai_message_data)
+    return None
+
+async def _book_ride(args: Dict[str, Any], request: AgentRequest) -> Union[ToolCallResponse, LocationRequestResponse]:
+    pickup_name = args.get("pickup_location", "").lower()
+    is_current_location_request = any(term in pickup_name for term in ["current position", "here", "my location", "current postions"])
+
+    if is_current_location_request and not request.current_location:
+        return LocationRequestResponse()
+
+    final_pickup_name = "Current Location" if is_current_location_request else pickup_name
+    destination_name = args.get("destination_location")
+    # Resolved in-process and concurrently; both lookups share the location agent's caches.
+    if is_current_location_request:
+        pickup_coords = list(request.current_location)
+        destination = await location_agent.resolve_place(destination_name)
+    else:
+        pickup, destination = await location_agent.resolve_places(final_pickup_name, destination_name)
+        pickup_coords = pickup.coordinates
+        logger.info(f"Ride pickup '{final_pickup_name}' resolved from {pickup.source}")
+    logger.info(f"Ride destination '{destination_name}' resolved from {destination.source}")
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt_text}],
-            tools=tools,
-            tool_choice="auto",
-            response_format={"type": "json_object"}
+    return ToolCallResponse(
+        tool_name="book_ride",
+        tool_params={"pickup": {"name": final_pickup_name.title(), "coordinates": pickup_coords}, "destination": {"name": destination_name, "coordinates": destination.coordinates}}
+    )
+
+async def _get_cached_itinerary(request: AgentRequest, cache_key: str) -> Optional[ItineraryDraft]:
+    if request.bypass_cache:
+        itinerary_cache.record_bypass()
+        return None
+    cached_itinerary = await itinerary_cache.get(cache_key)
+    if cached_itinerary is None:
+        return None
+    itinerary = ItineraryDraft(**cached_itinerary)
+    if request.include_explanation and not itinerary.explanation:
+        # Cached before an explanation was requested for this prompt; regenerate it with one.
+        return None
+    return itinerary
+
+async def _cache_itinerary(cache_key: str, itinerary: ItineraryDraft):
+    await itinerary_cache.set(cache_key, json.loads(itinerary.model_dump_json(by_alias=True)))
+
+# --- Stored Explanations ---
+
+def _load_session_explanation(session_id: int, prompt_text: Optional[str]) -> Optional[str]:
+    chat_persistence.chat_writes.wait_for_session(session_id)
+    db = SessionLocal()
+    try:
+        recent = (
+            db.query(chat_models.ChatMessage)
+            .filter(chat_models.ChatMessage.session_id == session_id)
+            .order_by(chat_models.ChatMessage.id.desc())
+            .limit(EXPLANATION_LOOKBACK_MESSAGES)
+            .all()
         )
+    finally:
+        db.close()
+    for i, message in enumerate(recent):
+        if message.sender != 'ai' or not message.context_explanation:
+            continue
+        if not prompt_text:
+            return message.context_explanation
+        # Only serve it for the turn it was generated for.
+        asked = next((m.content for m in recent[i + 1:] if m.sender == 'user'), None)
+        if asked is not None and llm_cache.normalize_prompt(asked) == llm_cache.normalize_prompt(prompt_text):
+            return message.context_explanation
+        return None
+    return None
 
-        response_message = response.choices[0].message
-        tool_calls = response_message.tool_calls
-        ai_response_object: Any = None
-        
-        if tool_calls:
-            tool_call = tool_calls[0]
-            if tool_call.function.name == "book_ride":
-                args = json.loads(tool_call.function.arguments)
-                pickup_name = args.get("pickup_location", "").lower()
-                is_current_location_request = any(term in pickup_name for term in ["current position", "here", "my location", "current postions"])
-
-                if is_current_location_request and not request.current_location:
-                    ai_response_object = LocationRequestResponse()
-                else:
-                    pickup_coords = request.current_location if is_current_location_request else None
-                    final_pickup_name = "Current Location" if is_current_location_request else pickup_name
-                    async with httpx.AsyncClient() as http_client:
-                        if not pickup_coords:
-                            pickup_res = await http_client.get(f"http://127.0.0.1:8000/api/agents/location/search?place_name={final_pickup_name}")
-                            pickup_res.raise_for_status()
-                            pickup_coords = pickup_res.json()["coordinates"]
-                        dest_res = await http_client.get(f"http://127.0.0.1:8000/api/agents/location/search?place_name={args.get('destination_location')}")
-                        dest_res.raise_for_status()
-                        dest_coords = dest_res.json()["coordinates"]
-                    
-                    ai_response_object = ToolCallResponse(
-                        tool_name="book_ride",
-                        tool_params={"pickup": {"name": final_pickup_name.title(), "coordinates": pickup_coords}, "destination": {"name": args.get("destination_location"), "coordinates": dest_coords}}
-                    )
+async def get_stored_explanation(session_id: Optional[int], prompt_text: Optional[str]) -> Optional[str]:
+    """
+    Returns the explanation generated alongside this prompt's itinerary, from
+    the session's latest itinerary message or from the itinerary cache.
+    """
+    if session_id:
+        explanation = await asyncio.to_thread(_load_session_explanation, session_id, prompt_text)
+        if explanation:
+            return explanation
+    if prompt_text:
+        cached_itinerary = await itinerary_cache.peek(llm_cache.make_key(ITINERARY_CACHE_NAMESPACE, prompt_text))
+        if cached_itinerary:
+            return cached_itinerary.get("explanation")
+    return None
+
+# --- Neural Agent Endpoints ---
+
+@router.post("/", response_model=Union[ItineraryDraft, ToolCallResponse, LocationRequestResponse])
+async def run_neural_agent(request: AgentRequest):
+    prompt_text = _get_prompt_text(request)
+
+    logger.info(f"Neural Agent received prompt: '{prompt_text}' for session: {request.session_id}")
+
+    _save_user_message(request.session_id, prompt_text)
+
+    try:
+        cache_key = llm_cache.make_key(ITINERARY_CACHE_NAMESPACE, prompt_text)
+        ai_response_object: Any = await _get_cached_itinerary(request, cache_key)
+
+        if ai_response_object is not None:
+            logger.info(f"Neural Agent served itinerary from cache for session: {request.session_id}")
         else:
-            response_content = response_message.content
-            if not response_content:
-                raise HTTPException(status_code=500, detail="The AI returned an empty response.")
-            
-            try:
-                itinerary_data = json.loads(response_content)
-                if "itinerary_draft" not in itinerary_data:
-                    raise ValueError("AI response is missing 'itinerary_draft' key.")
-                ai_response_object = ItineraryDraft(**itinerary_data)
-            except (json.JSONDecodeError, ValueError) as e:
-                logger.error(f"Failed to parse AI response as itinerary JSON: {e}\nRaw response: {response_content}")
-                raise HTTPException(status_code=500, detail="I couldn't generate a structured itinerary. Could you rephrase?")
-
-        db = SessionLocal()
-        if request.session_id and ai_response_object:
-            try:
-                ai_message_data: Dict[str, Any] = {"session_id": request.session_id, "sender": 'ai'}
-                if isinstance(ai_response_object, ItineraryDraft):
-                    ai_message_data["content"] = "Here is a draft of your itinerary."
-                    ai_message_data["itinerary"] = json.loads(ai_response_object.model_dump_json(by_alias=True))['itinerary_draft']
-                elif isinstance(ai_response_object, ToolCallResponse):
-                    ai_message_data["content"] = "Of course, I can book that ride for you. Please confirm the details on the map."
-                    ai_message_data["ride_details"] = json.loads(ai_response_object.tool_params.model_dump_json())
-                elif isinstance(ai_response_object, LocationRequestResponse):
-                    ai_message_data["content"] = ai_response_object.message
-                
-                ai_message = chat_models.ChatMessage(**ai_message_data)
-                db.add(ai_message)
-                db.commit()
-            finally:
-                db.close()
+            response = await llm_gateway.chat_completion(
+                "neural",
+                coalesce_on=_coalesce_text(prompt_text, request.include_explanation),
+                model="gpt-4o-mini",
+                messages=_build_messages(prompt_text, request.include_explanation),
+                tools=tools,
+                tool_choice="auto",
+                response_format=itinerary_output.response_format(request.include_explanation)
+            )
+
+            response_message = response.choices[0].message
+            tool_calls = response_message.tool_calls
+
+            if tool_calls:
+                tool_call = tool_calls[0]
+                if tool_call.function.name == "book_ride":
+                    ai_response_object = await _book_ride(json.loads(tool_call.function.arguments), request)
+            else:
+                ai_response_object = await itinerary_output.build_itinerary(response_message.content, prompt_text)
+                await _cache_itinerary(cache_key, ai_response_object)
+
+        _save_ai_message(request.session_id, ai_response_object)
 
         return ai_response_object
 
-    except httpx.HTTPStatusError as e:
-        place_name = e.request.url.params.get("place_name", "the location")
-        raise HTTPException(status_code=404, detail=f"Sorry, I couldn't find a location for '{place_name}'.")
+    except HTTPException:
+        raise
+    except location_agent.PlaceNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Sorry, I couldn't find a location for '{e.place_name}'.")
+    except UpstreamUnavailableError as e:
+        logger.warning(f"Neural Agent upstream unavailable: {e}")
+        raise e.to_http_exception()
     except Exception as e:
         logger.error(f"Error in Neural Agent: {type(e).__name__} - {e}")
-        raise HTTPException(status_code=500, detail="An unexpected error occurred.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An unexpected error occurred.")
+
+@router.post("/stream")
+async def stream_neural_agent(request: AgentRequest):
+    """
+    Streaming variant of the neural agent, served as server-sent events.
+
+    Emits a `day` event for each validated ItineraryDay as soon as its JSON
+    object closes in the completion stream, a `tool_call` or `location_request`
+    event when the model books a ride instead, and finally a `done` event
+    carrying the persisted chat_messages id. Failures are reported as an
+    `error` event because the response status has already been sent.
+    """
+    prompt_text = _get_prompt_text(request)
+    logger.info(f"Neural Agent (stream) received prompt: '{prompt_text}' for session: {request.session_id}")
+    _save_user_message(request.session_id, prompt_text)
+
+    async def event_stream():
+        started_at = time.perf_counter()
+        first_day_logged = False
+        try:
+            cache_key = llm_cache.make_key(ITINERARY_CACHE_NAMESPACE, prompt_text)
+            ai_response_object: Any = await _get_cached_itinerary(request, cache_key)
+
+            if ai_response_object is not None:
+                for day in ai_response_object.itinerary:
+                    yield sse_event("day", day.model_dump())
+            else:
+                parser = JSONArrayItemParser("itinerary_draft")
+                content_parts = []
+                emitted_days = set()
+                streamed_count = 0
+                tool_name = ""
+                tool_arguments = []
+                async for chunk in llm_gateway.stream_chat_completion(
+                    "neural",
+                    model="gpt-4o-mini",
+                    messages=_build_messages(prompt_text, request.include_explanation),
+                    tools=tools,
+                    tool_choice="auto",
+                    response_format=itinerary_output.response_format(request.include_explanation)
+                ):
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta
+                    if delta.tool_calls:
+                        for tool_call_delta in delta.tool_calls:
+                            if tool_call_delta.index != 0 or not tool_call_delta.function:
+                                continue
+                            tool_name += tool_call_delta.function.name or ""
+                            tool_arguments.append(tool_call_delta.function.arguments or "")
+                    if delta.content:
+                        content_parts.append(delta.content)
+                        for day_data in parser.feed(delta.content):
+                            streamed_count += 1
+                            try:
+                                day = ItineraryDay(**itinerary_output.repair_day(day_data, streamed_count))
+                            except ValidationError as e:
+                                logger.warning(f"Deferring invalid streamed itinerary day to the final parse: {e}")
+                                continue
+                            emitted_days.add(day.day)
+                            if not first_day_logged:
+                                first_day_logged = True
+                                logger.info(f"Neural Agent (stream) time to first day: {time.perf_counter() - started_at:.3f}s")
+                            yield sse_event("day", day.model_dump())
+
+                if tool_name == "book_ride":
+                    ai_response_object = await _book_ride(json.loads("".join(tool_arguments)), request)
+                    if isinstance(ai_response_object, ToolCallResponse):
+                        yield sse_event("tool_call", ai_response_object.model_dump())
+                    else:
+                        yield sse_event("location_request", ai_response_object.model_dump())
+                else:
+                    ai_response_object = await itinerary_output.build_itinerary("".join(content_parts), prompt_text)
+                    # Days repaired or re-asked after the stream ended.
+                    for day in ai_response_object.itinerary:
+                        if day.day not in emitted_days:
+                            yield sse_event("day", day.model_dump())
+                    await _cache_itinerary(cache_key, ai_response_object)
+
+            saved = _save_ai_message(request.session_id, ai_response_object)
+            # The day events are already out; only the final event waits for the write-behind commit.
+            message_id = await saved if saved is not None else None
+            done = {"message_id": message_id, "elapsed_ms": round((time.perf_counter() - started_at) * 1000)}
+            if isinstance(ai_response_object, ItineraryDraft) and ai_response_object.explanation:
+                done["explanation"] = ai_response_object.explanation
+            yield sse_event("done", done)
+
+        except location_agent.PlaceNotFoundError as e:
+            yield sse_event("error", {"status_code": 404, "detail": f"Sorry, I couldn't find a location for '{e.place_name}'."})
+        except HTTPException as e:
+            yield sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+        except UpstreamUnavailableError as e:
+            logger.warning(f"Neural Agent (stream) upstream unavailable: {e}")
+            yield sse_event("error", {"status_code": e.status_code, "detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            logger.error(f"Error in Neural Agent (stream): {type(e).__name__} - {e}")
+            yield sse_event("error", {"status_code": 500, "detail": "An unexpected error occurred."})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/cache/stats")
+async def get_itinerary_cache_stats():
+    """Returns hit/miss counters and sizes for the itinerary response cache."""
+    return itinerary_cache.stats()
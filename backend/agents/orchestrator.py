@@ -0,0 +1,156 @@
+# File: backend/agents/orchestrator.py
+import time
+import asyncio
+import logging
+import functools
+from typing import Any, Callable, Dict, Optional
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from schemas.agent import ItineraryDraft, OrchestrationRequest, OrchestrationResponse
+from agents import neural, emotional, radar
+from mcp import context
+from llm import resilience
+from llm.resilience import UpstreamUnavailableError
+
+# --- Setup ---
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+AGENT_RUNNERS = {
+    "neural": neural.run_neural_agent,
+    "emotional": emotional.run_emotional_agent,
+    "radar": radar.run_radar_agent,
+    "mcp_context": context.get_mcp_context,
+}
+
+# Agents still running when the deadline passes are not cancelled, so work that already
+# finished (chat history writes) is kept; their LLM calls share the orchestration deadline
+# and give up soon after it. References are kept here until they end.
+_background_tasks: set = set()
+# Share of the remaining deadline the itinerary gets to deliver the context explanation
+# before the separate MCP context call starts as a fallback.
+CONTEXT_FALLBACK_SHARE = 0.5
+
+
+def _detach(name: str, task: asyncio.Task):
+    def _finished(task: asyncio.Task):
+        _background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Late agent {name} failed after the deadline: {task.exception()}")
+
+    _background_tasks.add(task)
+    task.add_done_callback(_finished)
+
+
+def _serialize(result: Any) -> Any:
+    if isinstance(result, BaseModel):
+        return result.model_dump(by_alias=True)
+    return result
+
+
+async def _timed(name: str, runner: Callable, request: OrchestrationRequest, latencies: Dict[str, float]):
+    started = time.perf_counter()
+    try:
+        return await runner(request)
+    finally:
+        latencies[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def _explanation(neural_task: asyncio.Task) -> Optional[str]:
+    if neural_task.cancelled() or neural_task.exception() is not None:
+        return None
+    itinerary = neural_task.result()
+    return itinerary.explanation if isinstance(itinerary, ItineraryDraft) else None
+
+
+async def _context_from_neural(neural_task: asyncio.Task, request: OrchestrationRequest):
+    """
+    MCP context from the neural agent's itinerary explanation, saving a
+    separate LLM call. That call only starts if the itinerary fails, has no
+    explanation, or is still running once CONTEXT_FALLBACK_SHARE of the
+    remaining deadline has passed; then whichever answers first wins.
+    """
+    time_left = resilience.remaining()
+    grace = None if time_left is None else max(0.0, time_left * CONTEXT_FALLBACK_SHARE)
+    done, _ = await asyncio.wait({neural_task}, timeout=grace)
+    if done:
+        explanation = _explanation(neural_task)
+        if explanation:
+            return {"content": explanation}
+        return await context.get_mcp_context(request)
+
+    fallback = asyncio.ensure_future(context.get_mcp_context(request))
+    try:
+        pending = {neural_task, fallback}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            if neural_task in done:
+                explanation = _explanation(neural_task)
+                if explanation:
+                    return {"content": explanation}
+            if fallback in done and fallback.exception() is None:
+                return fallback.result()
+        # Neither produced a context; surface the fallback's error.
+        return await fallback
+    finally:
+        if not fallback.done():
+            fallback.cancel()
+
+
+# --- Orchestration Endpoint ---
+@router.post("/", response_model=OrchestrationResponse)
+async def run_agents(request: OrchestrationRequest):
+    """
+    Runs the selected agents concurrently for one user turn under a shared deadline.
+
+    Agents that finish in time contribute to `results` (or `errors` if they
+    failed); the rest are listed in `timed_out`. Per-agent latency is
+    reported for every agent that completed.
+    """
+    selected = list(dict.fromkeys(request.agents))
+    unknown = [name for name in selected if name not in AGENT_RUNNERS]
+    if unknown or not selected:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Unknown or missing agents: {unknown}. Choose from {sorted(AGENT_RUNNERS)}.",
+        )
+
+    started = time.perf_counter()
+    latencies: Dict[str, float] = {}
+    if "neural" in selected and "mcp_context" in selected:
+        # The itinerary completion also writes the context explanation, saving a call.
+        request = request.model_copy(update={"include_explanation": True})
+    tasks: Dict[str, asyncio.Task] = {}
+    timeout = request.deadline_ms / 1000
+    # Tasks inherit the deadline, so LLM calls still running when it passes give up
+    # (and free their gateway slots) instead of running their own full timeouts.
+    with resilience.deadline(timeout):
+        for name in sorted(selected, key=lambda n: n == "mcp_context"):
+            runner = AGENT_RUNNERS[name]
+            if name == "mcp_context" and "neural" in tasks:
+                runner = functools.partial(_context_from_neural, tasks["neural"])
+            tasks[name] = asyncio.ensure_future(_timed(name, runner, request, latencies))
+        done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+
+    response = OrchestrationResponse(elapsed_ms=0)
+    for name, task in tasks.items():
+        if task in pending:
+            response.timed_out.append(name)
+            _detach(name, task)
+            continue
+        error = task.exception()
+        if error is None:
+            response.results[name] = _serialize(task.result())
+        elif isinstance(error, HTTPException):
+            response.errors[name] = str(error.detail)
+        elif isinstance(error, UpstreamUnavailableError):
+            response.errors[name] = str(error)
+        else:
+            logger.error(f"Orchestrated agent {name} failed: {type(error).__name__} - {error}")
+            response.errors[name] = "An unexpected error occurred."
+
+    response.latency_ms = {name: latencies[name] for name in selected if name in latencies}
+    response.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    if response.timed_out:
+        logger.warning(f"Orchestration deadline of {request.deadline_ms}ms passed; still running: {response.timed_out}")
+    return response
@@ -1,7 +1,11 @@
 # File: backend/agents/radar.py
 from fastapi import APIRouter, HTTPException
 from schemas.agent import AgentRequest, AgentResponse
-from openai import AsyncOpenAI
+from llm import gateway as llm_gateway
+from llm.resilience import UpstreamUnavailableError
+from agents import radar_feeds, radar_digests
+import os
+import asyncio
 import logging
 import json
 
@@ -24,62 +28,70 @@ Raw Data: {"flights": {"status": "On Time", "price_usd": 1200}, "weather": {"for
 Your Summary: "Flights to Zurich are on time, priced around $1200. Expect sunny weather with temperatures around 22°C."
 """
 
-# Mock external data
-MOCK_EXTERNAL_DATA = {
-    "flights": {
-        "from": "JFK",
-        "to": "ZRH",
-        "status": "On Time",
-        "price_usd": 1450,
-        "airline": "Swiss Air"
-    },
-    "weather": {
-        "location": "Zurich",
-        "forecast": "Clear skies with light breeze",
-        "temp_c": 24
-    },
-    "events": [
-        {
-            "name": "Zurich Art Weekend",
-            "type": "Art Fair",
-            "venue": "Various Galleries"
-        }
-    ]
-}
+DIGEST_QUERY = "What's the current flight, weather and events situation for a luxury trip to {destination}?"
+
+# Off switch for the pre-computed digests; when disabled every request is summarized on demand.
+DIGESTS_ENABLED = os.getenv("RADAR_DIGESTS", "true").lower() in ("1", "true", "yes")
+
+
+async def summarize(query: str, raw_data: str) -> str:
+    """Asks the LLM to summarize serialized feed data for a query."""
+    combined_prompt = f"""
+        User Query: "{query}"
+        Raw Data: {raw_data}
+        """
+    response = await llm_gateway.chat_completion(
+        "radar",
+        coalesce_on=combined_prompt,
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": RADAR_AGENT_PROMPT},
+            {"role": "user", "content": combined_prompt},
+        ],
+        temperature=0.3,
+        max_tokens=150,
+    )
+    return response.choices[0].message.content
+
+
+async def summarize_destination(destination: str, raw_data: str) -> str:
+    return await summarize(DIGEST_QUERY.format(destination=destination), raw_data)
+
+
+digests = radar_digests.DigestService(radar_feeds.build_feeds(), summarize_destination)
 
 
 @router.post("/", response_model=AgentResponse)
 async def run_radar_agent(request: AgentRequest):
     """
     Fetches and interprets external context (flights, weather, events) for the user.
+
+    Served from the destination's pre-computed digest, which is refreshed in
+    the background; `bypass_cache` forces a fresh summary.
     """
     logger.info(f"Radar Agent received prompt: {request.prompt}")
     try:
-        # Initialize client inside the endpoint
-        client = AsyncOpenAI()
+        destination = digests.resolve_destination(request.prompt)
+        if DIGESTS_ENABLED:
+            digest, state = await digests.get(destination, force_refresh=request.bypass_cache)
+            logger.info(f"Radar Agent served {state} digest for {destination} ({digest.age():.0f}s old)")
+            return AgentResponse(response=digest.summary)
 
-        # Combine the user prompt with the mock data for the AI
-        combined_prompt = f"""
-        User Query: "{request.prompt}"
-        Raw Data: {json.dumps(MOCK_EXTERNAL_DATA)}
-        """
-        
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": RADAR_AGENT_PROMPT},
-                {"role": "user", "content": combined_prompt},
-            ],
-            temperature=0.3,
-            max_tokens=150,
-        )
-        
-        summary = response.choices[0].message.content
+        # Without digests: fetch the feeds and summarize them for this exact query.
+        snapshots = await asyncio.gather(*(feed.fetch(destination) for feed in digests.feeds.values()))
+        summary = await summarize(request.prompt, json.dumps(dict(zip(digests.feeds, snapshots))))
         logger.info(f"Radar Agent received OpenAI summary: {summary}")
-        
         return AgentResponse(response=summary)
 
+    except UpstreamUnavailableError as e:
+        logger.warning(f"Radar Agent upstream unavailable: {e}")
+        raise e.to_http_exception()
     except Exception as e:
         logger.error(f"Error in Radar Agent: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch context from Radar Agent.")
 
+
+@router.get("/digests")
+async def get_digest_stats():
+    """Returns the age and freshness of each destination's radar digest and the configured feeds."""
+    return digests.stats()
@@ -0,0 +1,221 @@
+# File: backend/agents/radar_digests.py
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from agents.radar_feeds import FeedAdapter
+from llm.cache import normalize_prompt
+from metrics.registry import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DESTINATIONS = [
+    d.strip() for d in os.getenv(
+        "RADAR_DESTINATIONS", "Zurich,Geneva,Lucerne,Zermatt,Interlaken,St. Moritz,Basel,Bern,Lugano,Lausanne"
+    ).split(",") if d.strip()
+]
+# Serves queries that do not name one of the destinations above.
+DEFAULT_DESTINATION = os.getenv("RADAR_DEFAULT_DESTINATION", DESTINATIONS[0] if DESTINATIONS else "Zurich")
+SCHEDULER_INTERVAL = float(os.getenv("RADAR_REFRESH_INTERVAL", "60"))
+FRESH_SECONDS = float(os.getenv("RADAR_DIGEST_FRESH_SECONDS", "300"))
+STALE_SECONDS = float(os.getenv("RADAR_DIGEST_STALE_SECONDS", "3600"))
+REFRESH_CONCURRENCY = 4
+
+DIGEST_REQUESTS = REGISTRY.counter("radar_digest_requests_total", "Radar digest reads by cache state (fresh, stale, miss).", ("state",))
+DIGEST_REFRESHES = REGISTRY.counter(
+    "radar_digest_refreshes_total",
+    "Radar digest refreshes by result (summarized, unchanged, error).",
+    ("result",),
+)
+
+Summarizer = Callable[[str, str], Awaitable[str]]
+
+
+class Digest:
+    """A destination's radar summary and the feed data it was written from."""
+
+    def __init__(self, destination: str, summary: str, fingerprint: str, feeds: Dict[str, Any]):
+        self.destination = destination
+        self.summary = summary
+        self.fingerprint = fingerprint
+        self.feeds = feeds
+        self.summarized_at = time.time()
+        # Last time the feeds were checked and still matched this summary.
+        self.refreshed_at = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.refreshed_at
+
+
+class DigestService:
+    """
+    Pre-computed radar summaries per destination, served stale-while-revalidate.
+
+    A background scheduler re-fetches each destination's feeds before its
+    digest turns stale and asks the LLM for a new summary only when the
+    feed data actually changed. Reads return a fresh digest directly, a
+    stale one while a refresh runs in the background, and wait for a
+    refresh only when there is nothing usable (first request, or older
+    than `stale_seconds`).
+    """
+
+    def __init__(
+        self,
+        feeds: Dict[str, FeedAdapter],
+        summarize: Summarizer,
+        destinations: List[str] = DESTINATIONS,
+        default_destination: str = DEFAULT_DESTINATION,
+        fresh_seconds: float = FRESH_SECONDS,
+        stale_seconds: float = STALE_SECONDS,
+        interval: float = SCHEDULER_INTERVAL,
+    ):
+        self.feeds = feeds
+        self.summarize = summarize
+        self.destinations = list(destinations)
+        self.default_destination = default_destination
+        self.fresh_seconds = fresh_seconds
+        self.stale_seconds = max(stale_seconds, fresh_seconds)
+        self.interval = interval
+        self._aliases = {normalize_prompt(d): d for d in self.destinations}
+        self._digests: Dict[str, Digest] = {}
+        # (feed, destination) -> (monotonic fetch time, snapshot)
+        self._snapshots: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._scheduler: Optional[asyncio.Task] = None
+
+    # --- Reads ---
+
+    def resolve_destination(self, query: Optional[str]) -> str:
+        """Finds the first configured destination named in the query."""
+        normalized = f" {normalize_prompt(query or '')} "
+        matches = [(normalized.find(f" {alias} "), name) for alias, name in self._aliases.items() if f" {alias} " in normalized]
+        return min(matches)[1] if matches else self.default_destination
+
+    async def get(self, destination: str, force_refresh: bool = False) -> Tuple[Digest, str]:
+        """Returns (digest, state) where state is "fresh", "stale" or "miss"."""
+        digest = self._digests.get(destination)
+        if digest is not None and not force_refresh:
+            age = digest.age()
+            if age <= self.fresh_seconds:
+                DIGEST_REQUESTS.inc(state="fresh")
+                return digest, "fresh"
+            if age <= self.stale_seconds:
+                DIGEST_REQUESTS.inc(state="stale")
+                self.refresh(destination)
+                return digest, "stale"
+        DIGEST_REQUESTS.inc(state="miss")
+        return await asyncio.shield(self.refresh(destination, force=force_refresh)), "miss"
+
+    # --- Refresh ---
+
+    def refresh(self, destination: str, force: bool = False) -> asyncio.Task:
+        """Starts (or joins) the refresh of one destination's digest."""
+        task = self._inflight.get(destination)
+        if task is None:
+            task = asyncio.ensure_future(self._refresh(destination, force))
+            self._inflight[destination] = task
+            task.add_done_callback(lambda t: self._finish(destination, t))
+        return task
+
+    def _finish(self, destination: str, task: asyncio.Task):
+        if self._inflight.get(destination) is task:
+            del self._inflight[destination]
+        if not task.cancelled() and task.exception() is not None:
+            DIGEST_REFRESHES.inc(result="error")
+            logger.warning(f"Radar digest refresh for {destination} failed: {task.exception()}")
+
+    async def _fetch(self, feed: FeedAdapter, destination: str, force: bool) -> Optional[Any]:
+        key = (feed.name, destination)
+        cached = self._snapshots.get(key)
+        if cached and not force and time.monotonic() - cached[0] < feed.refresh_interval:
+            return cached[1]
+        try:
+            snapshot = await feed.fetch(destination)
+        except Exception as e:
+            logger.warning(f"Radar feed '{feed.name}' failed for {destination}: {e}")
+            # Keep serving the last good snapshot rather than dropping the feed from the digest.
+            return cached[1] if cached else None
+        self._snapshots[key] = (time.monotonic(), snapshot)
+        return snapshot
+
+    async def _refresh(self, destination: str, force: bool) -> Digest:
+        snapshots = await asyncio.gather(*(self._fetch(feed, destination, force) for feed in self.feeds.values()))
+        data = {name: snapshot for name, snapshot in zip(self.feeds, snapshots) if snapshot is not None}
+        if not data:
+            raise RuntimeError(f"No radar feed data available for {destination}")
+
+        raw_data = json.dumps(data, sort_keys=True)
+        fingerprint = hashlib.sha256(raw_data.encode("utf-8")).hexdigest()
+        current = self._digests.get(destination)
+        if current is not None and current.fingerprint == fingerprint and not force:
+            current.refreshed_at = time.monotonic()
+            DIGEST_REFRESHES.inc(result="unchanged")
+            return current
+
+        summary = await self.summarize(destination, raw_data)
+        digest = Digest(destination, summary, fingerprint, data)
+        self._digests[destination] = digest
+        DIGEST_REFRESHES.inc(result="summarized")
+        logger.info(f"Radar digest for {destination} updated")
+        return digest
+
+    # --- Scheduler ---
+
+    async def refresh_due(self):
+        """Refreshes every destination whose digest is missing or would turn stale before the next tick."""
+        due = [d for d in self.destinations if d not in self._digests or self._digests[d].age() >= self.fresh_seconds - self.interval]
+        semaphore = asyncio.Semaphore(REFRESH_CONCURRENCY)
+
+        async def bounded(destination: str):
+            async with semaphore:
+                try:
+                    await asyncio.shield(self.refresh(destination))
+                except Exception:
+                    pass  # Logged and counted in _finish.
+
+        await asyncio.gather(*(bounded(d) for d in due))
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh_due()
+            except Exception as e:
+                logger.error(f"Radar digest scheduler tick failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Starts the background scheduler; the first tick warms every destination."""
+        if self._scheduler is None:
+            self._scheduler = asyncio.ensure_future(self._run())
+            logger.info(f"Radar digest scheduler started for {len(self.destinations)} destinations every {self.interval:.0f}s")
+
+    async def stop(self):
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+            await asyncio.gather(self._scheduler, return_exceptions=True)
+            self._scheduler = None
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+        for feed in self.feeds.values():
+            await feed.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "scheduler_running": self._scheduler is not None and not self._scheduler.done(),
+            "fresh_seconds": self.fresh_seconds,
+            "stale_seconds": self.stale_seconds,
+            "feeds": {name: type(feed).__name__ for name, feed in self.feeds.items()},
+            "destinations": {
+                destination: {
+                    "age_seconds": round(digest.age(), 1),
+                    "state": "fresh" if digest.age() <= self.fresh_seconds else "stale" if digest.age() <= self.stale_seconds else "expired",
+                    "summarized_at": digest.summarized_at,
+                    "refreshing": destination in self._inflight,
+                }
+                for destination, digest in sorted(self._digests.items())
+            },
+        }
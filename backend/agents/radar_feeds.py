@@ -0,0 +1,137 @@
+# File: backend/agents/radar_feeds.py
+import os
+import copy
+import logging
+from typing import Any, Dict, List, Optional
+import httpx
+from upstream import transport as upstream
+
+logger = logging.getLogger(__name__)
+
+# Airport used for flight data per destination; unknown destinations fly into Zurich.
+DESTINATION_AIRPORTS = {
+    "Zurich": "ZRH",
+    "Geneva": "GVA",
+    "Basel": "BSL",
+    "Lausanne": "GVA",
+    "Montreux": "GVA",
+    "Zermatt": "GVA",
+    "Verbier": "GVA",
+    "Lugano": "LUG",
+}
+DEFAULT_AIRPORT = "ZRH"
+
+# Sample data served by the built-in feeds until real feed URLs are configured.
+MOCK_FLIGHT = {"from": "JFK", "status": "On Time", "price_usd": 1450, "airline": "Swiss Air"}
+MOCK_WEATHER = {"forecast": "Clear skies with light breeze", "temp_c": 24}
+# Sample events per destination; destinations without an entry have no events.
+MOCK_EVENTS = {
+    "Zurich": [{"name": "Zurich Art Weekend", "type": "Art Fair", "venue": "Various Galleries"}],
+    "Geneva": [{"name": "Fêtes de Genève", "type": "Festival", "venue": "Lakefront"}],
+    "Lucerne": [{"name": "Lucerne Festival", "type": "Classical Music", "venue": "KKL Luzern"}],
+    "Zermatt": [{"name": "Zermatt Unplugged", "type": "Music Festival", "venue": "Various Venues"}],
+    "Interlaken": [{"name": "Jungfrau Marathon", "type": "Sports", "venue": "Höhematte"}],
+    "St. Moritz": [{"name": "Snow Polo World Cup", "type": "Sports", "venue": "Lake St. Moritz"}],
+    "Basel": [{"name": "Art Basel", "type": "Art Fair", "venue": "Messe Basel"}],
+    "Bern": [{"name": "Zibelemärit", "type": "Market", "venue": "Old Town"}],
+    "Lugano": [{"name": "LongLake Festival", "type": "Festival", "venue": "Lakefront"}],
+    "Lausanne": [{"name": "Festival de la Cité", "type": "Festival", "venue": "Old Town"}],
+}
+
+
+class FeedAdapter:
+    """
+    A source of radar data for a destination (flights, weather, events, ...).
+
+    `fetch` returns the feed's current JSON-serializable snapshot. The
+    scheduler calls it every `refresh_interval` seconds per destination and
+    only re-summarizes a destination when one of its snapshots changed.
+    """
+
+    name = "base"
+
+    def __init__(self, refresh_interval: float = 300.0):
+        self.refresh_interval = refresh_interval
+
+    async def fetch(self, destination: str) -> Any:
+        raise NotImplementedError
+
+    async def aclose(self):
+        pass
+
+
+class MockFlightsFeed(FeedAdapter):
+    name = "flights"
+
+    async def fetch(self, destination: str) -> Any:
+        return {**MOCK_FLIGHT, "to": DESTINATION_AIRPORTS.get(destination, DEFAULT_AIRPORT)}
+
+
+class MockWeatherFeed(FeedAdapter):
+    name = "weather"
+
+    async def fetch(self, destination: str) -> Any:
+        return {"location": destination, **MOCK_WEATHER}
+
+
+class MockEventsFeed(FeedAdapter):
+    name = "events"
+
+    async def fetch(self, destination: str) -> Any:
+        return copy.deepcopy(MOCK_EVENTS.get(destination, []))
+
+
+class HTTPJSONFeed(FeedAdapter):
+    """
+    Fetches a feed from a JSON HTTP endpoint. `url_template` may contain
+    `{destination}`, e.g. "https://weather.example.com/v1/current?city={destination}".
+    """
+
+    def __init__(self, name: str, url_template: str, refresh_interval: float = 300.0, timeout: float = 5.0):
+        super().__init__(refresh_interval)
+        self.name = name
+        self.url_template = url_template
+        # One request per destination per refresh; a small keep-alive pool covers it.
+        limits = httpx.Limits(
+            max_connections=int(os.getenv("RADAR_FEED_MAX_CONNECTIONS", "10")),
+            max_keepalive_connections=int(os.getenv("RADAR_FEED_MAX_KEEPALIVE", "5")),
+            keepalive_expiry=60.0,
+        )
+        self._client = httpx.AsyncClient(
+            limits=limits,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 3.0)),
+            # Replay/synthetic upstream modes answer feed calls locally (see upstream.transport).
+            transport=upstream.build_transport("radar", limits=limits),
+        )
+
+    async def fetch(self, destination: str) -> Any:
+        response = await self._client.get(self.url_template.format(destination=destination))
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+def build_feeds(names: Optional[List[str]] = None) -> Dict[str, FeedAdapter]:
+    """
+    Builds the configured feeds. Each built-in feed (flights, weather, events)
+    serves sample data unless RADAR_FEED_<NAME>_URL points it at a JSON
+    endpoint; extra feeds can be added the same way by listing them in RADAR_FEEDS.
+    """
+    builtins = {"flights": MockFlightsFeed, "weather": MockWeatherFeed, "events": MockEventsFeed}
+    if names is None:
+        names = [n.strip().lower() for n in os.getenv("RADAR_FEEDS", "flights,weather,events").split(",") if n.strip()]
+
+    feeds: Dict[str, FeedAdapter] = {}
+    for name in names:
+        prefix = f"RADAR_FEED_{name.upper()}"
+        interval = float(os.getenv(f"{prefix}_INTERVAL", "300"))
+        url = os.getenv(f"{prefix}_URL")
+        if url:
+            feeds[name] = HTTPJSONFeed(name, url, refresh_interval=interval)
+        elif name in builtins:
+            feeds[name] = builtins[name](refresh_interval=interval)
+        else:
+            logger.warning(f"Radar feed '{name}' has no {prefix}_URL and no built-in source; skipping it")
+    return feeds
@@ -0,0 +1,330 @@
+# File: backend/agents/slot_filling.py
+import re
+import logging
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+from schemas.agent import Message
+from agents import gazetteer
+
+logger = logging.getLogger(__name__)
+
+READY_TO_PLAN = "READY_TO_PLAN"
+
+# Questions asked when the engine answers a turn itself. They are phrased so that
+# `classify_question` recognises them, just like the LLM's own questions.
+QUESTIONS = {
+    "travelers": "Sounds wonderful! How many travelers will be joining this trip?",
+    "dates": "Thank you! What dates are you planning to travel?",
+    "flights": "Great. Have you already booked your flights?",
+}
+SLOT_ORDER = ["request", "travelers", "dates", "flights"]
+
+# --- Travelers ---
+
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+_COUNT = r"(\d{1,2}|" + "|".join(_NUMBER_WORDS) + r")"
+_PEOPLE_NOUN = r"(?:people|persons?|adults?|kids?|children|child|travell?ers?|guests?|pax|of us|teenagers?|infants?|babies|baby)"
+_PEOPLE_RE = re.compile(rf"\b{_COUNT}\s+(?:\w+\s+)?({_PEOPLE_NOUN})\b")
+# Nouns that count the whole party ("4 people"), so a couple mentioned alongside is already included.
+_TOTAL_NOUN_RE = re.compile(r"^(?:people|persons?|travell?ers?|guests?|pax|of us)$")
+_FAMILY_RE = re.compile(rf"\b(?:family|group|party) of {_COUNT}\b")
+_BARE_COUNT_RE = re.compile(rf"^\W*(?:we are|we're|there are|there will be|it's|its|just)?\s*{_COUNT}\W*$")
+_SOLO_RE = re.compile(r"\b(?:just me|only me|myself|solo|alone|by myself|on my own|one person)\b")
+_PAIR_RE = re.compile(r"\b(?:a couple|as a couple|my (?:wife|husband|partner|girlfriend|boyfriend|fiancee?|friend) and (?:i|me)|me and my (?:wife|husband|partner|girlfriend|boyfriend|fiancee?|friend)|the two of us|both of us)\b")
+
+
+def _to_int(token: str) -> int:
+    return int(token) if token.isdigit() else _NUMBER_WORDS[token]
+
+
+def extract_travelers(text: str, expecting: bool = False) -> Optional[int]:
+    """
+    Returns the number of travelers mentioned in `text`.
+
+    Counts need a people noun ("2 adults and 1 child" -> 3) unless
+    `expecting` is set, i.e. the user is answering a "how many" question,
+    in which case a bare number ("two", "4") is accepted too. A couple
+    adds to counts of others ("me and my wife and 2 kids" -> 4); next to
+    a count of adults it is ambiguous and yields None.
+    """
+    lowered = text.lower()
+    matches = [(_to_int(m.group(1)), m.group(2)) for m in _PEOPLE_RE.finditer(lowered)]
+    pair = bool(_PAIR_RE.search(lowered))
+    if matches:
+        total = sum(count for count, _ in matches)
+        if not pair or any(_TOTAL_NOUN_RE.match(noun) for _, noun in matches):
+            return total
+        if any(noun.startswith("adult") for _, noun in matches):
+            # "me and my wife and 2 adults" could mean 2 or 4.
+            return None
+        return total + 2
+    family = _FAMILY_RE.search(lowered)
+    if family:
+        return _to_int(family.group(1))
+    if pair:
+        return 2
+    if _SOLO_RE.search(lowered):
+        return 1
+    if expecting:
+        bare = _BARE_COUNT_RE.match(lowered.strip())
+        if bare:
+            return _to_int(bare.group(1))
+    return None
+
+# --- Dates ---
+
+_MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_MONTH = r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+_DAY = r"(\d{1,2})(?:st|nd|rd|th)?"
+_YEAR = r"(?:,?\s+(\d{4}))?"
+_RANGE_SEP = r"\s*(?:-|–|to|until|till|through|and)\s*"
+
+_ISO_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+_NUMERIC_RE = re.compile(r"\b(\d{1,2})[./](\d{1,2})(?:[./](\d{2,4}))?\b")
+_MONTH_DAY_RE = re.compile(rf"\b{_MONTH}\s+{_DAY}{_YEAR}\b")
+_DAY_MONTH_RE = re.compile(rf"\b{_DAY}\s+(?:of\s+)?{_MONTH}{_YEAR}\b")
+# "June 12-15" and "12-15 June": a day range sharing one month.
+_MONTH_DAY_RANGE_RE = re.compile(rf"\b{_MONTH}\s+{_DAY}{_RANGE_SEP}{_DAY}{_YEAR}\b")
+_DAY_RANGE_MONTH_RE = re.compile(rf"\b{_DAY}{_RANGE_SEP}{_DAY}\s+(?:of\s+)?{_MONTH}{_YEAR}\b")
+_RELATIVE_RE = re.compile(
+    r"\b(today|tomorrow|this weekend|next weekend|next week|next month|in \d+ (?:days|weeks)|"
+    rf"(?:in|during|early|mid|late|end of|beginning of)\s+{_MONTH})\b"
+)
+
+
+def _month(token: str) -> int:
+    return _MONTHS[token[:4] if token.startswith("sept") else token[:3]]
+
+
+def _make_date(year: Optional[str], month: int, day: int, today: date) -> Optional[date]:
+    try:
+        if year:
+            return date(int(year) + (2000 if len(year) == 2 else 0), month, day)
+        candidate = date(today.year, month, day)
+        return candidate if candidate >= today else date(today.year + 1, month, day)
+    except ValueError:
+        return None
+
+
+def extract_dates(text: str, expecting: bool = False, today: Optional[date] = None) -> Optional[Tuple[Optional[date], Optional[date]]]:
+    """
+    Returns (start, end) travel dates found in `text`, or None.
+
+    Understands ISO and European numeric dates, "June 12"/"12th of June",
+    day ranges ("June 12-15", "12 to 18 July") and pairs of full dates.
+    When `expecting` an answer to a dates question, relative or vague
+    answers ("next week", "in July") also count and yield (None, None).
+    """
+    today = today or date.today()
+    lowered = text.lower()
+
+    for regex, month_group, first_group, second_group, year_group in (
+        (_MONTH_DAY_RANGE_RE, 1, 2, 3, 4),
+        (_DAY_RANGE_MONTH_RE, 3, 1, 2, 4),
+    ):
+        match = regex.search(lowered)
+        if match:
+            month = _month(match.group(month_group))
+            start = _make_date(match.group(year_group), month, int(match.group(first_group)), today)
+            end = _make_date(match.group(year_group), month, int(match.group(second_group)), today)
+            if start and end and end >= start:
+                return start, end
+
+    found: List[Tuple[int, date]] = []
+    for m in _ISO_RE.finditer(lowered):
+        d = _make_date(m.group(1), int(m.group(2)), int(m.group(3)), today)
+        if d:
+            found.append((m.start(), d))
+    for m in _NUMERIC_RE.finditer(lowered):
+        # Without a year, "1.5" could just as well be a duration or a price.
+        if m.group(3) is None and not expecting:
+            continue
+        if _ISO_RE.search(lowered[max(0, m.start() - 5):m.end() + 3]):
+            continue
+        d = _make_date(m.group(3), int(m.group(2)), int(m.group(1)), today)
+        if d:
+            found.append((m.start(), d))
+    for m in _MONTH_DAY_RE.finditer(lowered):
+        d = _make_date(m.group(3), _month(m.group(1)), int(m.group(2)), today)
+        if d:
+            found.append((m.start(), d))
+    for m in _DAY_MONTH_RE.finditer(lowered):
+        d = _make_date(m.group(3), _month(m.group(2)), int(m.group(1)), today)
+        if d:
+            found.append((m.start(), d))
+
+    if found:
+        dates = sorted({d for _, d in sorted(found)})
+        return dates[0], (dates[-1] if len(dates) > 1 else None)
+
+    if expecting and _RELATIVE_RE.search(lowered):
+        relative = _RELATIVE_RE.search(lowered).group(1)
+        if relative == "today":
+            return today, None
+        if relative == "tomorrow":
+            return today + timedelta(days=1), None
+        return None, None
+    return None
+
+# --- Flight Status ---
+
+_YES_RE = re.compile(r"\b(?:yes|yep|yeah|yup|sure|correct|already booked|already have|all booked|got (?:our|my|the) flights?|have (?:our|my|the) flights?|flights? (?:are|is) (?:already )?booked|booked)\b")
+# Uncertain answers ("not sure", "no idea") would otherwise read as a yes or a no.
+_UNSURE_RE = re.compile(r"\b(?:not sure|unsure|not certain|no idea|(?:i )?(?:don't|dont|do not) know|dunno|maybe|perhaps|not decided|undecided|(?:haven't|have not|havent) decided)\b")
+_NO_RE = re.compile(r"\b(?:(?:haven't|have not|havent|didn't|did not|didnt) (?:yet )?(?:booked|book)|no|nope|nah|not yet|haven't|have not|havent|not booked|need (?:to book )?(?:the |our )?flights?|still need|don't have|dont have)\b")
+
+
+def detect_flight_status(text: str, expecting: bool = False) -> Optional[bool]:
+    """
+    Returns True if flights are booked, False if not, None when unclear.
+
+    Outside of a direct answer to the flights question the text must
+    mention flights explicitly. Uncertain answers and questions ("Do I need
+    to book them?") are left unclear so the LLM can respond.
+    """
+    lowered = text.lower().strip()
+    if not expecting and "flight" not in lowered:
+        return None
+    if _UNSURE_RE.search(lowered) or lowered.endswith("?") or _QUESTION_RE.match(lowered):
+        return None
+    no = bool(_NO_RE.search(lowered))
+    # Negated phrases ("haven't booked") must not also count as a yes.
+    yes = bool(_YES_RE.search(_NO_RE.sub(" ", lowered)))
+    if yes == no:
+        return None
+    return yes
+
+# --- Trip Requests ---
+
+# Asking for a plan, which makes even a question ("Can you plan 3 days in Bern?") a trip request.
+_PLAN_RE = re.compile(r"\b(?:plan(?:s|ning)?|itinerary|itineraries|organi[sz]e|arrange|put together|schedule)\b")
+_TRIP_RE = re.compile(
+    r"\b(?:trip|travel(?:l?ing)?|visit(?:ing)?|vacation|holiday|getaway|honeymoon|tour|stay(?:ing)?|explore|"
+    r"go(?:ing)? to|heading to|weekend|\d+\s*-?\s*(?:days?|nights?|weeks?)|(?:a|one|two|three) weeks?)\b"
+)
+_QUESTION_RE = re.compile(r"^(?:what|when|where|which|who|why|how|is|are|was|were|can|could|do|does|did|should|would|will)\b")
+
+
+def looks_like_trip_request(text: str) -> bool:
+    """
+    True when a message asks for a trip: it names travelers or dates, asks
+    for a plan, or (unless it is a question) mentions travel or a Swiss
+    destination. Greetings and free-form questions ("What is the best time
+    to visit Zermatt?") are not requests.
+    """
+    lowered = text.lower().strip()
+    if not lowered:
+        return False
+    if extract_travelers(lowered) or extract_dates(lowered) is not None or _PLAN_RE.search(lowered):
+        return True
+    if lowered.endswith("?") or _QUESTION_RE.match(lowered):
+        return False
+    return bool(_TRIP_RE.search(lowered) or gazetteer.get_gazetteer().mentions(lowered))
+
+# --- State Machine ---
+
+_FEEDBACK_RE = re.compile(r"\b(?:change|improve|modify|update|instead|replace|swap|remove|add|adjust|different|cheaper|more|less)\b")
+
+
+def classify_question(text: str) -> Optional[str]:
+    """Maps an assistant message to the slot it asks about, if recognisable."""
+    lowered = text.lower()
+    if READY_TO_PLAN.lower() in lowered:
+        return "ready"
+    if "flight" in lowered:
+        return "flights"
+    if "date" in lowered or "when " in lowered:
+        return "dates"
+    if "how many" in lowered or ("travel" in lowered and ("people" in lowered or "travelers" in lowered or "travellers" in lowered)):
+        return "travelers"
+    return None
+
+
+class SlotState:
+    """Slots gathered so far in a planning conversation."""
+
+    def __init__(self):
+        self.request: Optional[str] = None
+        self.travelers: Optional[int] = None
+        self.dates: Optional[Tuple[Optional[date], Optional[date]]] = None
+        self.flights_booked: Optional[bool] = None
+
+    def is_filled(self, slot: str) -> bool:
+        value = {"request": self.request, "travelers": self.travelers, "dates": self.dates, "flights": self.flights_booked}[slot]
+        return value is not None
+
+    def next_missing(self) -> Optional[str]:
+        return next((slot for slot in SLOT_ORDER if not self.is_filled(slot)), None)
+
+    def fill_from(self, text: str, expecting: Optional[str]) -> bool:
+        """
+        Fills slots from one user message. Returns False when the message
+        was supposed to answer `expecting` but did not (including a first
+        message that is not a trip request), i.e. the turn is ambiguous or
+        free-form and should go to the LLM.
+        """
+        if expecting == "request" and self.request is None and looks_like_trip_request(text):
+            self.request = text.strip()
+        travelers = extract_travelers(text, expecting=expecting == "travelers")
+        if travelers:
+            self.travelers = travelers
+        dates = extract_dates(text, expecting=expecting == "dates")
+        if dates is not None:
+            self.dates = dates
+        flights = detect_flight_status(text, expecting=expecting == "flights")
+        if flights is not None:
+            self.flights_booked = flights
+        return expecting is None or self.is_filled(expecting)
+
+
+def next_reply(messages: List[Message]) -> Optional[str]:
+    """
+    Decides the conversational agent's next message without the LLM.
+
+    Replays the history: each assistant message sets which slot the next
+    user message is expected to fill. Returns the canned question for the
+    first missing slot, READY_TO_PLAN once all four are known, or None
+    when the turn is ambiguous or free-form (an unanswered question, an
+    unrecognised assistant message, or feedback on a finished plan).
+    """
+    if not messages or messages[-1].sender != "user":
+        return None
+
+    state = SlotState()
+    expecting: Optional[str] = "request"
+    planned = False
+    for message in messages:
+        if message.sender != "user":
+            question = classify_question(message.content)
+            if question == "ready":
+                planned = True
+            elif question is not None:
+                expecting = question
+            elif state.request is None:
+                # Greetings such as "How can I assist you with your new trip?"
+                expecting = "request"
+            else:
+                expecting = None
+            continue
+
+        if planned:
+            return None
+        if expecting is None:
+            return None
+        if not state.fill_from(message.content, expecting):
+            return None
+        expecting = None
+
+    if planned:
+        return None
+    if state.request and _FEEDBACK_RE.search(messages[-1].content.lower()) and not state.next_missing():
+        return None
+
+    slot = state.next_missing()
+    return QUESTIONS[slot] if slot else READY_TO_PLAN
@@ -0,0 +1,30 @@
+"""Add history summary to chat sessions
+
+Revision ID: 5c2e9f4b7a1d
+Revises: 0667723e0730
+Create Date: 2026-10-17 10:12:41.508233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c2e9f4b7a1d'
+down_revision: Union[str, Sequence[str], None] = '0667723e0730'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_sessions', sa.Column('history_summary', sa.Text(), nullable=True))
+    op.add_column('chat_sessions', sa.Column('history_summary_count', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_sessions', 'history_summary_count')
+    op.drop_column('chat_sessions', 'history_summary')
@@ -0,0 +1,28 @@
+"""Add context explanation to chat messages
+
+Revision ID: 8d41c7e2b9f3
+Revises: 5c2e9f4b7a1d
+Create Date: 2026-10-17 14:03:27.915462
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41c7e2b9f3'
+down_revision: Union[str, Sequence[str], None] = '5c2e9f4b7a1d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_messages', sa.Column('context_explanation', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_messages', 'context_explanation')
@@ -0,0 +1,77 @@
+# File: backend/benchmarks/load_test.py
+"""
+Concurrent load test against the agent endpoints, for measuring the app's own overhead.
+
+Start the backend with a local upstream stand-in first, e.g.:
+    UPSTREAM_MODE=synthetic UPSTREAM_LATENCY=lognormal:0.8,0.4 UPSTREAM_SEED=1 uvicorn main:app
+
+Then, from the backend directory:
+    python -m benchmarks.load_test --endpoint emotional --requests 500 --concurrency 50
+    python -m benchmarks.load_test --endpoint neural --requests 200 --concurrency 20
+"""
+import time
+import asyncio
+import argparse
+from collections import Counter
+import httpx
+import numpy as np
+
+# Path and request body per endpoint. Prompts vary so that caches and coalescing
+# do not hide the upstream cost unless --repeat-prompt is given.
+ENDPOINTS = {
+    "neural": ("/api/agents/neural/", lambda i: {"prompt": f"Plan a 3-day luxury trip to Lucerne, variant {i}"}),
+    "emotional": ("/api/agents/emotional/", lambda i: {"prompt": f"I am not sure what to pack for the mountains, question {i}?"}),
+    "radar": ("/api/agents/radar/", lambda i: {"prompt": f"Flights and weather for Zurich next week, query {i}"}),
+    "conversational": ("/api/agents/conversational/", lambda i: {"messages": [{"sender": "user", "content": f"Tell me something about Geneva {i}"}]}),
+    "search": ("/api/agents/location/search", None),
+}
+
+
+async def _one(client: httpx.AsyncClient, endpoint: str, i: int):
+    path, body = ENDPOINTS[endpoint]
+    started = time.perf_counter()
+    try:
+        if body is None:
+            response = await client.get(path, params={"place_name": f"Place {i}"})
+        else:
+            response = await client.post(path, json=body(i))
+        outcome = str(response.status_code)
+    except httpx.HTTPError as e:
+        outcome = type(e).__name__
+    return time.perf_counter() - started, outcome
+
+
+async def run(url: str, endpoint: str, total: int, concurrency: int, repeat_prompt: bool):
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120.0) as client:
+        async def bounded(i: int):
+            async with semaphore:
+                return await _one(client, endpoint, 0 if repeat_prompt else i)
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(bounded(i) for i in range(total)))
+        wall = time.perf_counter() - started
+
+    ms = np.array([latency for latency, _ in results]) * 1000
+    outcomes = Counter(outcome for _, outcome in results)
+    print(f"{endpoint}: {total} requests, concurrency {concurrency}, {wall:.2f} s wall, {total / wall:.1f} req/s")
+    print(f"latency   mean {ms.mean():8.1f} ms   p50 {np.percentile(ms, 50):8.1f} ms   "
+          f"p95 {np.percentile(ms, 95):8.1f} ms   p99 {np.percentile(ms, 99):8.1f} ms   max {ms.max():8.1f} ms")
+    print("outcomes  " + ", ".join(f"{outcome}: {count}" for outcome, count in sorted(outcomes.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="emotional")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--repeat-prompt", action="store_true", help="send the same prompt every time")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.endpoint, args.requests, args.concurrency, args.repeat_prompt))
+
+
+if __name__ == "__main__":
+    main()
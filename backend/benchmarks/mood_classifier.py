@@ -0,0 +1,107 @@
+# File: backend/benchmarks/mood_classifier.py
+"""
+Compares the local lexicon mood classifier with the LLM path on the bundled sample set.
+
+Run from the backend directory:
+    python -m benchmarks.mood_classifier          # local classifier vs. bundled labels
+    python -m benchmarks.mood_classifier --llm    # also call the LLM (needs OPENAI_API_KEY)
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from agents import mood_classifier
+
+SAMPLES_PATH = os.path.join(os.path.dirname(mood_classifier.__file__), "data", "mood_samples.jsonl")
+
+
+def load_samples(path: str = SAMPLES_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize_latency(name: str, seconds: list):
+    ms = np.array(seconds) * 1000
+    print(f"{name:<22} mean {ms.mean():8.3f} ms   p50 {np.percentile(ms, 50):8.3f} ms   p99 {np.percentile(ms, 99):8.3f} ms")
+
+
+def run_local(samples, repeat: int):
+    classifier = mood_classifier.get_classifier()
+    predictions, confidences, timings = [], [], []
+    for sample in samples:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            mood, confidence = classifier.classify(sample["text"])
+        timings.append((time.perf_counter() - started) / repeat)
+        predictions.append(mood.mood)
+        confidences.append(confidence)
+    return predictions, confidences, timings
+
+
+async def run_llm(samples):
+    from agents import emotional
+    from llm import gateway as llm_gateway
+
+    predictions, timings = [], []
+    try:
+        for sample in samples:
+            started = time.perf_counter()
+            mood = await emotional.classify_mood(sample["text"])
+            timings.append(time.perf_counter() - started)
+            predictions.append(mood.mood)
+    finally:
+        await llm_gateway.close_gateway()
+    return predictions, timings
+
+
+def agreement(a, b) -> float:
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", action="store_true", help="also classify every sample with the LLM")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("EMOTIONAL_CONFIDENCE_THRESHOLD", "0.55")))
+    parser.add_argument("--repeat", type=int, default=200, help="local classifications per sample when timing")
+    args = parser.parse_args()
+
+    samples = load_samples()
+    labels = [sample["mood"] for sample in samples]
+    print(f"{len(samples)} samples from {SAMPLES_PATH}\n")
+
+    local, confidences, local_timings = run_local(samples, args.repeat)
+    confident = [c >= args.threshold for c in confidences]
+    summarize_latency("local classifier", local_timings)
+    print(f"local vs. labels       {agreement(local, labels):.1%} agreement")
+    print(f"confident (>= {args.threshold:.2f})    {sum(confident)}/{len(samples)} answered locally")
+    confident_local = [p for p, c in zip(local, confident) if c]
+    confident_labels = [l for l, c in zip(labels, confident) if c]
+    if confident_local:
+        print(f"confident vs. labels   {agreement(confident_local, confident_labels):.1%} agreement")
+
+    if not args.llm:
+        return
+
+    llm, llm_timings = asyncio.run(run_llm(samples))
+    print()
+    summarize_latency("llm", llm_timings)
+    print(f"llm vs. labels         {agreement(llm, labels):.1%} agreement")
+    print(f"local vs. llm          {agreement(local, llm):.1%} agreement")
+    hybrid = [p if c else l for p, c, l in zip(local, confident, llm)]
+    hybrid_timings = [t_local if c else t_local + t_llm for t_local, t_llm, c in zip(local_timings, llm_timings, confident)]
+    summarize_latency("hybrid (threshold)", hybrid_timings)
+    print(f"hybrid vs. llm         {agreement(hybrid, llm):.1%} agreement")
+
+
+if __name__ == "__main__":
+    main()
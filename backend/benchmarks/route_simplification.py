@@ -0,0 +1,108 @@
+# File: backend/benchmarks/route_simplification.py
+"""
+Measures what server-side route simplification buys per /route response:
+payload size and CPU time of decoding, simplifying and re-encoding a route
+at several zoom levels, for both algorithms and all geometry formats.
+
+By default it uses a generated mountain-road route from Zurich to Zermatt
+with a vertex every ~25 m (the density Mapbox Directions returns for Swiss
+roads). Pass a saved Directions response to measure a real route instead.
+
+Run from the backend directory:
+    python -m benchmarks.route_simplification
+    python -m benchmarks.route_simplification --route-file route.json --zooms 8 11 14
+"""
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+from geo import geometry
+
+ZURICH = (8.5402, 47.3782)
+ZERMATT = (7.7491, 46.0207)
+
+
+def generated_route(spacing_m: float = 25.0, seed: int = 7) -> np.ndarray:
+    """A deterministic winding route: long bends, hairpins and GPS-scale jitter."""
+    rng = np.random.default_rng(seed)
+    start, end = np.array(ZURICH), np.array(ZERMATT)
+    straight_m = np.hypot(*((end - start) * [75_000, 111_200]))
+    count = int(straight_m * 1.4 / spacing_m)
+    t = np.linspace(0.0, 1.0, count)
+    normal = np.array([-(end - start)[1], (end - start)[0]]) / np.hypot(*(end - start))
+    bends = 0.06 * np.sin(t * 9 * np.pi) + 0.015 * np.sin(t * 41 * np.pi)
+    hairpins = np.where(t > 0.8, 0.004 * np.sin(t * 900 * np.pi), 0.0)
+    offset = (bends + hairpins)[:, None] * normal
+    jitter = np.cumsum(rng.normal(0.0, 2e-6, (count, 2)), axis=0)
+    return start + t[:, None] * (end - start) + offset + jitter
+
+
+def load_route(path: str) -> np.ndarray:
+    """Geometry of the first route in a Mapbox Directions response (GeoJSON or polyline6)."""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    route_geometry = data["routes"][0]["geometry"] if "routes" in data else data["geometry"]
+    if isinstance(route_geometry, str):
+        return geometry.decode_polyline(route_geometry, precision=6)
+    return np.asarray(route_geometry["coordinates"], dtype=np.float64)
+
+
+def render(points: np.ndarray, fmt: str) -> str:
+    if fmt == "polyline6":
+        return geometry.encode_polyline(points, precision=6)
+    if fmt == "polyline":
+        return geometry.encode_polyline(points)
+    return json.dumps({"type": "LineString", "coordinates": geometry.to_coordinates(points)}, separators=(",", ":"))
+
+
+def timed(fn, repeat: int) -> float:
+    """Median wall time of `fn` in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--route-file", help="Saved Mapbox Directions response to use instead of the generated route.")
+    parser.add_argument("--zooms", type=float, nargs="+", default=[6, 8, 10, 12, 14, 16])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    points = load_route(args.route_file) if args.route_file else generated_route()
+    encoded = geometry.encode_polyline(points, precision=6)
+    latitude = float(points[:, 1].mean())
+    print(f"Route: {len(points)} points, {len(encoded) / 1024:.1f} KB as cached polyline6\n")
+
+    baseline = {fmt: len(render(points, fmt)) for fmt in ("geojson", "polyline6", "polyline")}
+    decode_ms = timed(lambda: geometry.decode_polyline(encoded, precision=6), args.repeat)
+    geojson_ms = timed(lambda: render(geometry.decode_polyline(encoded, precision=6), "geojson"), args.repeat)
+    print(f"{'unsimplified':<30} {len(points):>7} pts   geojson {baseline['geojson'] / 1024:8.1f} KB"
+          f"   polyline6 {baseline['polyline6'] / 1024:7.1f} KB   polyline {baseline['polyline'] / 1024:7.1f} KB"
+          f"   decode {decode_ms:6.2f} ms   geojson request {geojson_ms:6.2f} ms")
+
+    for method in geometry.SIMPLIFY_METHODS:
+        print()
+        for zoom in args.zooms:
+            tolerance = geometry.zoom_tolerance(zoom, latitude)
+            simplified = geometry.simplify(points, tolerance, method)
+            sizes = {fmt: len(render(simplified, fmt)) for fmt in baseline}
+            simplify_ms = timed(lambda: geometry.simplify(points, tolerance, method), args.repeat)
+            # The whole per-request cost for a GeoJSON response: decode the cached polyline6, simplify, serialize.
+            request_ms = timed(lambda: render(geometry.simplify(geometry.decode_polyline(encoded, precision=6), tolerance, method), "geojson"), args.repeat)
+            label = f"{method} z{zoom:g} ({tolerance:.1f} m)"
+            print(f"{label:<30} {len(simplified):>7} pts   geojson {sizes['geojson'] / 1024:8.1f} KB"
+                  f"   polyline6 {sizes['polyline6'] / 1024:7.1f} KB   polyline {sizes['polyline'] / 1024:7.1f} KB"
+                  f"   simplify {simplify_ms:6.2f} ms   geojson request {request_ms:6.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,6 +12,9 @@ class ChatSession(Base):
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     title = Column(String(255), nullable=False, default="New Chat")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Rolling summary of older turns, maintained by the conversational agent's history compactor
+    history_summary = Column(Text, nullable=True)
+    history_summary_count = Column(Integer, nullable=False, default=0, server_default="0") # Messages folded into the summary
 
     user = relationship("User", back_populates="chat_sessions")
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
@@ -28,6 +31,7 @@ class ChatMessage(Base):
     customization_request = Column(JSON, nullable=True)
     booking_summary_itinerary = Column(JSON, nullable=True)
     ride_details = Column(JSON, nullable=True)
+    context_explanation = Column(Text, nullable=True) # Explanation generated with the itinerary, served by /api/mcp/context
     auth_prompt = Column(Boolean, default=False)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
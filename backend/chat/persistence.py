@@ -0,0 +1,296 @@
+# File: backend/chat/persistence.py
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import insert, text
+from auth.database import SessionLocal
+from metrics.registry import REGISTRY
+from . import models
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_ENABLED = os.getenv("CHAT_WRITE_BEHIND", "true").lower() in ("1", "true", "yes")
+BATCH_MAX_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "100"))
+FLUSH_INTERVAL = float(os.getenv("CHAT_WRITE_FLUSH_MS", "20")) / 1000
+# How long a read waits for its session's queued writes before answering anyway.
+READ_WAIT_TIMEOUT = float(os.getenv("CHAT_WRITE_READ_TIMEOUT", "5"))
+
+BATCH_SIZE = REGISTRY.histogram(
+    "chat_write_batch_size",
+    "Chat messages inserted per write-behind batch.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+FAILED_WRITES = REGISTRY.counter("chat_write_failures_total", "Chat messages that could not be persisted.")
+
+_STOP = object()
+# innodb_autoinc_lock_mode values under which a multi-row INSERT gets consecutive ids.
+CONSECUTIVE_AUTOINC_LOCK_MODES = (0, 1)
+
+
+def _column_default(column) -> Any:
+    # A multi-row VALUES needs every column in every row; use the column's scalar default for missing ones.
+    default = column.default
+    return default.arg if default is not None and default.is_scalar else None
+
+
+class _PendingMessage:
+    def __init__(self, row: Dict[str, Any], loop: Optional[asyncio.AbstractEventLoop]):
+        self.row = row
+        self.loop = loop
+        self.future: Optional[asyncio.Future] = loop.create_future() if loop is not None else None
+
+    def resolve(self, message_id: Optional[int], error: Optional[BaseException] = None):
+        if self.future is None:
+            return
+        def settle():
+            if self.future.done():
+                return
+            if error is not None:
+                self.future.set_exception(error)
+                self.future.exception()  # Already logged; don't warn again if nobody awaits it.
+            else:
+                self.future.set_result(message_id)
+        try:
+            self.loop.call_soon_threadsafe(settle)
+        except RuntimeError:
+            pass  # Loop already closed (shutdown flush); nobody is waiting.
+
+
+class ChatWriteQueue:
+    """
+    Write-behind persistence for chat_messages.
+
+    Agents enqueue rows instead of opening a session and committing on the
+    event loop. A dedicated worker thread drains the queue every
+    `flush_interval` (or once `batch_size` rows are waiting) and inserts the
+    whole batch in one transaction: a multi-row INSERT ... RETURNING where the
+    database supports it, a multi-row INSERT with ids counted on from the
+    first one on MySQL when its auto-increment settings make them
+    consecutive, row by row otherwise. Readers call
+    `wait_for_session()` first, which blocks until that session's queued
+    rows are committed, so a client always reads back its own messages.
+    """
+
+    def __init__(self, batch_size: int = BATCH_MAX_SIZE, flush_interval: float = FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._pending: Dict[int, int] = {}  # session_id -> rows not yet committed
+        self._condition = threading.Condition()
+        self._worker: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self._autoinc_step: Optional[int] = None
+        self._autoinc_checked = False
+
+    # --- Producers ---
+
+    def enqueue(self, **row: Any) -> Optional[asyncio.Future]:
+        """
+        Queues one chat_messages row. Returns a future for the new message
+        id when called from the event loop; callers that don't need the id
+        can ignore it.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        pending = _PendingMessage(row, loop)
+        with self._condition:
+            self._pending[row["session_id"]] = self._pending.get(row["session_id"], 0) + 1
+        self._ensure_worker()
+        self._queue.put(pending)
+        return pending.future
+
+    def pending(self, session_id: int) -> int:
+        with self._condition:
+            return self._pending.get(session_id, 0)
+
+    def wait_for_session(self, session_id: int, timeout: float = READ_WAIT_TIMEOUT) -> bool:
+        """Blocks until the session's queued messages are committed. Call from a worker thread."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending.get(session_id), timeout=timeout)
+
+    # --- Worker ---
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._start_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="chat-write-behind", daemon=True)
+                self._worker.start()
+
+    def _next_batch(self) -> Tuple[List[_PendingMessage], bool]:
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch, stop = [first], False
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                stop = True
+                break
+            batch.append(item)
+        return batch, stop
+
+    def _run(self):
+        while True:
+            batch, stop = self._next_batch()
+            if batch:
+                self._write(batch)
+            if stop:
+                # Flush whatever was enqueued behind the stop marker too.
+                leftover = []
+                while not self._queue.empty():
+                    item = self._queue.get_nowait()
+                    if item is not _STOP:
+                        leftover.append(item)
+                if leftover:
+                    self._write(leftover)
+                return
+
+    def _consecutive_id_step(self, db) -> Optional[int]:
+        """
+        The id increment between rows of one multi-row INSERT on MySQL/MariaDB,
+        or None when ids are not guaranteed consecutive (another database, or
+        innodb_autoinc_lock_mode=2, the "interleaved" mode). Read once.
+        """
+        if not self._autoinc_checked:
+            self._autoinc_checked = True
+            if db.get_bind().dialect.name in ("mysql", "mariadb"):
+                try:
+                    lock_mode, step = db.execute(text("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")).one()
+                    if int(lock_mode) in CONSECUTIVE_AUTOINC_LOCK_MODES:
+                        self._autoinc_step = int(step)
+                except Exception as e:
+                    logger.warning(f"Could not read the auto-increment settings ({e}); inserting chat messages row by row")
+            if self._autoinc_step is None:
+                logger.info("Chat message ids are not guaranteed consecutive here; batches are inserted row by row")
+        return self._autoinc_step
+
+    def _insert(self, rows: List[Dict[str, Any]]) -> List[int]:
+        table = models.ChatMessage.__table__
+        db = SessionLocal()
+        # Every row needs the same columns; fill the ones a message type doesn't set.
+        columns = sorted({column for row in rows for column in row})
+        values = [{column: row[column] if column in row else _column_default(table.c[column]) for column in columns} for row in rows]
+        try:
+            returning = db.get_bind().dialect.insert_returning
+            step = None if returning else self._consecutive_id_step(db)
+            if returning:
+                ids = db.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), values).scalars().all()
+            elif step is not None:
+                # MySQL has no RETURNING. One multi-row INSERT reports the first row's id
+                # (LAST_INSERT_ID), and with lock mode 0/1 the rest follow at the increment.
+                first_id = db.execute(insert(table).values(values)).lastrowid
+                ids = [first_id + offset * step for offset in range(len(values))]
+            else:
+                # Ids may interleave with other writers (lock mode 2, Galera); insert row by
+                # row for exact ids. The batch still shares one transaction and one commit.
+                statement = insert(table)
+                ids = [db.execute(statement, row).inserted_primary_key[0] for row in values]
+            db.commit()
+            return ids
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _write(self, batch: List[_PendingMessage]):
+        try:
+            ids = self._insert([pending.row for pending in batch])
+            results = list(zip(batch, ids, [None] * len(batch)))
+        except Exception as e:
+            logger.warning(f"Batched insert of {len(batch)} chat messages failed ({e}); retrying row by row")
+            # One bad row (e.g. a session deleted meanwhile) must not drop the rest of the batch.
+            results = []
+            for pending in batch:
+                try:
+                    results.append((pending, self._insert([pending.row])[0], None))
+                except Exception as row_error:
+                    logger.error(f"Could not persist chat message for session {pending.row.get('session_id')}: {row_error}")
+                    results.append((pending, None, row_error))
+
+        self.batches += 1
+        BATCH_SIZE.observe(len(batch))
+        with self._condition:
+            for pending, message_id, error in results:
+                session_id = pending.row["session_id"]
+                self._pending[session_id] -= 1
+                if not self._pending[session_id]:
+                    del self._pending[session_id]
+                if error is None:
+                    self.written += 1
+                else:
+                    self.failed += 1
+                    FAILED_WRITES.inc()
+            self._condition.notify_all()
+        for pending, message_id, error in results:
+            pending.resolve(message_id, error)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Flushes everything queued so far and stops the worker. Blocking; run it off the event loop."""
+        if self._worker is None or not self._worker.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+        self._worker = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            pending = sum(self._pending.values())
+        return {
+            "enabled": WRITE_BEHIND_ENABLED,
+            "pending": pending,
+            "batches": self.batches,
+            "written": self.written,
+            "failed": self.failed,
+            "avg_batch_size": round(self.written / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+chat_writes = ChatWriteQueue()
+
+REGISTRY.collector(
+    "chat_write_queue_depth",
+    "Chat messages queued for the write-behind worker but not yet committed.",
+    "gauge",
+    lambda: [({}, chat_writes.stats()["pending"])],
+)
+
+
+def save_message(**row: Any) -> Optional[asyncio.Future]:
+    """
+    Persists one chat message: queued for the write-behind worker, or written
+    synchronously when CHAT_WRITE_BEHIND is off. Returns a future (or, when
+    synchronous, an already-resolved one) for the new message id.
+    """
+    if WRITE_BEHIND_ENABLED:
+        return chat_writes.enqueue(**row)
+    db = SessionLocal()
+    try:
+        message = models.ChatMessage(**row)
+        db.add(message)
+        db.commit()
+        message_id = message.id
+    finally:
+        db.close()
+    try:
+        future = asyncio.get_running_loop().create_future()
+    except RuntimeError:
+        return None
+    future.set_result(message_id)
+    return future
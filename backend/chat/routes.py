@@ -3,23 +3,24 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
 import logging
-from openai import OpenAI
 
 from auth import models as auth_models
 from auth.database import get_db
 from users.routes import get_current_user
 from . import models, schemas
+from .persistence import chat_writes
 from schemas.agent import AgentRequest
+from llm import gateway as llm_gateway
 
 # --- Setup ---
 router = APIRouter()
 logger = logging.getLogger(__name__)
-client = OpenAI()
 
 async def generate_chat_title(prompt: str) -> str:
     """Generates a concise title for a chat session based on the initial prompt."""
     try:
-        response = await client.chat.completions.create(
+        response = await llm_gateway.chat_completion(
+            "chat_title",
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert at creating short, descriptive titles for travel plans. Summarize the user's request in 3-5 words."},
@@ -63,6 +64,11 @@ def get_chat_session_messages(
     db: Session = Depends(get_db)
 ):
     """Retrieves all messages for a specific chat session."""
+    # Read-your-writes: agent messages are persisted write-behind.
+    if chat_writes.pending(session_id):
+        if not chat_writes.wait_for_session(session_id):
+            logger.warning(f"Chat session {session_id} still has queued messages; returning what is committed")
+        db.commit()  # End the snapshot opened while loading current_user so the new rows are visible.
     session = db.query(models.ChatSession).filter(models.ChatSession.id == session_id, models.ChatSession.user_id == current_user.id).first()
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
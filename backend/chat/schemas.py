@@ -10,6 +10,7 @@ class ChatMessageBase(BaseModel):
     customization_request: Optional[Any] = None
     booking_summary_itinerary: Optional[Any] = None
     ride_details: Optional[Any] = None
+    context_explanation: Optional[str] = None
     auth_prompt: Optional[bool] = False
 
 class ChatMessageCreate(ChatMessageBase):
@@ -0,0 +1 @@
+# This file makes the 'geo' directory a Python package.
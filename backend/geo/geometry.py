@@ -0,0 +1,175 @@
+# File: backend/geo/geometry.py
+"""
+Geometry shared by the agents and the upstream stand-ins: polyline
+encoding, great-circle distances, offline road estimates and route
+simplification.
+"""
+import math
+from typing import List, Sequence, Tuple
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+# Road distance is roughly this much longer than the straight line between two points.
+DEFAULT_ROAD_FACTOR = 1.3
+# Average speed in m/s per Mapbox routing profile.
+PROFILE_SPEEDS = {"driving": 16.7, "driving-traffic": 13.9, "walking": 1.4, "cycling": 4.5}
+# Ground metres per screen pixel at zoom 0 on the equator, for 512-px web map tiles.
+METRES_PER_PIXEL_Z0 = 78271.517
+SIMPLIFY_METHODS = ("douglas-peucker", "visvalingam")
+
+# Encoded polylines hold 32-bit signed values: at most 7 five-bit chunks each.
+_MAX_CHUNKS = 7
+_CHUNK_SHIFTS = np.arange(_MAX_CHUNKS, dtype=np.int64) * 5
+
+
+def encode_polyline(coordinates: Sequence[Sequence[float]], precision: int = 5) -> str:
+    """
+    Encodes [lon, lat] pairs in the Google encoded-polyline format (as Mapbox
+    returns for `geometries=polyline` / `polyline6`).
+    """
+    points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    if not len(points):
+        return ""
+    scaled = np.round(points[:, ::-1] * 10 ** precision).astype(np.int64)  # (lat, lon) order
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    chunks = (values[:, None] >> _CHUNK_SHIFTS) & 0x1F
+    # Number of chunks per value: at least one, plus one per further non-zero 5 bits.
+    counts = np.maximum(1, _MAX_CHUNKS - np.argmax((values[:, None] >> _CHUNK_SHIFTS)[:, ::-1] > 0, axis=1))
+    counts[values == 0] = 1
+    used = np.arange(_MAX_CHUNKS) < counts[:, None]
+    continued = np.arange(_MAX_CHUNKS) < counts[:, None] - 1
+    encoded = (chunks | np.where(continued, 0x20, 0)) + 63
+    return encoded[used].astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> np.ndarray:
+    """Decodes an encoded polyline into an (N, 2) array of [lon, lat]."""
+    data = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if not len(data):
+        return np.zeros((0, 2), dtype=np.float64)
+    last = data < 0x20
+    value_ids = np.concatenate(([0], np.cumsum(last)[:-1]))
+    starts = np.flatnonzero(np.concatenate(([True], last[:-1])))
+    shifts = (np.arange(len(data)) - starts[value_ids]) * 5
+    values = np.zeros(int(last.sum()), dtype=np.int64)
+    np.add.at(values, value_ids, (data & 0x1F) << shifts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    points = np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+    return points[:, ::-1]
+
+
+def haversine_m(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Great-circle distance in metres between two (lon, lat) points."""
+    lon1, lat1, lon2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def haversine_matrix(origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+    """Great-circle distances in metres between every origin and destination ([lon, lat] rows)."""
+    lon1, lat1 = np.radians(np.asarray(origins, dtype=np.float64).reshape(-1, 2)).T
+    lon2, lat2 = np.radians(np.asarray(destinations, dtype=np.float64).reshape(-1, 2)).T
+    dlat = lat2[None, :] - lat1[:, None]
+    dlon = lon2[None, :] - lon1[:, None]
+    h = np.sin(dlat / 2) ** 2 + np.cos(lat1)[:, None] * np.cos(lat2)[None, :] * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+
+def to_coordinates(points: np.ndarray, decimals: int = 6) -> List[List[float]]:
+    """GeoJSON coordinate list from an (N, 2) array."""
+    return np.round(points, decimals).tolist()
+
+
+# --- Simplification ---
+
+def zoom_tolerance(zoom: float, latitude: float, pixels: float = 1.0) -> float:
+    """Ground distance in metres covered by `pixels` screen pixels at a web-map zoom level."""
+    return pixels * METRES_PER_PIXEL_Z0 * np.cos(np.radians(latitude)) / 2 ** zoom
+
+
+def _project(points: np.ndarray) -> np.ndarray:
+    # Equirectangular projection around the line's mean latitude; accurate to well
+    # under a percent over the extent of Switzerland.
+    lon, lat = np.radians(points[:, 0]), np.radians(points[:, 1])
+    return np.column_stack((lon * np.cos(lat.mean()), lat)) * EARTH_RADIUS_M
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Boolean mask of the points Douglas-Peucker keeps at `tolerance` metres.
+    Splits every open span of the line in the same pass, so the number of
+    passes follows the depth of the split tree rather than the points kept.
+    """
+    count = len(points)
+    if count <= 2:
+        return np.ones(count, dtype=bool)
+    keep = np.zeros(count, dtype=bool)
+    keep[[0, -1]] = True
+    xy = _project(points)
+    # Points whose span still has to be checked against the tolerance.
+    pending = ~keep
+    while True:
+        candidates = np.flatnonzero(pending)
+        if not len(candidates):
+            return keep
+        kept = np.flatnonzero(keep)
+        spans = np.searchsorted(kept, candidates) - 1
+        first, last = xy[kept[spans]], xy[kept[spans + 1]]
+        segment = last - first
+        offsets = xy[candidates] - first
+        length2 = np.einsum("ij,ij->i", segment, segment)
+        along = np.clip(np.einsum("ij,ij->i", offsets, segment) / np.where(length2 > 0, length2, 1.0), 0.0, 1.0)
+        distances = np.hypot(*(offsets - along[:, None] * segment).T)
+
+        # Candidates are in line order, so each span is one contiguous run.
+        run_starts = np.flatnonzero(np.concatenate(([True], spans[1:] != spans[:-1])))
+        run_ids = np.cumsum(np.concatenate(([False], spans[1:] != spans[:-1])))
+        farthest = np.maximum.reduceat(distances, run_starts)
+        # Split each span over the tolerance at the first of its farthest points;
+        # spans within the tolerance are done.
+        peaks = np.flatnonzero((distances == farthest[run_ids]) & (distances > tolerance))
+        _, first_peaks = np.unique(run_ids[peaks], return_index=True)
+        splits = candidates[peaks[first_peaks]]
+        keep[splits] = True
+        pending[splits] = False
+        pending[candidates[farthest[run_ids] <= tolerance]] = False
+
+
+def visvalingam(points: np.ndarray, min_area: float) -> np.ndarray:
+    """
+    Boolean mask of the points Visvalingam-Whyatt keeps when dropping
+    triangles smaller than `min_area` square metres. Removes every local
+    minimum below the threshold per pass (never two neighbours at once),
+    then recomputes the remaining areas.
+    """
+    count = len(points)
+    keep = np.ones(count, dtype=bool)
+    if count <= 2:
+        return keep
+    xy = _project(points)
+    remaining = np.arange(count)
+    while len(remaining) > 2:
+        a, b, c = xy[remaining[:-2]], xy[remaining[1:-1]], xy[remaining[2:]]
+        areas = 0.5 * np.abs((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1]))
+        left = np.concatenate(([np.inf], areas[:-1]))
+        right = np.concatenate((areas[1:], [np.inf]))
+        drop = (areas < min_area) & (areas <= left) & (areas < right)
+        if not drop.any():
+            break
+        drop_indices = np.flatnonzero(drop) + 1
+        keep[remaining[drop_indices]] = False
+        remaining = np.delete(remaining, drop_indices)
+    return keep
+
+
+def simplify(points: np.ndarray, tolerance: float, method: str = "douglas-peucker") -> np.ndarray:
+    """
+    Simplifies an (N, 2) [lon, lat] line so that it deviates from the
+    original by roughly `tolerance` metres at most.
+    """
+    if method == "visvalingam":
+        # A triangle whose height is the tolerance over a base of twice the tolerance.
+        return points[visvalingam(points, tolerance ** 2)]
+    return points[douglas_peucker(points, tolerance)]
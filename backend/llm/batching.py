@@ -0,0 +1,96 @@
+# File: backend/llm/batching.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects individual requests for a short window and processes them together.
+
+    A batch is flushed when `window` seconds have passed since its first item
+    arrived or when it reaches `max_batch_size`, whichever comes first.
+    `process` receives the batched items and must return one result per item,
+    in order; a result that is an Exception is raised to that caller only.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process: Callable[[List[Any]], Awaitable[List[Any]]],
+        window: float = 0.01,
+        max_batch_size: int = 16,
+    ):
+        self.name = name
+        self.process = process
+        self.window = window
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def submit(self, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.process([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise ValueError(f"{self.name} batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def drain(self):
+        """Flushes pending items and waits for in-flight batches. Called on shutdown."""
+        self._flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "window_ms": round(self.window * 1000, 3),
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "items": self.items,
+            "largest_batch": self.largest_batch,
+            "average_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -0,0 +1,342 @@
+# File: backend/llm/cache.py
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from llm import metrics as llm_metrics
+from metrics.registry import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# --- Prompt Normalization ---
+
+_UNITS = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen",
+]
+_TENS = ["twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+# Every number word from zero to ninety-nine ("twenty-one" reaches the regex as "twenty one").
+_NUMBER_WORDS = {word: str(value) for value, word in enumerate(_UNITS)}
+for _tens_value, _tens_word in enumerate(_TENS, start=2):
+    _NUMBER_WORDS[_tens_word] = str(_tens_value * 10)
+    for _unit_value in range(1, 10):
+        _NUMBER_WORDS[f"{_tens_word} {_UNITS[_unit_value]}"] = str(_tens_value * 10 + _unit_value)
+_NUMBER_WORDS["a couple"] = "2"
+_NUMBER_WORD_RE = re.compile(r"\b(" + "|".join(sorted(map(re.escape, _NUMBER_WORDS), key=len, reverse=True)) + r")\b")
+# Anything that is not a word character, whitespace, or a decimal point between two digits.
+_PUNCTUATION_RE = re.compile(r"(?<!\d)\.|\.(?!\d)|[^\w\s.]")
+_NUMBER_RE = re.compile(r"^\d+(\.\d+)?$")
+
+
+def _canonical_number(token: str) -> str:
+    if not _NUMBER_RE.match(token):
+        return token
+    return format(float(token), "g") if "." in token else str(int(token))
+
+
+def normalize_prompt(text: str) -> str:
+    """
+    Canonicalizes a prompt so that near-identical requests share a cache key.
+
+    Folds case and accents, drops punctuation, collapses whitespace and
+    rewrites numbers ("Three days", "3.0 days", "03 days" -> "3 days").
+    """
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = _PUNCTUATION_RE.sub(" ", text)
+    text = _NUMBER_WORD_RE.sub(lambda m: _NUMBER_WORDS[m.group(1)], text)
+    return " ".join(_canonical_number(token) for token in text.split())
+
+
+def make_key(namespace: str, text: str) -> str:
+    """Builds a fixed-length cache key from a namespace (agent/model/prompt version) and a prompt."""
+    digest = hashlib.sha256(f"{namespace}\x00{normalize_prompt(text)}".encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+# --- Backends ---
+
+class CacheBackend:
+    """Interface for response cache storage. Values must be JSON-serializable."""
+
+    name = "base"
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: float):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryLRUCache(CacheBackend):
+    """In-process LRU cache with a per-entry TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(1, max_entries)
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    async def clear(self):
+        self._entries.clear()
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    On-disk cache stored in a single SQLite file, so entries survive restarts
+    and can be shared by the workers on one host. Queries run in a worker
+    thread to keep the event loop free.
+    """
+
+    name = "disk"
+
+    def __init__(self, path: str, max_entries: int = 50000):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.evictions = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+        self._conn.commit()
+
+    def _get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def _set(self, key: str, value: Any, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now),
+            )
+            overflow = self._size() - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+
+    def _size(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await asyncio.to_thread(self._set, key, value, ttl)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._execute, "DELETE FROM cache WHERE key = ?", (key,))
+
+    async def clear(self):
+        await asyncio.to_thread(self._execute, "DELETE FROM cache")
+
+    def size(self) -> int:
+        with self._lock:
+            return self._size()
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --- Cache Front ---
+
+class ResponseCache:
+    """
+    Read-through cache for LLM responses.
+
+    Looks up the in-memory LRU first and, if configured, an on-disk backend
+    second; disk hits are promoted into memory. Tracks hit/miss counters
+    for observability.
+    """
+
+    def __init__(self, name: str, memory: MemoryLRUCache, disk: Optional[CacheBackend] = None, ttl: float = 3600.0):
+        self.name = name
+        self.memory = memory
+        self.disk = disk
+        self.ttl = ttl
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    async def peek(self, key: str) -> Optional[Any]:
+        """Like `get`, but not counted as a hit or miss. For reads by other features."""
+        value = await self.memory.get(key)
+        if value is None and self.disk is not None:
+            try:
+                value = await self.disk.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"{self.name} cache disk read failed: {e}")
+        return value
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = await self.memory.get(key)
+        if value is None and self.disk is not None:
+            try:
+                value = await self.disk.get(key)
+            except sqlite3.Error as e:
+                logger.warning(f"{self.name} cache disk read failed: {e}")
+                value = None
+            if value is not None:
+                self.disk_hits += 1
+                await self.memory.set(key, value, self.ttl)
+        if value is None:
+            self.misses += 1
+            llm_metrics.CACHE_LOOKUPS.inc(agent=self.name, result="miss")
+        else:
+            self.hits += 1
+            llm_metrics.CACHE_LOOKUPS.inc(agent=self.name, result="hit")
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        await self.memory.set(key, value, ttl)
+        if self.disk is not None:
+            try:
+                await self.disk.set(key, value, ttl)
+            except sqlite3.Error as e:
+                logger.warning(f"{self.name} cache disk write failed: {e}")
+
+    def record_bypass(self):
+        self.bypassed += 1
+        llm_metrics.CACHE_LOOKUPS.inc(agent=self.name, result="bypass")
+
+    async def clear(self):
+        await self.memory.clear()
+        if self.disk is not None:
+            await self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": self.memory.size(),
+            "memory_evictions": self.memory.evictions,
+            "disk_entries": self.disk.size() if self.disk is not None else None,
+            "disk_evictions": self.disk.evictions if self.disk is not None else None,
+        }
+
+    async def close(self):
+        if self.disk is not None:
+            await self.disk.close()
+
+
+_caches: Dict[str, ResponseCache] = {}
+
+
+def build_cache(name: str, default_ttl: float = 3600.0, default_max_entries: int = 1024, default_backend: str = "memory") -> ResponseCache:
+    """
+    Builds a ResponseCache configured from the environment, e.g. for name "neural":
+    NEURAL_CACHE_TTL, NEURAL_CACHE_MAX_ENTRIES, NEURAL_CACHE_BACKEND (memory|disk)
+    and NEURAL_CACHE_PATH.
+    """
+    prefix = f"{name.upper()}_CACHE"
+    ttl = float(os.getenv(f"{prefix}_TTL", default_ttl))
+    memory = MemoryLRUCache(int(os.getenv(f"{prefix}_MAX_ENTRIES", default_max_entries)))
+    disk = None
+    if os.getenv(f"{prefix}_BACKEND", default_backend).lower() == "disk":
+        path = os.getenv(f"{prefix}_PATH", os.path.join("cache", f"{name}.sqlite3"))
+        disk = SQLiteCache(path)
+    cache = ResponseCache(name, memory, disk, ttl)
+    _caches[name] = cache
+    return cache
+
+
+def _collect_entries():
+    samples = []
+    for name, cache in sorted(_caches.items()):
+        samples.append(({"cache": name, "tier": "memory"}, cache.memory.size()))
+        if cache.disk is not None:
+            samples.append(({"cache": name, "tier": "disk"}, cache.disk.size()))
+    return samples
+
+
+def _collect_evictions():
+    samples = []
+    for name, cache in sorted(_caches.items()):
+        samples.append(({"cache": name, "tier": "memory"}, cache.memory.evictions))
+        if cache.disk is not None:
+            samples.append(({"cache": name, "tier": "disk"}, cache.disk.evictions))
+    return samples
+
+
+REGISTRY.collector("llm_cache_entries", "Entries held by each response cache tier.", "gauge", _collect_entries)
+REGISTRY.collector("llm_cache_evictions_total", "Entries evicted from each response cache tier to stay within its size limit.", "counter", _collect_evictions)
@@ -0,0 +1,491 @@
+# File: backend/llm/gateway.py
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, Optional
+import httpx
+import openai
+from openai import AsyncOpenAI
+from dotenv import load_dotenv
+from llm import singleflight, metrics as llm_metrics, resilience
+from llm.resilience import CircuitBreaker, DeadlineExceededError, LatencyWindow, RateLimitGate, UpstreamUnavailableError
+from metrics.registry import REGISTRY
+from upstream import transport as upstream
+
+# --- Setup ---
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Default (max concurrent calls, timeout in seconds) per agent.
+# Override with LLM_<AGENT>_CONCURRENCY and LLM_<AGENT>_TIMEOUT, e.g. LLM_NEURAL_TIMEOUT=90.
+DEFAULT_POLICIES = {
+    "neural": (8, 60.0),
+    "conversational": (16, 20.0),
+    "conversational_summary": (4, 30.0),
+    "emotional": (32, 10.0),
+    "radar": (16, 15.0),
+    "mcp_context": (16, 15.0),
+    "chat_title": (16, 10.0),
+}
+FALLBACK_POLICY = (8, 30.0)
+# Agents whose slow calls are duplicated once they pass the hedge latency percentile.
+# Enable per agent with LLM_<AGENT>_HEDGE=true; hedging spends extra tokens on the tail.
+DEFAULT_HEDGED_AGENTS: set = set()
+# Upstream status codes worth another attempt.
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    try:
+        return int(value) if value else default
+    except ValueError:
+        logger.warning(f"Ignoring invalid integer for {name}: {value!r}")
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    try:
+        return float(value) if value else default
+    except ValueError:
+        logger.warning(f"Ignoring invalid number for {name}: {value!r}")
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    return value.lower() in ("1", "true", "yes") if value else default
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code in RETRYABLE_STATUS_CODES or (status_code is not None and status_code >= 500)
+
+
+def _is_rate_limit(error: BaseException) -> bool:
+    return getattr(error, "status_code", None) == 429
+
+
+def _is_timeout(error: BaseException) -> bool:
+    return isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError))
+
+
+class AgentPolicy:
+    """
+    Concurrency limit, deadline and hedging switch for one agent's upstream
+    LLM calls. The timeout bounds the whole call, retries included.
+    """
+
+    def __init__(self, name: str, concurrency: int, timeout: float, hedge: bool = False):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.hedge = hedge
+
+    @classmethod
+    def from_env(cls, name: str) -> "AgentPolicy":
+        concurrency, timeout = DEFAULT_POLICIES.get(name, FALLBACK_POLICY)
+        prefix = f"LLM_{name.upper()}"
+        return cls(
+            name,
+            _env_int(f"{prefix}_CONCURRENCY", concurrency),
+            _env_float(f"{prefix}_TIMEOUT", timeout),
+            _env_bool(f"{prefix}_HEDGE", name in DEFAULT_HEDGED_AGENTS),
+        )
+
+
+class LLMGateway:
+    """
+    Process-wide access point for OpenAI chat completions.
+
+    Owns a single pooled HTTP transport shared by every agent and enforces a
+    per-agent concurrency limit, so a burst of slow itinerary generations
+    cannot starve the short mood/radar calls of connections.
+
+    Every call runs under the agent's deadline (shortened by any deadline of
+    the incoming request) and its circuit breaker. Failed attempts are
+    retried with jittered backoff, or after the provider's retry-after time
+    on a 429, only while the deadline leaves room for another attempt.
+    A timeout counts against the breaker only when the agent's own timeout
+    elapsed, not when a shorter request deadline cut the call short.
+    """
+
+    def __init__(self, api_key: Optional[str] = None):
+        limits = httpx.Limits(
+            max_connections=_env_int("LLM_MAX_CONNECTIONS", 100),
+            max_keepalive_connections=_env_int("LLM_MAX_KEEPALIVE", 20),
+            keepalive_expiry=30.0,
+        )
+        self._http_client = httpx.AsyncClient(
+            limits=limits,
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            transport=upstream.build_transport("openai", limits=limits),
+        )
+        api_key = api_key or os.getenv("OPENAI_API_KEY")
+        if not api_key and upstream.is_offline():
+            api_key = "offline"
+        # Retries are handled here so that they respect deadlines and the circuit breaker.
+        self.client = AsyncOpenAI(api_key=api_key, http_client=self._http_client, max_retries=0)
+        self.max_retries = _env_int("LLM_MAX_RETRIES", 2)
+        self.retry_base_delay = _env_float("LLM_RETRY_BASE_DELAY", 0.5)
+        self.retry_max_delay = _env_float("LLM_RETRY_MAX_DELAY", 8.0)
+        self.hedge_percentile = _env_float("LLM_HEDGE_PERCENTILE", 95.0)
+        self.hedge_min_samples = _env_int("LLM_HEDGE_MIN_SAMPLES", 20)
+        self._policies: Dict[str, AgentPolicy] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self._rate_limits: Dict[str, RateLimitGate] = {}
+        self.singleflight = singleflight.SingleFlight()
+
+    def policy(self, agent: str) -> AgentPolicy:
+        if agent not in self._policies:
+            self._policies[agent] = AgentPolicy.from_env(agent)
+        return self._policies[agent]
+
+    def _semaphore(self, agent: str) -> asyncio.Semaphore:
+        if agent not in self._semaphores:
+            self._semaphores[agent] = asyncio.Semaphore(self.policy(agent).concurrency)
+        return self._semaphores[agent]
+
+    def breaker(self, agent: str) -> CircuitBreaker:
+        if agent not in self._breakers:
+            self._breakers[agent] = CircuitBreaker(
+                agent,
+                error_rate=_env_float("LLM_BREAKER_ERROR_RATE", 0.5),
+                min_calls=_env_int("LLM_BREAKER_MIN_CALLS", 10),
+                window=_env_float("LLM_BREAKER_WINDOW", 30.0),
+                open_seconds=_env_float("LLM_BREAKER_OPEN_SECONDS", 15.0),
+            )
+        return self._breakers[agent]
+
+    def _latency(self, agent: str) -> LatencyWindow:
+        if agent not in self._latencies:
+            self._latencies[agent] = LatencyWindow()
+        return self._latencies[agent]
+
+    def _rate_limit(self, model: str) -> RateLimitGate:
+        if model not in self._rate_limits:
+            self._rate_limits[model] = RateLimitGate()
+        return self._rate_limits[model]
+
+    def hedge_delay(self, agent: str) -> Optional[float]:
+        """Latency after which a duplicate request is sent, or None while hedging is off or warming up."""
+        if not self.policy(agent).hedge:
+            return None
+        return self._latency(agent).percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    async def chat_completion(self, agent: str, coalesce_on: Optional[str] = None, **kwargs):
+        """
+        Runs `chat.completions.create` under the agent's concurrency limit and deadline.
+
+        When `coalesce_on` is given (the agent's user input), concurrent calls
+        with the same agent, model and normalized input share one upstream
+        completion. Only pass it for agents whose other arguments are fixed.
+
+        Raises UpstreamUnavailableError (CircuitOpenError, DeadlineExceededError)
+        when the call is refused or runs out of time.
+        """
+        policy = self.policy(agent)
+        kwargs.setdefault("model", DEFAULT_MODEL)
+        caller_limited = self._caller_limited(agent)
+        with resilience.deadline(policy.timeout):
+            if coalesce_on is None:
+                return await self._create(agent, caller_limited, **kwargs)
+            key = singleflight.make_key(agent, kwargs["model"], coalesce_on)
+            shared = self.singleflight.do(agent, key, lambda: self._create(agent, caller_limited, **kwargs))
+            # A follower keeps its own deadline even if the leader's is longer.
+            try:
+                return await asyncio.wait_for(shared, resilience.remaining())
+            except asyncio.TimeoutError as e:
+                raise DeadlineExceededError(f"The {agent} request timed out.") from e
+
+    def _caller_limited(self, agent: str) -> bool:
+        """
+        Whether the caller's deadline ends before the agent's own timeout. Timeouts
+        under such a deadline say nothing about the provider's health, so they
+        must not count against the circuit breaker.
+        """
+        left = resilience.remaining()
+        return left is not None and left < self.policy(agent).timeout
+
+    async def _create(self, agent: str, caller_limited: bool = False, **kwargs):
+        breaker = self.breaker(agent)
+        gate = self._rate_limit(kwargs["model"])
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._wait_for_rate_limit(agent, gate)
+            breaker.before_call()
+            try:
+                return await self._hedged(agent, kwargs, breaker, caller_limited)
+            except Exception as e:
+                if isinstance(e, UpstreamUnavailableError):
+                    # Gave up before the provider answered; let the next caller probe.
+                    breaker.release_probe()
+                delay = self._retry_delay(agent, attempt, e, gate)
+                if delay is None:
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise DeadlineExceededError(f"The {agent} request timed out.") from e
+                    raise
+                reason = "rate_limit" if _is_rate_limit(e) else type(e).__name__
+                llm_metrics.RETRIES.inc(agent=agent, reason=reason)
+                logger.warning(f"Retrying {agent} LLM call in {delay:.2f}s after attempt {attempt} failed: {reason}")
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, agent: str, attempt: int, error: BaseException, gate: RateLimitGate) -> Optional[float]:
+        """Seconds to wait before retrying, or None when the error should be raised."""
+        if not _is_retryable(error):
+            return None
+        if _is_rate_limit(error):
+            response = getattr(error, "response", None)
+            delay = resilience.retry_after_from_headers(response.headers if response is not None else None)
+            delay = delay if delay is not None else resilience.backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+            gate.pause(delay)
+        else:
+            delay = resilience.backoff_delay(attempt, self.retry_base_delay, self.retry_max_delay)
+        if attempt > self.max_retries:
+            return None
+        left = resilience.remaining()
+        if left is not None and delay >= left:
+            # The retry could not finish in time; fail now instead of holding the request.
+            return None
+        return delay
+
+    async def _wait_for_rate_limit(self, agent: str, gate: RateLimitGate):
+        wait = gate.wait_time()
+        if wait <= 0:
+            return
+        left = resilience.remaining()
+        if left is not None and wait >= left:
+            raise UpstreamUnavailableError(f"The {agent} service is rate limited. Please try again shortly.", retry_after=wait)
+        await asyncio.sleep(wait)
+
+    async def _hedged(self, agent: str, kwargs: dict, breaker: CircuitBreaker, caller_limited: bool = False):
+        """
+        Runs one attempt. Once it is slower than the agent's hedge percentile,
+        an identical second request is started and whichever succeeds first wins.
+        """
+        delay = self.hedge_delay(agent)
+        left = resilience.remaining()
+        if delay is None or (left is not None and left <= delay):
+            return await self._attempt(agent, kwargs, breaker, caller_limited)
+
+        primary = asyncio.ensure_future(self._attempt(agent, kwargs, breaker, caller_limited))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return primary.result()
+            llm_metrics.HEDGES.inc(agent=agent, outcome="launched")
+            tasks.append(asyncio.ensure_future(self._attempt(agent, kwargs, breaker, caller_limited)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            llm_metrics.HEDGES.inc(agent=agent, outcome="won")
+                        return task.result()
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def _acquire(self, agent: str) -> asyncio.Semaphore:
+        """Takes the agent's concurrency slot, giving up when the deadline passes first."""
+        semaphore = self._semaphore(agent)
+        queued_at = time.perf_counter()
+        left = resilience.remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceededError(f"The {agent} request timed out.")
+        try:
+            await asyncio.wait_for(semaphore.acquire(), left)
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceededError(f"The {agent} request timed out waiting for capacity.") from e
+        llm_metrics.QUEUE_WAIT.observe(time.perf_counter() - queued_at, agent=agent)
+        return semaphore
+
+    def _attempt_timeout(self, agent: str) -> float:
+        left = resilience.remaining()
+        timeout = self.policy(agent).timeout if left is None else min(self.policy(agent).timeout, left)
+        if timeout <= 0:
+            raise DeadlineExceededError(f"The {agent} request timed out.")
+        return timeout
+
+    def _record_outcome(self, breaker: CircuitBreaker, error: Optional[BaseException]):
+        if error is None:
+            breaker.record_success()
+        elif _is_retryable(error) and not _is_rate_limit(error):
+            breaker.record_failure()
+        elif isinstance(error, openai.APIStatusError) and not _is_rate_limit(error):
+            # The provider answered (e.g. a 400), so it is healthy.
+            breaker.record_success()
+        else:
+            breaker.release_probe()
+
+    async def _attempt(self, agent: str, kwargs: dict, breaker: CircuitBreaker, caller_limited: bool = False):
+        semaphore = await self._acquire(agent)
+        try:
+            timeout = self._attempt_timeout(agent)
+            started = time.perf_counter()
+            try:
+                # The client timeout applies per read; wait_for bounds the whole attempt.
+                response = await asyncio.wait_for(self.client.chat.completions.create(timeout=timeout, **kwargs), timeout)
+            except asyncio.CancelledError:
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                deadline_hit = caller_limited and _is_timeout(e)
+                if deadline_hit:
+                    # The caller's deadline cut the attempt short, not the provider: no verdict.
+                    breaker.release_probe()
+                else:
+                    self._record_outcome(breaker, e)
+                llm_metrics.record_error(agent, kwargs["model"], time.perf_counter() - started, e)
+                if deadline_hit:
+                    raise DeadlineExceededError(f"The {agent} request timed out.") from e
+                raise
+            elapsed = time.perf_counter() - started
+            self._record_outcome(breaker, None)
+            self._latency(agent).observe(elapsed)
+            llm_metrics.record_success(agent, kwargs["model"], elapsed, getattr(response, "usage", None))
+            return response
+        finally:
+            semaphore.release()
+
+    async def stream_chat_completion(self, agent: str, **kwargs):
+        """
+        Streams completion chunks. The agent's concurrency slot is held until
+        the stream is exhausted or the consumer stops iterating.
+
+        The deadline and circuit breaker apply to opening the stream; once
+        chunks are flowing there are no retries or hedges.
+        """
+        kwargs.setdefault("model", DEFAULT_MODEL)
+        kwargs.setdefault("stream_options", {"include_usage": True})
+        breaker = self.breaker(agent)
+        caller_limited = self._caller_limited(agent)
+        with resilience.deadline(self.policy(agent).timeout):
+            await self._wait_for_rate_limit(agent, self._rate_limit(kwargs["model"]))
+            breaker.before_call()
+            try:
+                semaphore = await self._acquire(agent)
+            except UpstreamUnavailableError:
+                breaker.release_probe()
+                raise
+            try:
+                timeout = self._attempt_timeout(agent)
+            except UpstreamUnavailableError:
+                breaker.release_probe()
+                semaphore.release()
+                raise
+        try:
+            started = time.perf_counter()
+            usage = None
+            try:
+                stream = await asyncio.wait_for(self.client.chat.completions.create(stream=True, timeout=timeout, **kwargs), timeout)
+                try:
+                    async for chunk in stream:
+                        usage = getattr(chunk, "usage", None) or usage
+                        yield chunk
+                finally:
+                    await stream.close()
+            except (asyncio.CancelledError, GeneratorExit):
+                breaker.release_probe()
+                raise
+            except Exception as e:
+                deadline_hit = caller_limited and _is_timeout(e)
+                if deadline_hit:
+                    breaker.release_probe()
+                else:
+                    self._record_outcome(breaker, e)
+                llm_metrics.record_error(agent, kwargs["model"], time.perf_counter() - started, e)
+                if deadline_hit or isinstance(e, asyncio.TimeoutError):
+                    raise DeadlineExceededError(f"The {agent} request timed out.") from e
+                raise
+            self._record_outcome(breaker, None)
+            llm_metrics.record_success(agent, kwargs["model"], time.perf_counter() - started, usage)
+        finally:
+            semaphore.release()
+
+    def resilience_stats(self) -> Dict[str, Dict]:
+        agents = sorted(set(self._breakers) | set(self._policies))
+        return {
+            "agents": {
+                agent: {
+                    "circuit": self.breaker(agent).stats(),
+                    "timeout": self.policy(agent).timeout,
+                    "hedge": self.policy(agent).hedge,
+                    "hedge_delay": self.hedge_delay(agent),
+                }
+                for agent in agents
+            },
+            "rate_limit_pause": {model: round(gate.wait_time(), 3) for model, gate in self._rate_limits.items()},
+        }
+
+    async def aclose(self):
+        await self.client.close()
+        await self._http_client.aclose()
+
+
+_gateway: Optional[LLMGateway] = None
+
+
+def _collect_coalesced():
+    if _gateway is None:
+        return []
+    return [({"agent": agent}, count) for agent, count in sorted(_gateway.singleflight.coalesced.items())]
+
+
+def _collect_circuits():
+    if _gateway is None:
+        return []
+    return [({"agent": agent}, 1 if breaker.state != CircuitBreaker.CLOSED else 0) for agent, breaker in sorted(_gateway._breakers.items())]
+
+
+REGISTRY.collector(
+    "llm_circuit_open",
+    "1 while the agent's circuit breaker is open or half-open.",
+    "gauge",
+    _collect_circuits,
+)
+REGISTRY.collector(
+    "llm_coalesced_requests_total",
+    "Requests that shared an identical in-flight LLM call instead of starting their own.",
+    "counter",
+    _collect_coalesced,
+)
+
+
+def get_gateway() -> LLMGateway:
+    """Returns the shared gateway, creating it on first use."""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway()
+    return _gateway
+
+
+async def close_gateway():
+    """Closes the shared gateway's connection pool. Called on application shutdown."""
+    global _gateway
+    if _gateway is not None:
+        await _gateway.aclose()
+        _gateway = None
+
+
+async def chat_completion(agent: str, **kwargs):
+    """Shortcut for `get_gateway().chat_completion(agent, ...)`."""
+    return await get_gateway().chat_completion(agent, **kwargs)
+
+
+def stream_chat_completion(agent: str, **kwargs):
+    """Shortcut for `get_gateway().stream_chat_completion(agent, ...)`."""
+    return get_gateway().stream_chat_completion(agent, **kwargs)
@@ -0,0 +1,53 @@
+# File: backend/llm/metrics.py
+from typing import Any, Optional
+from metrics.registry import REGISTRY, TOKEN_BUCKETS
+
+# USD per 1M tokens (input, output). Unknown models are counted at zero cost.
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+REQUESTS = REGISTRY.counter("llm_requests_total", "Upstream LLM calls by agent, model and outcome.", ("agent", "model", "outcome"))
+ERRORS = REGISTRY.counter("llm_errors_total", "Failed upstream LLM calls by agent and error class.", ("agent", "error_class"))
+UPSTREAM_LATENCY = REGISTRY.histogram("llm_upstream_latency_seconds", "Time spent waiting on the LLM provider.", ("agent",))
+QUEUE_WAIT = REGISTRY.histogram("llm_queue_wait_seconds", "Time spent waiting for the agent's concurrency slot.", ("agent",))
+PROMPT_TOKENS = REGISTRY.histogram("llm_prompt_tokens", "Prompt tokens per LLM call.", ("agent", "model"), TOKEN_BUCKETS)
+COMPLETION_TOKENS = REGISTRY.histogram("llm_completion_tokens", "Completion tokens per LLM call.", ("agent", "model"), TOKEN_BUCKETS)
+COST = REGISTRY.counter("llm_cost_usd_total", "Estimated LLM spend in USD.", ("agent", "model"))
+CACHE_LOOKUPS = REGISTRY.counter("llm_cache_lookups_total", "Response cache lookups by agent and result (hit, miss, bypass).", ("agent", "result"))
+LOCAL_ANSWERS = REGISTRY.counter("llm_local_answers_total", "Requests answered locally without an LLM call.", ("agent",))
+RETRIES = REGISTRY.counter("llm_retries_total", "Retried upstream LLM attempts by agent and reason.", ("agent", "reason"))
+HEDGES = REGISTRY.counter("llm_hedged_requests_total", "Hedged duplicate LLM requests by agent and outcome (launched, won).", ("agent", "outcome"))
+STRUCTURED_OUTPUTS = REGISTRY.counter(
+    "llm_structured_output_total",
+    "Structured LLM outputs by agent and result (valid, repaired, reasked, partial, failed).",
+    ("agent", "result"),
+)
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def record_usage(agent: str, model: str, usage: Optional[Any]):
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    PROMPT_TOKENS.observe(prompt_tokens, agent=agent, model=model)
+    COMPLETION_TOKENS.observe(completion_tokens, agent=agent, model=model)
+    COST.inc(estimate_cost(model, prompt_tokens, completion_tokens), agent=agent, model=model)
+
+
+def record_success(agent: str, model: str, upstream_seconds: float, usage: Optional[Any]):
+    REQUESTS.inc(agent=agent, model=model, outcome="success")
+    UPSTREAM_LATENCY.observe(upstream_seconds, agent=agent)
+    record_usage(agent, model, usage)
+
+
+def record_error(agent: str, model: str, upstream_seconds: float, error: BaseException):
+    REQUESTS.inc(agent=agent, model=model, outcome="error")
+    ERRORS.inc(agent=agent, error_class=type(error).__name__)
+    UPSTREAM_LATENCY.observe(upstream_seconds, agent=agent)
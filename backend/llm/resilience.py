@@ -0,0 +1,242 @@
+# File: backend/llm/resilience.py
+"""
+Failure handling for upstream LLM calls: request deadlines, circuit breakers,
+provider rate-limit backoff and the latency window used to decide when to hedge.
+"""
+import re
+import time
+import random
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Mapping, Optional, Tuple
+from fastapi import HTTPException
+
+# Absolute time.monotonic() by which the current request must be answered, if any.
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_deadline", default=None)
+
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+# --- Errors ---
+
+class UpstreamUnavailableError(Exception):
+    """The LLM call was not attempted or was abandoned to protect the service."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    def to_http_exception(self) -> HTTPException:
+        headers = {"Retry-After": str(max(1, round(self.retry_after)))} if self.retry_after else None
+        return HTTPException(status_code=self.status_code, detail=str(self), headers=headers)
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    status_code = 503
+
+
+class DeadlineExceededError(UpstreamUnavailableError):
+    status_code = 504
+
+# --- Deadlines ---
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """
+    Bounds every LLM call made inside the block (including tasks it starts)
+    to `seconds` from now. Nested deadlines can only shorten the outer one.
+    """
+    if seconds is None:
+        yield
+        return
+    candidate = time.monotonic() + max(0.0, seconds)
+    current = _deadline.get()
+    token = _deadline.set(candidate if current is None else min(current, candidate))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is none."""
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
+
+
+def parse_timeout_header(value: Optional[str]) -> Optional[float]:
+    """Reads a relative client deadline in milliseconds, ignoring malformed values."""
+    try:
+        milliseconds = float(value) if value else None
+    except ValueError:
+        return None
+    return milliseconds / 1000 if milliseconds and milliseconds > 0 else None
+
+# --- Rate-limit Backoff ---
+
+_DURATION_PART_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def _parse_duration(value: str) -> Optional[float]:
+    """Parses OpenAI reset durations such as "20ms", "1.5s" or "6m0s"."""
+    parts = _DURATION_PART_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def retry_after_from_headers(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """
+    How long the provider asked us to wait, in seconds.
+
+    Prefers `retry-after-ms` and `retry-after`, then the longer of the
+    request and token rate-limit reset times.
+    """
+    if not headers:
+        return None
+    for name, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value:
+            try:
+                return max(0.0, float(value) * scale)
+            except ValueError:
+                pass
+    resets = [
+        _parse_duration(headers[name])
+        for name in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+        if headers.get(name)
+    ]
+    resets = [r for r in resets if r is not None]
+    return max(resets) if resets else None
+
+
+def backoff_delay(attempt: int, base: float, cap: float, rng: random.Random = random) -> float:
+    """Exponential backoff with full jitter for retry `attempt` (starting at 1)."""
+    return rng.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+
+class RateLimitGate:
+    """
+    Shared pause after the provider rate-limits us.
+
+    A 429 closes the gate until its retry-after time, so other calls wait
+    (or fail fast if their deadline is shorter) instead of adding to the
+    overload and collecting their own 429s.
+    """
+
+    def __init__(self):
+        self.paused_until = 0.0
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def wait_time(self) -> float:
+        return max(0.0, self.paused_until - time.monotonic())
+
+# --- Circuit Breaker ---
+
+class CircuitBreaker:
+    """
+    Per-agent circuit breaker over a rolling window of call outcomes.
+
+    Closed: calls flow normally. When at least `min_calls` calls in the last
+    `window` seconds failed at `error_rate` or more, the circuit opens and
+    calls fail immediately for `open_seconds`. Then a single probe call is
+    let through (half-open); its success closes the circuit, its failure
+    reopens it.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, name: str, error_rate: float = 0.5, min_calls: int = 10, window: float = 30.0, open_seconds: float = 15.0):
+        self.name = name
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def before_call(self):
+        """Raises CircuitOpenError when the call must not be attempted."""
+        if self.state == self.CLOSED:
+            return
+        now = time.monotonic()
+        retry_after = self.opened_at + self.open_seconds - now
+        if self.state == self.OPEN and retry_after <= 0:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return
+        raise CircuitOpenError(
+            f"The {self.name} service is temporarily unavailable. Please try again shortly.",
+            retry_after=max(retry_after, 1.0),
+        )
+
+    def record_success(self):
+        now = time.monotonic()
+        if self.state != self.CLOSED:
+            self.state = self.CLOSED
+            self._probe_in_flight = False
+            self._outcomes.clear()
+        self._outcomes.append((now, True))
+        self._trim(now)
+
+    def record_failure(self):
+        now = time.monotonic()
+        if self.state == self.HALF_OPEN:
+            self._open(now)
+            return
+        self._outcomes.append((now, False))
+        self._trim(now)
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+            self._open(now)
+
+    def release_probe(self):
+        """Lets another probe through when the current one ended without an upstream verdict."""
+        self._probe_in_flight = False
+
+    def _open(self, now: float):
+        self.state = self.OPEN
+        self.opened_at = now
+        self.times_opened += 1
+        self._probe_in_flight = False
+        self._outcomes.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        return {
+            "state": self.state,
+            "recent_calls": len(self._outcomes),
+            "recent_failures": sum(1 for _, ok in self._outcomes if not ok),
+            "times_opened": self.times_opened,
+        }
+
+# --- Hedging ---
+
+class LatencyWindow:
+    """Recent successful upstream latencies for one agent, for picking the hedge delay."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, p: float, min_samples: int) -> Optional[float]:
+        if len(self._samples) < min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
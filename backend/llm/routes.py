@@ -0,0 +1,24 @@
+# File: backend/llm/routes.py
+from fastapi import APIRouter
+from llm import gateway as llm_gateway
+
+# --- Setup ---
+router = APIRouter()
+
+# --- LLM Gateway Endpoints ---
+@router.get("/singleflight")
+async def get_singleflight_stats():
+    """
+    Returns how many upstream completions each agent started and how many
+    concurrent identical requests were coalesced onto them instead.
+    """
+    return llm_gateway.get_gateway().singleflight.stats()
+
+
+@router.get("/resilience")
+async def get_resilience_stats():
+    """
+    Returns each agent's circuit breaker state, deadline and current hedge
+    delay, plus any active provider rate-limit pause per model.
+    """
+    return llm_gateway.get_gateway().resilience_stats()
\ No newline at end of file
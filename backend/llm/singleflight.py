@@ -0,0 +1,68 @@
+# File: backend/llm/singleflight.py
+import asyncio
+import hashlib
+import logging
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict
+
+from llm.cache import normalize_prompt
+
+logger = logging.getLogger(__name__)
+
+
+def make_key(agent: str, model: str, text: str) -> str:
+    """Coalescing key over (agent, model, normalized input)."""
+    digest = hashlib.sha256(normalize_prompt(text).encode("utf-8")).hexdigest()
+    return f"{agent}:{model}:{digest}"
+
+
+class SingleFlight:
+    """
+    Collapses concurrent identical calls into one.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it is in flight await the same task and receive the same result
+    (or exception). The task is shielded, so a leader whose client
+    disconnects does not cancel the call for everyone else.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders: Dict[str, int] = defaultdict(int)
+        self.coalesced: Dict[str, int] = defaultdict(int)
+
+    async def do(self, agent: str, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced[agent] += 1
+            logger.debug(f"Coalesced {agent} call onto in-flight request {key}")
+        else:
+            self.leaders[agent] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every waiter was cancelled.
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> Dict[str, Any]:
+        agents = sorted(set(self.leaders) | set(self.coalesced))
+        return {
+            "in_flight": self.in_flight(),
+            "agents": {
+                agent: {
+                    "upstream_calls": self.leaders[agent],
+                    "coalesced": self.coalesced[agent],
+                }
+                for agent in agents
+            },
+            "coalesced_total": sum(self.coalesced.values()),
+        }
@@ -0,0 +1,79 @@
+# File: backend/llm/streaming.py
+import json
+from typing import Any, List
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Formats one server-sent event frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class JSONArrayItemParser:
+    """
+    Incrementally extracts the object elements of the JSON array stored under
+    `key` while the surrounding document is still being streamed.
+
+    Feed it completion deltas; each call returns the elements whose closing
+    brace arrived in that delta, already decoded with `json.loads`.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start = -1
+
+    def _seek_array(self) -> bool:
+        key_at = self._buffer.find(f'"{self.key}"')
+        if key_at == -1:
+            return False
+        colon_at = self._buffer.find(":", key_at + len(self.key) + 2)
+        if colon_at == -1:
+            return False
+        bracket_at = self._buffer.find("[", colon_at)
+        if bracket_at == -1:
+            return False
+        self._in_array = True
+        self._pos = bracket_at + 1
+        return True
+
+    def feed(self, text: str) -> List[Any]:
+        items: List[Any] = []
+        if self.done or not text:
+            return items
+        self._buffer += text
+        if not self._in_array and not self._seek_array():
+            return items
+
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0:
+                    self._item_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0:
+                    self.done = True
+                    break
+                self._depth -= 1
+                if self._depth == 0:
+                    items.append(json.loads(buffer[self._item_start:i + 1]))
+                    self._item_start = -1
+        self._pos = len(buffer)
+        return items
@@ -0,0 +1,114 @@
+# File: backend/llm/structured.py
+import re
+import copy
+import json
+from typing import Any, Dict, Optional, Type
+from pydantic import BaseModel
+
+# Schema keywords that strict structured outputs reject or that only add noise to the prompt.
+_DROPPED_KEYWORDS = {"title", "default", "examples"}
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_NUMBER_RE = re.compile(r"-?\d+(?:[.,]\d+)?")
+_THOUSANDS_RE = re.compile(r"(?<=\d)['’,](?=\d{3}\b)")
+_ZERO_PRICE_WORDS = ("free", "included", "complimentary", "no charge", "none")
+
+
+def _make_strict(node: Any) -> Any:
+    if isinstance(node, list):
+        return [_make_strict(item) for item in node]
+    if not isinstance(node, dict):
+        return node
+    strict = {key: _make_strict(value) for key, value in node.items() if key not in _DROPPED_KEYWORDS | {"properties", "$defs"}}
+    # Keys of these maps are property and definition names, not keywords.
+    for mapping in ("properties", "$defs"):
+        if mapping in node:
+            strict[mapping] = {name: _make_strict(value) for name, value in node[mapping].items()}
+    if strict.get("type") == "object" and "properties" in strict:
+        # Strict mode requires every property to be listed; optional ones are nullable instead.
+        strict["required"] = list(strict["properties"])
+        strict["additionalProperties"] = False
+    return strict
+
+
+def strict_json_schema(model: Type[BaseModel], exclude: Optional[set] = None) -> Dict[str, Any]:
+    """
+    JSON schema for `model` (by alias) in the form OpenAI's strict structured
+    outputs accept: all properties required, no additional properties, no
+    titles or defaults. Top-level properties in `exclude` are left out.
+    """
+    schema = copy.deepcopy(model.model_json_schema(by_alias=True))
+    for name in exclude or ():
+        schema.get("properties", {}).pop(name, None)
+    return _make_strict(schema)
+
+
+def json_schema_response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+# --- Repair ---
+
+def _extract_object(text: str) -> Optional[str]:
+    """The first balanced {...} in `text`, ignoring braces inside strings."""
+    start = text.find("{")
+    if start == -1:
+        return None
+    depth, in_string, escape = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def loads_lenient(text: str) -> Any:
+    """
+    Parses model output that should be a JSON object, tolerating code
+    fences, text before or after the object and trailing commas.
+    Raises ValueError when nothing parseable is left.
+    """
+    try:
+        return json.loads(text)
+    except (TypeError, ValueError):
+        pass
+    candidate = _extract_object(_FENCE_RE.sub("", text or ""))
+    if candidate is None:
+        raise ValueError("No complete JSON object found in the model output.")
+    try:
+        return json.loads(candidate)
+    except ValueError:
+        return json.loads(_TRAILING_COMMA_RE.sub(r"\1", candidate))
+
+
+def coerce_int(value: Any) -> int:
+    """
+    Reads an integer from loosely formatted model output: 120.0, "120",
+    "CHF 1'200", "about 85 CHF", "Day 3", "free". Raises ValueError otherwise.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Not a number: {value!r}")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return round(value)
+    if isinstance(value, str):
+        text = _THOUSANDS_RE.sub("", value.strip())
+        match = _NUMBER_RE.search(text)
+        if match:
+            return round(float(match.group(0).replace(",", ".")))
+        if any(word in text.lower() for word in _ZERO_PRICE_WORDS):
+            return 0
+    raise ValueError(f"Not a number: {value!r}")
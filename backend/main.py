@@ -1,13 +1,16 @@
 # File: backend/main.py
 import os
-import requests
+import asyncio
 import sys
 from pathlib import Path
-from fastapi import FastAPI ,HTTPException, Depends
+from fastapi import FastAPI ,HTTPException, Depends, Request, Response
 from starlette.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import logging
+from contextlib import asynccontextmanager
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
 # Add the current directory to the path to allow direct imports
 sys.path.append(str(Path(__file__).parent))
@@ -16,13 +19,16 @@ sys.path.append(str(Path(__file__).parent))
 load_dotenv()
 
 # Use direct imports for all local packages
-from agents import neural, emotional, radar, conversational, location_agent
+from agents import neural, emotional, radar, conversational, location_agent, mood_classifier, orchestrator, history, geocoding, gazetteer
 from mcp import context
 from payments import stripe_handler, paypal_handler
 from auth import routes as auth_routes, models as auth_models
 from users import routes as user_routes
-from chat import routes as chat_routes # Import the new chat routes
+from chat import routes as chat_routes, persistence as chat_persistence # Import the new chat routes
 from auth.database import engine
+from llm import gateway as llm_gateway, routes as llm_routes, resilience
+from upstream import mapbox, mcp as mcp_upstream
+from metrics import routes as metrics_routes
 from pydantic import BaseModel
 # --- Static Files Setup ---
 os.makedirs("static/profile_pictures", exist_ok=True)
@@ -31,11 +37,39 @@ os.makedirs("static/profile_pictures", exist_ok=True)
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(levelname)s:%(name)s:%(message)s')
 
+# --- Lifespan ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    llm_gateway.get_gateway()
+    mapbox.get_client()
+    mcp_upstream.get_client()
+    if emotional.LOCAL_CLASSIFIER_ENABLED:
+        mood_classifier.get_classifier()
+    if location_agent.GAZETTEER_ENABLED:
+        gazetteer.get_gazetteer()
+    if radar.DIGESTS_ENABLED:
+        radar.digests.start()
+    await geocoding.warm_from_destinations()
+    yield
+    await radar.digests.stop()
+    if emotional.mood_batcher is not None:
+        await emotional.mood_batcher.drain()
+    await history.compactor.drain()
+    await asyncio.to_thread(chat_persistence.chat_writes.stop)
+    await llm_gateway.close_gateway()
+    await mapbox.close_client()
+    await mcp_upstream.close_client()
+    await neural.itinerary_cache.close()
+    await geocoding.geocode_cache.close()
+    await location_agent.route_cache.close()
+    await mcp_upstream.mcp_cache.close()
+
 # --- App Initialization ---
 app = FastAPI(
     title="SwissTouristy AI",
     description="Backend services for the SwissTouristy AI application.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Mount the 'static' directory at the root
@@ -53,6 +87,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Deadline Propagation ---
+# Clients may send X-Request-Timeout-Ms; LLM calls made for the request then give up
+# (504) when it runs out instead of finishing after the client has stopped waiting.
+@app.middleware("http")
+async def propagate_deadline(request: Request, call_next):
+    with resilience.deadline(resilience.parse_timeout_header(request.headers.get(resilience.DEADLINE_HEADER))):
+        return await call_next(request)
+
 # --- API Routers ---
 app.include_router(auth_routes.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(user_routes.router, prefix="/api/users", tags=["Users"])
@@ -62,7 +104,10 @@ app.include_router(emotional.router, prefix="/api/agents/emotional", tags=["Agen
 app.include_router(radar.router, prefix="/api/agents/radar", tags=["Agents"])
 app.include_router(conversational.router, prefix="/api/agents/conversational", tags=["Agents"])
 app.include_router(location_agent.router, prefix="/api/agents/location", tags=["Agents"])
+app.include_router(orchestrator.router, prefix="/api/agents/orchestrate", tags=["Agents"])
 app.include_router(context.router, prefix="/api/mcp/context", tags=["MCP"])
+app.include_router(llm_routes.router, prefix="/api/llm", tags=["LLM"])
+app.include_router(metrics_routes.router, tags=["Metrics"])
 app.include_router(stripe_handler.router, prefix="/api/payments", tags=["Payments"])
 app.include_router(paypal_handler.router, prefix="/api/payments", tags=["Payments"])
 
@@ -75,31 +120,50 @@ class McpToolRequest(BaseModel):
     toolName: str
     input: dict
 
-# 2. The URL where your mcp-server is running
-MCP_SERVER_URL = "http://localhost:8001/invoke"
-
-# 3. The new proxy endpoint
+# 2. The proxy endpoint. The MCP server URL, concurrency cap and per-tool
+# timeouts are configured in upstream.mcp (MCP_SERVER_URL, MCP_* settings).
 @app.post("/mcp-tool")
 async def call_mcp_tool(request: McpToolRequest):
     """
     This endpoint acts as a proxy to the mapbox/mcp-server.
-    It receives a request from our frontend, forwards it to the mcp-server,
-    and returns the response.
+    It receives a request from our frontend, forwards it to the mcp-server
+    over the shared connection pool, and streams the response back as it
+    arrives, so large tool outputs are never held in memory.
     """
+    client = mcp_upstream.get_client()
+    # Only tools opted in via MCP_CACHE_TOOLS are cached; the header reports what happened.
+    policy = mcp_upstream.cache_policy(request.toolName)
+    cache_key = None
+    if policy is not None:
+        cache_key = mcp_upstream.cache_key(request.toolName, request.input)
+        cached = await mcp_upstream.mcp_cache.get(cache_key)
+        if cached is not None:
+            return Response(
+                content=cached["body"],
+                media_type=cached["media_type"],
+                headers={"Cache-Status": mcp_upstream.cache_status("hit")},
+            )
+
     try:
-        # Forward the request to the mcp-server
-        response = requests.post(
-            MCP_SERVER_URL,
-            json={"toolName": request.toolName, "input": request.input},
-            headers={"Content-Type": "application/json"}
-        )
-        # Raise an exception if the mcp-server returns an error
-        response.raise_for_status()
-        # Return the JSON response from the mcp-server
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        # Handle network errors or other issues when calling the mcp-server
-        raise HTTPException(status_code=502, detail=f"Error calling MCP server: {e}")
+        call = await client.invoke(request.toolName, request.input)
+    except resilience.UpstreamUnavailableError as e:
+        # At capacity (503) or the tool timed out (504)
+        raise e.to_http_exception()
+    except mcp_upstream.McpServerError as e:
+        # Network errors or an error response from the mcp-server
+        raise HTTPException(status_code=502, detail=str(e))
+    return StreamingResponse(
+        client.iter_body(call, policy, cache_key),
+        media_type=call.response.headers.get("content-type", "application/json"),
+        headers={"Cache-Status": mcp_upstream.cache_status("fwd=miss" if policy is not None else "fwd=bypass")},
+        # Frees the slot even when the client disconnects before the body generator finishes.
+        background=BackgroundTask(call.close),
+    )
+
+@app.get("/mcp-tool/stats")
+async def get_mcp_tool_stats():
+    """Returns the MCP proxy's concurrency and timeout settings, calls in flight and result cache state."""
+    return mcp_upstream.get_client().stats()
 
 # --- END OF NEW CODE ---
 # --- Root Endpoint ---
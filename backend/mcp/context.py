@@ -1,9 +1,10 @@
 # File: backend/mcp/context.py
-import os
 import logging
 from fastapi import APIRouter, HTTPException
-from openai import OpenAI
 from schemas.agent import AgentRequest
+from llm import gateway as llm_gateway
+from llm.resilience import UpstreamUnavailableError
+from agents import neural
 from dotenv import load_dotenv
 
 # --- Setup ---
@@ -16,17 +17,27 @@ logger = logging.getLogger(__name__)
 async def get_mcp_context(request: AgentRequest):
     """
     Provides a transparent explanation for an AI's suggestion based on user input.
+
+    Serves the explanation the neural agent generated with the itinerary
+    (requested with `include_explanation`) when there is one for this
+    session and prompt; otherwise asks the LLM separately.
     """
     try:
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
+        if not request.bypass_cache:
+            stored = await neural.get_stored_explanation(request.session_id, request.prompt)
+            if stored:
+                logger.info(f"MCP Context served the stored explanation for session: {request.session_id}")
+                return {"content": stored}
+
         prompt = f"""
         Analyze the user's travel request and provide a one-sentence explanation for a potential AI recommendation.
         For example, if the user asks for luxury travel, the context might be "Based on your request for luxury, we are suggesting five-star accommodations."
         User request: '{request.prompt}'
         """
 
-        response = client.chat.completions.create(
+        response = await llm_gateway.chat_completion(
+            "mcp_context",
+            coalesce_on=request.prompt,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are a helpful travel assistant providing context for recommendations."},
@@ -39,6 +50,9 @@ async def get_mcp_context(request: AgentRequest):
         # FastAPI will correctly serialize this to JSON.
         return {"content": context}
 
+    except UpstreamUnavailableError as e:
+        logger.warning(f"MCP Context upstream unavailable: {e}")
+        raise e.to_http_exception()
     except Exception as e:
         logger.error(f"Error in MCP Context: {e}")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
@@ -0,0 +1,13 @@
+# File: backend/metrics/routes.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from metrics.registry import REGISTRY
+
+# --- Setup ---
+router = APIRouter()
+
+# --- Metrics Endpoint ---
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Exposes all registered metrics in the Prometheus text exposition format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,6 +1,6 @@
 # File: backend/schemas/agent.py
 from pydantic import BaseModel, Field
-from typing import List, Optional, Union, Tuple
+from typing import Any, Dict, List, Literal, Optional, Union, Tuple
 
 # --- Main Itinerary Schemas ---
 
@@ -17,12 +17,32 @@ class ItineraryDay(BaseModel):
 
 class ItineraryDraft(BaseModel):
     itinerary: List[ItineraryDay] = Field(..., alias="itinerary_draft")
+    explanation: Optional[str] = None # One-sentence reason for the plan, served by /api/mcp/context
 
 # --- New Models for Tool Calling & Location Request ---
 class Location(BaseModel):
     name: str
     coordinates: List[float]
 
+class ResolvedPlace(BaseModel):
+    place_name: str
+    coordinates: List[float] # [longitude, latitude]
+    source: str # gazetteer, cache or mapbox
+
+class RouteMatrixRequest(BaseModel):
+    origins: List[Tuple[float, float]] = Field(..., min_length=1) # [longitude, latitude]
+    destinations: List[Tuple[float, float]] = Field(..., min_length=1)
+    profile: Literal["driving", "driving-traffic", "walking", "cycling"] = "driving"
+    estimate_only: bool = False # Skip routing and answer every pair from the haversine estimate
+
+class RouteMatrixResponse(BaseModel):
+    profile: str
+    distances: List[List[float]] # Metres, origins x destinations
+    durations: List[List[float]] # Seconds
+    sources: List[List[str]] # Per pair: cache, mapbox or estimate
+    counts: Dict[str, int] = {} # Pairs per source
+    estimated: bool = False # True when any pair of distinct points is a haversine estimate
+
 class RideBookingPayload(BaseModel):
     pickup: Location
     destination: Location
@@ -43,6 +63,7 @@ class Message(BaseModel):
 
 class ConversationalRequest(BaseModel):
     messages: List[Message]
+    session_id: Optional[int] = None # Enables the stored rolling summary of older turns
 
 # --- General Agent Schemas ---
 
@@ -51,6 +72,8 @@ class AgentRequest(BaseModel):
     messages: Optional[List[Message]] = None
     current_location: Optional[Tuple[float, float]] = None # [longitude, latitude]
     session_id: Optional[int] = None # Add session_id
+    bypass_cache: bool = False # Force a fresh LLM response instead of a cached one
+    include_explanation: bool = False # Neural agent: also return the MCP context explanation
 
 class AgentResponse(BaseModel):
     content: str = Field(..., alias="response")
@@ -58,4 +81,16 @@ class AgentResponse(BaseModel):
 # --- Emotional Agent Schema ---
 class MoodResponse(BaseModel):
     mood: str
-    color: str = Field(..., alias="color_suggestion")
\ No newline at end of file
+    color: str = Field(..., alias="color_suggestion")
+
+# --- Orchestration Schemas ---
+class OrchestrationRequest(AgentRequest):
+    agents: List[str] = ["neural", "emotional", "radar", "mcp_context"]
+    deadline_ms: int = Field(8000, gt=0, le=120000) # Shared deadline for all selected agents
+
+class OrchestrationResponse(BaseModel):
+    results: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    timed_out: List[str] = []
+    latency_ms: Dict[str, float] = {}
+    elapsed_ms: float
\ No newline at end of file
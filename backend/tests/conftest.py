@@ -0,0 +1,13 @@
+# File: backend/tests/conftest.py
+import os
+import sys
+from pathlib import Path
+
+# The backend's packages (agents, llm, geo, ...) are imported from the backend directory.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Importing the agents builds the (lazy, unconnected) database engine and the caches;
+# give the engine a well-formed URL and keep the caches in memory.
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_PORT", "3306")
+os.environ.setdefault("GEOCODE_CACHE_BACKEND", "memory")
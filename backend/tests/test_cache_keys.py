@@ -0,0 +1,35 @@
+# File: backend/tests/test_cache_keys.py
+import pytest
+from llm.cache import make_key, normalize_prompt
+
+
+@pytest.mark.parametrize("a, b", [
+    ("fifteen days in Zurich", "15 days in Zurich"),
+    ("Thirteen days in Bern", "13 days in bern"),
+    ("nineteen nights", "19 nights"),
+    ("Twenty-one days", "21 days"),
+    ("3 days in Zürich!", "three days in zurich"),
+    ("3.0 days", "03 days"),
+    ("a couple of days", "2 of days"),
+    ("Plan   a trip,  please", "plan a trip please"),
+])
+def test_equivalent_prompts_share_a_key(a, b):
+    assert make_key("neural:v1", a) == make_key("neural:v1", b)
+
+
+@pytest.mark.parametrize("a, b", [
+    ("15 days in Zurich", "16 days in Zurich"),
+    ("1.5 days", "15 days"),
+    ("someone in Zurich", "some1 in Zurich"),
+])
+def test_different_prompts_keep_different_keys(a, b):
+    assert make_key("neural:v1", a) != make_key("neural:v1", b)
+
+
+def test_namespace_is_part_of_the_key():
+    assert make_key("neural:v1", "3 days") != make_key("neural:v2", "3 days")
+    assert make_key("neural:v1", "3 days").startswith("neural:v1:")
+
+
+def test_normalize_prompt():
+    assert normalize_prompt("Zwei Tage? Twenty Two days, fifteen hikes.") == "zwei tage 22 days 15 hikes"
@@ -0,0 +1,69 @@
+# File: backend/tests/test_gateway.py
+import asyncio
+import pytest
+from llm import resilience
+from llm.gateway import AgentPolicy, LLMGateway
+from llm.resilience import CircuitBreaker, DeadlineExceededError
+
+
+class HangingCompletions:
+    """Stands in for `client.chat.completions`; every call outlasts any test timeout."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(10)
+
+
+def make_gateway(timeout: float) -> LLMGateway:
+    gateway = LLMGateway(api_key="test")
+    gateway.max_retries = 0
+    gateway._policies["neural"] = AgentPolicy("neural", concurrency=4, timeout=timeout)
+    # Opens on the first counted failure.
+    gateway._breakers["neural"] = CircuitBreaker("neural", error_rate=0.5, min_calls=1)
+    gateway.client.chat.completions = HangingCompletions()
+    return gateway
+
+
+async def _call(gateway: LLMGateway, caller_deadline=None):
+    try:
+        with resilience.deadline(caller_deadline):
+            await gateway.chat_completion("neural", messages=[])
+    finally:
+        await gateway.aclose()
+
+
+def test_caller_deadline_timeout_does_not_count_against_breaker():
+    gateway = make_gateway(timeout=5.0)
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(_call(gateway, caller_deadline=0.05))
+    breaker = gateway.breaker("neural")
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["recent_failures"] == 0
+
+
+def test_policy_timeout_counts_against_breaker():
+    gateway = make_gateway(timeout=0.05)
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(_call(gateway))
+    assert gateway.breaker("neural").state == CircuitBreaker.OPEN
+
+
+def test_longer_caller_deadline_leaves_policy_timeout_in_charge():
+    gateway = make_gateway(timeout=0.05)
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(_call(gateway, caller_deadline=5.0))
+    assert gateway.breaker("neural").state == CircuitBreaker.OPEN
+
+
+def test_caller_deadline_releases_half_open_probe():
+    gateway = make_gateway(timeout=5.0)
+    breaker = gateway.breaker("neural")
+    breaker.record_failure()
+    breaker.opened_at -= breaker.open_seconds  # The open period is over; the next call probes.
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(_call(gateway, caller_deadline=0.05))
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.before_call()  # Another caller may probe again.
@@ -0,0 +1,133 @@
+# File: backend/tests/test_geometry.py
+import numpy as np
+import pytest
+from geo import geometry
+
+# The example from Google's encoded polyline format documentation, as [lon, lat].
+GOOGLE_POINTS = [[-120.2, 38.5], [-120.95, 40.7], [-126.453, 43.252]]
+GOOGLE_ENCODED = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+ZURICH = (8.5402, 47.3782)
+GENEVA = (6.1432, 46.2044)
+
+
+def winding_line(count: int = 2000, seed: int = 3) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    t = np.linspace(0.0, 1.0, count)
+    lon = ZURICH[0] + t * (GENEVA[0] - ZURICH[0]) + 0.02 * np.sin(t * 40)
+    lat = ZURICH[1] + t * (GENEVA[1] - ZURICH[1]) + 0.01 * np.sin(t * 17)
+    return np.column_stack((lon, lat)) + rng.normal(0.0, 2e-5, (count, 2))
+
+
+def reference_douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Textbook recursive Douglas-Peucker on the same projection, for comparison."""
+    xy = geometry._project(points)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        segment = xy[last] - xy[first]
+        offsets = xy[first + 1:last] - xy[first]
+        length2 = segment @ segment
+        along = np.clip(offsets @ segment / (length2 if length2 > 0 else 1.0), 0.0, 1.0)
+        distances = np.hypot(*(offsets - along[:, None] * segment).T)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            split = first + 1 + farthest
+            keep[split] = True
+            stack += [(first, split), (split, last)]
+    return keep
+
+# --- Polylines ---
+
+def test_encode_polyline_matches_reference_example():
+    assert geometry.encode_polyline(GOOGLE_POINTS) == GOOGLE_ENCODED
+
+
+def test_decode_polyline_matches_reference_example():
+    np.testing.assert_allclose(geometry.decode_polyline(GOOGLE_ENCODED), GOOGLE_POINTS)
+
+
+@pytest.mark.parametrize("precision", [5, 6])
+def test_polyline_round_trip(precision):
+    points = np.round(winding_line(500), precision)
+    decoded = geometry.decode_polyline(geometry.encode_polyline(points, precision), precision)
+    np.testing.assert_allclose(decoded, points, atol=10 ** -precision / 2)
+
+
+def test_polyline_handles_empty_and_large_values():
+    assert geometry.encode_polyline([]) == ""
+    assert geometry.decode_polyline("").shape == (0, 2)
+    points = [[179.999999, -89.999999], [-179.999999, 89.999999], [0.0, 0.0]]
+    np.testing.assert_allclose(geometry.decode_polyline(geometry.encode_polyline(points, 6), 6), points, atol=1e-6)
+
+# --- Distances ---
+
+def test_haversine_between_zurich_and_geneva():
+    assert geometry.haversine_m(ZURICH, GENEVA) == pytest.approx(224_000, rel=0.01)
+    assert geometry.haversine_m(ZURICH, ZURICH) == 0.0
+
+
+def test_haversine_matrix_matches_scalar():
+    origins = [ZURICH, GENEVA]
+    destinations = [GENEVA, ZURICH, (7.4474, 46.9480)]
+    matrix = geometry.haversine_matrix(origins, destinations)
+    assert matrix.shape == (2, 3)
+    for i, origin in enumerate(origins):
+        for j, destination in enumerate(destinations):
+            assert matrix[i, j] == pytest.approx(geometry.haversine_m(origin, destination))
+
+# --- Simplification ---
+
+@pytest.mark.parametrize("tolerance", [1.0, 25.0, 400.0, 5000.0])
+def test_douglas_peucker_matches_recursive_reference(tolerance):
+    points = winding_line()
+    np.testing.assert_array_equal(geometry.douglas_peucker(points, tolerance), reference_douglas_peucker(points, tolerance))
+
+
+@pytest.mark.parametrize("method", geometry.SIMPLIFY_METHODS)
+def test_simplify_keeps_endpoints_and_shrinks_with_tolerance(method):
+    points = winding_line()
+    counts = []
+    for tolerance in (1.0, 50.0, 1000.0):
+        simplified = geometry.simplify(points, tolerance, method)
+        np.testing.assert_array_equal(simplified[[0, -1]], points[[0, -1]])
+        counts.append(len(simplified))
+    assert counts[0] >= counts[1] >= counts[2] >= 2
+    assert counts[2] < len(points) / 10
+
+
+@pytest.mark.parametrize("method", geometry.SIMPLIFY_METHODS)
+def test_simplify_collapses_a_straight_line(method):
+    t = np.linspace(0.0, 1.0, 100)[:, None]
+    line = np.array(ZURICH) + t * (np.array(GENEVA) - np.array(ZURICH))
+    np.testing.assert_array_equal(geometry.simplify(line, 1.0, method), line[[0, -1]])
+
+
+@pytest.mark.parametrize("method", geometry.SIMPLIFY_METHODS)
+@pytest.mark.parametrize("count", [0, 1, 2])
+def test_simplify_leaves_tiny_lines_alone(method, count):
+    points = winding_line()[:count]
+    assert len(geometry.simplify(points, 10.0, method)) == count
+
+
+def test_douglas_peucker_stays_within_tolerance():
+    points = winding_line()
+    tolerance = 100.0
+    kept = np.flatnonzero(geometry.douglas_peucker(points, tolerance))
+    xy = geometry._project(points)
+    for first, last in zip(kept, kept[1:]):
+        segment = xy[last] - xy[first]
+        offsets = xy[first + 1:last] - xy[first]
+        if not len(offsets):
+            continue
+        along = np.clip(offsets @ segment / (segment @ segment), 0.0, 1.0)
+        assert np.hypot(*(offsets - along[:, None] * segment).T).max() <= tolerance
+
+
+def test_zoom_tolerance_halves_per_zoom_level():
+    assert geometry.zoom_tolerance(0, 0.0) == pytest.approx(geometry.METRES_PER_PIXEL_Z0)
+    assert geometry.zoom_tolerance(11, 46.5) == pytest.approx(geometry.zoom_tolerance(10, 46.5) / 2)
@@ -0,0 +1,82 @@
+# File: backend/tests/test_mcp_client.py
+import asyncio
+import httpx
+import pytest
+from llm.resilience import UpstreamUnavailableError
+from upstream import mcp
+
+
+def make_client(handler, monkeypatch, max_concurrency: int = 1) -> mcp.McpClient:
+    monkeypatch.setattr(mcp, "MAX_CONCURRENCY", max_concurrency)
+    monkeypatch.setattr(mcp, "QUEUE_TIMEOUT", 0.05)
+    client = mcp.McpClient(url="http://mcp.test/invoke")
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def echo(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, content=request.content, headers={"content-type": "application/json"})
+
+
+async def _drain(client: mcp.McpClient, call: mcp.McpToolCall) -> bytes:
+    return b"".join([chunk async for chunk in client.iter_body(call)])
+
+
+def test_streamed_call_frees_its_slot_once(monkeypatch):
+    async def run():
+        client = make_client(echo, monkeypatch)
+        call = await client.invoke("echo", {"a": 1})
+        assert client.in_flight == 1
+        assert b'"toolName":"echo"' in await _drain(client, call)
+        # The response's background task closes the call again after streaming.
+        await call.close()
+        assert client.in_flight == 0
+        # The one slot is free for the next call.
+        await (await client.invoke("echo", {})).close()
+        assert client.in_flight == 0
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_call_abandoned_before_streaming_is_freed_by_close(monkeypatch):
+    async def run():
+        client = make_client(echo, monkeypatch)
+        call = await client.invoke("echo", {})
+        body = client.iter_body(call)
+        await body.__anext__()  # The client disconnects after the first chunk.
+        await call.close()
+        await body.aclose()
+        assert client.in_flight == 0
+        await (await client.invoke("echo", {})).close()
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_full_client_rejects_further_calls(monkeypatch):
+    async def run():
+        client = make_client(echo, monkeypatch)
+        call = await client.invoke("echo", {})
+        with pytest.raises(UpstreamUnavailableError):
+            await client.invoke("echo", {})
+        await call.close()
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_error_response_frees_the_slot(monkeypatch):
+    async def run():
+        client = make_client(lambda request: httpx.Response(400, json={"error": "bad input"}), monkeypatch)
+        with pytest.raises(mcp.McpServerError, match="400"):
+            await client.invoke("echo", {})
+        assert client.in_flight == 0
+        await client.aclose()
+
+    asyncio.run(run())
+
+
+def test_cache_key_ignores_key_order_and_spacing():
+    assert mcp.cache_key("poi", {"a": 1, "b": [1, 2]}) == mcp.cache_key("poi", {"b": [1, 2], "a": 1})
+    assert mcp.cache_key("poi", {"a": 1}) != mcp.cache_key("geocode", {"a": 1})
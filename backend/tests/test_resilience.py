@@ -0,0 +1,80 @@
+# File: backend/tests/test_resilience.py
+import asyncio
+import pytest
+from llm import resilience
+from llm.resilience import CircuitBreaker, CircuitOpenError
+
+
+def make_breaker() -> CircuitBreaker:
+    return CircuitBreaker("test", error_rate=0.5, min_calls=4, window=30.0, open_seconds=15.0)
+
+
+def test_breaker_opens_at_the_error_rate_once_enough_calls_were_seen():
+    breaker = make_breaker()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED  # Fewer than min_calls outcomes.
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_breaker_stays_closed_below_the_error_rate():
+    breaker = make_breaker()
+    for ok in (True, True, False, True, True, False):
+        breaker.record_success() if ok else breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def _expire(breaker: CircuitBreaker):
+    breaker.opened_at -= breaker.open_seconds
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = make_breaker()
+    breaker._open(0.0)
+    _expire(breaker)
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Only one probe at a time.
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_and_released_probe_allows_another():
+    breaker = make_breaker()
+    breaker._open(0.0)
+    _expire(breaker)
+    breaker.before_call()
+    breaker.release_probe()
+    breaker.before_call()  # No verdict from the first probe; a second may try.
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.times_opened == 2
+
+
+def test_nested_deadlines_only_shorten():
+    assert resilience.remaining() is None
+    with resilience.deadline(10):
+        with resilience.deadline(60):
+            assert resilience.remaining() <= 10
+        with resilience.deadline(1):
+            assert resilience.remaining() <= 1
+    assert resilience.remaining() is None
+
+
+def test_tasks_inherit_the_deadline():
+    async def run():
+        with resilience.deadline(5):
+            return await asyncio.ensure_future(asyncio.sleep(0, result=resilience.remaining()))
+
+    assert 0 < asyncio.run(run()) <= 5
+
+
+@pytest.mark.parametrize("value, expected", [("2500", 2.5), ("0", None), ("-5", None), ("soon", None), (None, None)])
+def test_parse_timeout_header(value, expected):
+    assert resilience.parse_timeout_header(value) == expected
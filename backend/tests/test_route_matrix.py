@@ -0,0 +1,79 @@
+# File: backend/tests/test_route_matrix.py
+import asyncio
+import numpy as np
+import pytest
+from llm.resilience import UpstreamUnavailableError
+from schemas.agent import RouteMatrixRequest
+from agents import location_agent
+
+POINTS = [[round(8.0 + 0.07 * i, 4), round(46.5 + 0.03 * i, 4)] for i in range(25)]
+
+
+@pytest.mark.parametrize("profile, origins, destinations", [
+    ("driving", 1, 1),
+    ("driving", 3, 22),
+    ("driving", 3, 100),
+    ("driving", 25, 25),
+    ("driving", 40, 7),
+    ("driving-traffic", 25, 25),
+])
+def test_matrix_batches_cover_every_cell_once_within_the_coordinate_limit(profile, origins, destinations):
+    limit = location_agent.MATRIX_MAX_COORDINATES_TRAFFIC if profile == "driving-traffic" else location_agent.MATRIX_MAX_COORDINATES
+    covered = np.zeros((origins, destinations), dtype=int)
+    for rows, cols in location_agent._matrix_batches(profile, origins, destinations):
+        assert (rows.stop - rows.start) + (cols.stop - cols.start) <= limit
+        covered[rows, cols] += 1
+    assert (covered == 1).all()
+
+
+def test_small_matrix_is_one_batch():
+    assert list(location_agent._matrix_batches("driving", 3, 22)) == [(slice(0, 3), slice(0, 22))]
+
+
+@pytest.fixture
+def matrix_calls(monkeypatch):
+    """Answers Matrix API calls from the estimate (plus 1 m, to tell them apart); the second call fails."""
+    calls = []
+
+    async def fake_fetch_matrix(profile, origins, destinations):
+        calls.append((len(origins), len(destinations)))
+        if len(calls) == 2:
+            raise UpstreamUnavailableError("Mapbox matrix quota is exhausted.")
+        distances, durations = location_agent.estimate_matrix(profile, origins, destinations)
+        return distances + 1.0, durations + 1.0
+
+    monkeypatch.setattr(location_agent, "_fetch_matrix", fake_fetch_matrix)
+    monkeypatch.setattr(location_agent, "MAPBOX_API_KEY", "pk.test")
+    monkeypatch.setattr(location_agent, "MATRIX_CONCURRENCY", 1)
+    return calls
+
+
+def test_only_the_failed_batch_falls_back_to_estimates(matrix_calls):
+    response = asyncio.run(location_agent.get_route_matrix(RouteMatrixRequest(origins=POINTS, destinations=POINTS)))
+    batches = list(location_agent._matrix_batches("driving", len(POINTS), len(POINTS)))
+    assert matrix_calls == [(rows.stop - rows.start, cols.stop - cols.start) for rows, cols in batches]
+
+    failed_rows, failed_cols = batches[1]
+    expected = np.full((len(POINTS), len(POINTS)), "mapbox", dtype=object)
+    expected[failed_rows, failed_cols] = "estimate"
+    np.fill_diagonal(expected, "estimate")  # Identical points need no route.
+    assert (np.array(response.sources) == expected).all()
+    assert response.estimated
+    mapbox = np.array(response.sources) == "mapbox"
+    estimates = location_agent.estimate_matrix("driving", POINTS, POINTS)[0]
+    np.testing.assert_allclose(np.array(response.distances)[mapbox], np.round(estimates[mapbox] + 1.0, 1))
+
+
+def test_missing_api_key_estimates_everything(matrix_calls, monkeypatch):
+    monkeypatch.setattr(location_agent, "MAPBOX_API_KEY", None)
+    monkeypatch.setattr(location_agent.upstream, "is_offline", lambda: False)
+    response = asyncio.run(location_agent.get_route_matrix(RouteMatrixRequest(origins=POINTS[:2], destinations=POINTS[2:4])))
+    assert matrix_calls == []
+    assert response.estimated
+    assert response.counts == {"estimate": 4}
+
+
+def test_estimate_only_makes_no_calls(matrix_calls):
+    response = asyncio.run(location_agent.get_route_matrix(RouteMatrixRequest(origins=POINTS[:3], destinations=POINTS[:3], estimate_only=True)))
+    assert matrix_calls == []
+    assert np.allclose(np.diag(response.distances), 0.0)
@@ -0,0 +1,66 @@
+# File: backend/tests/test_singleflight.py
+import asyncio
+import pytest
+from llm.singleflight import SingleFlight, make_key
+
+
+def test_key_normalizes_the_input():
+    assert make_key("neural", "gpt-4o-mini", "Three days in Zürich!") == make_key("neural", "gpt-4o-mini", "3 days in zurich")
+    assert make_key("neural", "gpt-4o-mini", "3 days") != make_key("radar", "gpt-4o-mini", "3 days")
+
+
+def test_concurrent_identical_calls_share_one_upstream_call():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"answer": 42}
+
+        results = await asyncio.gather(*(flight.do("neural", "k", work) for _ in range(5)))
+        assert calls == 1
+        assert all(result is results[0] for result in results)
+        assert flight.stats()["agents"]["neural"] == {"upstream_calls": 1, "coalesced": 4}
+        assert flight.in_flight() == 0
+        # Once finished, the next call goes upstream again.
+        await flight.do("neural", "k", work)
+        assert calls == 2
+
+    asyncio.run(run())
+
+
+def test_errors_reach_every_waiter():
+    async def run():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream failed")
+
+        results = await asyncio.gather(*(flight.do("neural", "k", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(run())
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def run():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        leader = asyncio.ensure_future(flight.do("neural", "k", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("neural", "k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(run())
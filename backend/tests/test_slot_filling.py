@@ -0,0 +1,92 @@
+# File: backend/tests/test_slot_filling.py
+from datetime import date
+import pytest
+from schemas.agent import Message
+from agents import slot_filling
+from agents.slot_filling import READY_TO_PLAN, QUESTIONS, detect_flight_status, extract_dates, extract_travelers, looks_like_trip_request
+
+TODAY = date(2026, 3, 1)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("2 adults and 1 child", 3),
+    ("We are a family of 5", 5),
+    ("just me", 1),
+    ("my wife and I", 2),
+    ("me and my wife and 2 kids", 4),
+    ("my husband and I with our three children", 5),
+    ("me and my wife, 4 people in total", 4),
+    ("me and my wife and 2 adults", None),
+    ("We'd love to see Zermatt", None),
+])
+def test_extract_travelers(text, expected):
+    assert extract_travelers(text) == expected
+
+
+def test_extract_travelers_bare_count_only_when_expecting():
+    assert extract_travelers("four") is None
+    assert extract_travelers("four", expecting=True) == 4
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("June 12-15", (date(2026, 6, 12), date(2026, 6, 15))),
+    ("from 12 to 18 July 2027", (date(2027, 7, 12), date(2027, 7, 18))),
+    ("2026-05-01 to 2026-05-07", (date(2026, 5, 1), date(2026, 5, 7))),
+    ("arriving on the 3rd of May", (date(2026, 5, 3), None)),
+    ("It costs 1.5 francs", None),
+])
+def test_extract_dates(text, expected):
+    assert extract_dates(text, today=TODAY) == expected
+
+
+def test_extract_dates_relative_only_when_expecting():
+    assert extract_dates("next week", today=TODAY) is None
+    assert extract_dates("next week", expecting=True, today=TODAY) == (None, None)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Yes, all booked", True),
+    ("Sure, we have our flights", True),
+    ("No, not yet", False),
+    ("We haven't booked them yet", False),
+    ("I am not sure, do I need to?", None),
+    ("no idea", None),
+    ("I don't know yet", None),
+    ("Maybe", None),
+    ("Should I book them now?", None),
+])
+def test_detect_flight_status_answering(text, expected):
+    assert detect_flight_status(text, expecting=True) is expected
+
+
+def test_detect_flight_status_needs_flights_mentioned_otherwise():
+    assert detect_flight_status("yes") is None
+    assert detect_flight_status("Our flights are already booked") is True
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Plan a 3-day trip to Zermatt", True),
+    ("Can you plan 3 days in Bern?", True),
+    ("We want to visit Lucerne in June", True),
+    ("Hello!", False),
+    ("What is the best time to visit Zermatt?", False),
+])
+def test_looks_like_trip_request(text, expected):
+    assert looks_like_trip_request(text) is expected
+
+
+def _conversation(*turns):
+    return [Message(sender="user" if i % 2 == 0 else "ai", content=text) for i, text in enumerate(turns)]
+
+
+def test_next_reply_walks_the_slots():
+    assert slot_filling.next_reply(_conversation("Plan a trip to Zermatt")) == QUESTIONS["travelers"]
+    assert slot_filling.next_reply(_conversation("Plan a trip to Zermatt", QUESTIONS["travelers"], "two")) == QUESTIONS["dates"]
+    turns = ("Plan a trip to Zermatt", QUESTIONS["travelers"], "two", QUESTIONS["dates"], "June 12-15", QUESTIONS["flights"], "yes")
+    assert slot_filling.next_reply(_conversation(*turns)) == READY_TO_PLAN
+
+
+def test_next_reply_leaves_unclear_answers_to_the_llm():
+    turns = ("Plan a trip to Zermatt for 2 people in June 12-15", QUESTIONS["flights"], "I am not sure, do I need to?")
+    assert slot_filling.next_reply(_conversation(*turns)) is None
+    assert slot_filling.next_reply(_conversation("Hi there")) is None
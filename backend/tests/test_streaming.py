@@ -0,0 +1,59 @@
+# File: backend/tests/test_streaming.py
+import json
+import pytest
+from llm.streaming import JSONArrayItemParser, sse_event
+
+DOCUMENT = json.dumps({
+    "explanation": "Two calm days {with} [brackets] in \"quotes\".",
+    "itinerary_draft": [
+        {"day": 1, "title": "Arrival", "activities": [{"time": "10:00", "description": "Check in \\ relax {}", "price": 0}]},
+        {"day": 2, "title": "Lake [cruise]", "activities": []},
+    ],
+    "after": [{"ignored": True}],
+})
+DAYS = json.loads(DOCUMENT)["itinerary_draft"]
+
+
+def _feed_in_chunks(parser: JSONArrayItemParser, text: str, size: int):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(parser.feed(text[start:start + size]))
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_items_are_extracted_whatever_the_chunking(size):
+    parser = JSONArrayItemParser("itinerary_draft")
+    assert _feed_in_chunks(parser, DOCUMENT, size) == DAYS
+    assert parser.done
+
+
+def test_items_arrive_as_soon_as_they_close():
+    parser = JSONArrayItemParser("itinerary_draft")
+    first_end = DOCUMENT.index('"day": 2') - 2
+    assert parser.feed(DOCUMENT[:first_end]) == [DAYS[0]]
+    assert not parser.done
+    assert parser.feed(DOCUMENT[first_end:]) == [DAYS[1]]
+    assert parser.done
+
+
+def test_nothing_after_the_array_is_parsed():
+    parser = JSONArrayItemParser("itinerary_draft")
+    parser.feed(DOCUMENT)
+    assert parser.feed('{"day": 3}') == []
+
+
+def test_missing_key_yields_nothing():
+    parser = JSONArrayItemParser("itinerary_draft")
+    assert _feed_in_chunks(parser, json.dumps({"days": DAYS}), 5) == []
+    assert not parser.done
+
+
+def test_empty_array():
+    parser = JSONArrayItemParser("itinerary_draft")
+    assert parser.feed('{"itinerary_draft": []}') == []
+    assert parser.done
+
+
+def test_sse_event_frame():
+    assert sse_event("day", {"day": 1}) == 'event: day\ndata: {"day": 1}\n\n'
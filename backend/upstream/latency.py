@@ -0,0 +1,46 @@
+# File: backend/upstream/latency.py
+import math
+import random
+from typing import Optional
+
+
+class LatencyDistribution:
+    """
+    Simulated upstream latency, in seconds, parsed from a short spec:
+
+        "0"                    no delay
+        "fixed:0.25"           always 250 ms
+        "uniform:0.05,0.4"     uniform between 50 and 400 ms
+        "normal:1.2,0.3"       mean 1.2 s, std dev 0.3 s (clipped at 0)
+        "lognormal:1.5,0.6"    median 1.5 s, log-space sigma 0.6 (long right tail)
+    """
+
+    def __init__(self, kind: str, params: tuple, rng: random.Random):
+        self.kind = kind
+        self.params = params
+        self.rng = rng
+
+    @classmethod
+    def parse(cls, spec: Optional[str], rng: Optional[random.Random] = None) -> "LatencyDistribution":
+        rng = rng or random.Random()
+        spec = (spec or "0").strip()
+        kind, _, raw_params = spec.partition(":")
+        if not raw_params:
+            return cls("fixed", (float(kind),), rng)
+        params = tuple(float(p) for p in raw_params.split(","))
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(f"Invalid latency spec {spec!r}; see LatencyDistribution for the format.")
+        return cls(kind, params, rng)
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, self.rng.gauss(*self.params))
+        median, sigma = self.params
+        if median <= 0:
+            return 0.0
+        return self.rng.lognormvariate(math.log(median), sigma)
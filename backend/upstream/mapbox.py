@@ -0,0 +1,214 @@
+# File: backend/upstream/mapbox.py
+"""
+App-lifetime Mapbox client: one pooled (HTTP/2 when available) connection
+pool for every Mapbox API, a token bucket per API sized to the account's
+quota, and per-API latency metrics.
+"""
+import os
+import time
+import asyncio
+import logging
+import importlib.util
+from typing import Any, Dict, Mapping, Optional
+import httpx
+from llm import resilience
+from llm.resilience import UpstreamUnavailableError
+from metrics.registry import REGISTRY
+from upstream import transport as upstream
+
+logger = logging.getLogger(__name__)
+
+# Mapbox's default per-account limits, in requests per minute. Override with
+# MAPBOX_<API>_RATE_PER_MIN (e.g. MAPBOX_GEOCODING_RATE_PER_MIN=1200).
+DEFAULT_QUOTAS = {
+    "geocoding": 600,
+    "directions": 300,
+    "matrix": 60,
+}
+# Longest a request queues for a token before it is rejected with a 503.
+QUEUE_TIMEOUT = float(os.getenv("MAPBOX_QUEUE_TIMEOUT", "2"))
+HTTP2_ENABLED = os.getenv("MAPBOX_HTTP2", "true").lower() in ("1", "true", "yes")
+
+REQUESTS = REGISTRY.counter(
+    "mapbox_requests_total",
+    "Mapbox calls by API and outcome (ok, error, rate_limited, rejected).",
+    ("api", "outcome"),
+)
+LATENCY = REGISTRY.histogram("mapbox_request_latency_seconds", "Mapbox response time by API.", ("api",))
+QUEUE_WAIT = REGISTRY.histogram("mapbox_queue_wait_seconds", "Time spent waiting for a Mapbox rate-limit token.", ("api",))
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class TokenBucket:
+    """
+    Token bucket with reservations.
+
+    `rate` tokens per second refill a bucket of `capacity`. A caller takes a
+    token immediately when one is available; otherwise it reserves the next
+    one (the balance goes negative) and sleeps until it is due, so waiting
+    callers are served in arrival order. A reservation further away than the
+    caller is willing to wait is refused without taking anything.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """Takes a token; returns how long to wait before using it, or None if that exceeds `max_wait`."""
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0, (1.0 - self.tokens) / self.rate, self.paused_until - now)
+        if wait > max_wait:
+            return None
+        self.tokens -= 1.0
+        return wait
+
+    def next_free(self) -> float:
+        """Seconds until a new caller could get a token."""
+        now = time.monotonic()
+        self._refill(now)
+        return max(0.0, (1.0 - self.tokens) / self.rate, self.paused_until - now)
+
+    def pause(self, seconds: float):
+        """Stops handing out tokens for `seconds`, e.g. after the provider returned 429."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = min(self.tokens, 0.0)
+
+
+def _reset_after(headers: Mapping[str, str]) -> float:
+    # Mapbox reports the end of the current rate-limit window as a Unix timestamp.
+    reset = headers.get("x-rate-limit-reset")
+    if reset:
+        try:
+            return max(0.0, float(reset) - time.time())
+        except ValueError:
+            pass
+    return resilience.retry_after_from_headers(headers) or 1.0
+
+
+class MapboxClient:
+    """
+    Shared client for all Mapbox APIs.
+
+    Calls go through the API's token bucket first: they run immediately while
+    the quota has room, queue in arrival order when it is briefly exhausted,
+    and fail fast with UpstreamUnavailableError (503 + Retry-After) when the
+    wait would exceed MAPBOX_QUEUE_TIMEOUT or the request's own deadline.
+    A 429 from Mapbox pauses that API's bucket until the window resets.
+    """
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key or os.getenv("MAPBOX_API_KEY")
+        http2 = HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+        if HTTP2_ENABLED and not http2:
+            logger.warning("MAPBOX_HTTP2 is on but the 'h2' package is not installed; using HTTP/1.1")
+        self.http2 = http2
+        limits = httpx.Limits(
+            max_connections=int(_env_float("MAPBOX_MAX_CONNECTIONS", 50)),
+            max_keepalive_connections=int(_env_float("MAPBOX_MAX_KEEPALIVE", 10)),
+            keepalive_expiry=60.0,
+        )
+        self._client = httpx.AsyncClient(
+            http2=http2,
+            limits=limits,
+            timeout=httpx.Timeout(10.0, connect=3.0),
+            # Replay/synthetic upstream modes answer Mapbox calls locally (see upstream.transport).
+            transport=upstream.build_transport("mapbox", limits=limits, http2=http2),
+        )
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, api: str) -> TokenBucket:
+        if api not in self._buckets:
+            per_minute = _env_float(f"MAPBOX_{api.upper()}_RATE_PER_MIN", DEFAULT_QUOTAS.get(api, 300))
+            rate = per_minute / 60.0
+            # Allow short bursts of up to a few seconds' worth of quota.
+            burst = _env_float(f"MAPBOX_{api.upper()}_BURST", max(1.0, rate * 5))
+            self._buckets[api] = TokenBucket(rate, burst)
+        return self._buckets[api]
+
+    async def _acquire(self, api: str):
+        max_wait = QUEUE_TIMEOUT
+        time_left = resilience.remaining()
+        if time_left is not None:
+            max_wait = min(max_wait, time_left)
+        bucket = self.bucket(api)
+        wait = bucket.reserve(max_wait)
+        if wait is None:
+            REQUESTS.inc(api=api, outcome="rejected")
+            raise UpstreamUnavailableError(f"Mapbox {api} quota is exhausted; try again shortly.", retry_after=bucket.next_free())
+        QUEUE_WAIT.observe(wait, api=api)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def get(self, api: str, url: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """GET a Mapbox URL under the API's rate limit; raises httpx.HTTPStatusError on error responses."""
+        await self._acquire(api)
+        params = {"access_token": self.api_key, **(params or {})}
+        started_at = time.perf_counter()
+        try:
+            response = await self._client.get(url, params=params)
+        except httpx.HTTPError:
+            REQUESTS.inc(api=api, outcome="error")
+            raise
+        finally:
+            LATENCY.observe(time.perf_counter() - started_at, api=api)
+        if response.status_code == 429:
+            reset_after = _reset_after(response.headers)
+            self.bucket(api).pause(reset_after)
+            REQUESTS.inc(api=api, outcome="rate_limited")
+            logger.warning(f"Mapbox {api} rate limit hit; pausing for {reset_after:.1f}s")
+            raise UpstreamUnavailableError(f"Mapbox {api} rate limit reached; try again shortly.", retry_after=reset_after)
+        REQUESTS.inc(api=api, outcome="ok" if response.is_success else "error")
+        response.raise_for_status()
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "queue_timeout": QUEUE_TIMEOUT,
+            "apis": {
+                api: {
+                    "rate_per_min": round(bucket.rate * 60, 1),
+                    "burst": bucket.capacity,
+                    "tokens": round(max(bucket.tokens, 0.0), 2),
+                    "next_free_seconds": round(bucket.next_free(), 3),
+                }
+                for api, bucket in sorted(self._buckets.items())
+            },
+        }
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+_client: Optional[MapboxClient] = None
+
+
+def get_client() -> MapboxClient:
+    """Returns the shared Mapbox client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = MapboxClient()
+    return _client
+
+
+async def close_client():
+    """Closes the shared client's connection pool. Called on application shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,320 @@
+# File: backend/upstream/mcp.py
+"""
+App-lifetime client for the MCP tool server behind POST /mcp-tool: one
+pooled keep-alive connection pool, a cap on concurrent tool calls,
+per-tool timeouts, and streamed responses so large tool outputs are passed
+through without being buffered. Results of tools opted in via
+MCP_CACHE_TOOLS are cached by tool name and canonical input.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Any, AsyncIterator, Dict, Optional
+import httpx
+from llm import resilience, cache as llm_cache
+from llm.resilience import DeadlineExceededError, UpstreamUnavailableError
+from metrics.registry import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:8001/invoke")
+# Tool calls in flight at once; further calls queue for up to MCP_QUEUE_TIMEOUT seconds, then get a 503.
+MAX_CONCURRENCY = int(os.getenv("MCP_MAX_CONCURRENCY", "16"))
+QUEUE_TIMEOUT = float(os.getenv("MCP_QUEUE_TIMEOUT", "5"))
+# Seconds until a tool's response must start; override per tool with MCP_<TOOL>_TIMEOUT
+# (e.g. MCP_DIRECTIONS_TOOL_TIMEOUT=60 for "directions_tool").
+DEFAULT_TOOL_TIMEOUT = float(os.getenv("MCP_TOOL_TIMEOUT", "30"))
+
+_NON_ALNUM_RE = re.compile(r"[^A-Z0-9]+")
+_TOOL_LABEL_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+REQUESTS = REGISTRY.counter(
+    "mcp_tool_calls_total",
+    "MCP tool calls by tool and outcome (ok, error, timeout, rejected).",
+    ("tool", "outcome"),
+)
+LATENCY = REGISTRY.histogram("mcp_tool_latency_seconds", "Time until the MCP server starts answering, by tool.", ("tool",))
+
+
+# --- Result Cache ---
+
+# Only tools listed here are cached (comma-separated names); everything else always reaches the server.
+CACHED_TOOLS = {tool.strip() for tool in os.getenv("MCP_CACHE_TOOLS", "").split(",") if tool.strip()}
+# Responses larger than this are streamed through but not stored; override per tool with MCP_<TOOL>_CACHE_MAX_BYTES.
+DEFAULT_CACHE_MAX_BYTES = int(os.getenv("MCP_CACHE_MAX_ENTRY_BYTES", str(256 * 1024)))
+# Bump when the stored entry format changes.
+CACHE_NAMESPACE = "mcp:v1"
+# Name reported in the Cache-Status response header (RFC 9211).
+CACHE_STATUS_NAME = "mcp-proxy"
+
+mcp_cache = llm_cache.build_cache("mcp", default_ttl=3600, default_max_entries=1024)
+
+
+class McpServerError(Exception):
+    """The MCP server could not be reached or answered with an error."""
+
+
+def _tool_label(tool: str) -> str:
+    # Tool names come from the client; keep odd ones out of the metric labels.
+    return tool if _TOOL_LABEL_RE.match(tool) else "other"
+
+
+def _tool_setting(tool: str, setting: str, default: float) -> float:
+    name = _NON_ALNUM_RE.sub("_", tool.upper()).strip("_")
+    try:
+        return float(os.getenv(f"MCP_{name}_{setting}", default))
+    except ValueError:
+        return default
+
+
+def tool_timeout(tool: str) -> float:
+    """The tool's MCP_<TOOL>_TIMEOUT, else MCP_TOOL_TIMEOUT."""
+    return _tool_setting(tool, "TIMEOUT", DEFAULT_TOOL_TIMEOUT)
+
+
+class ToolCachePolicy:
+    """How long one tool's results are cached, and the largest result worth storing."""
+
+    def __init__(self, tool: str, ttl: float, max_bytes: int):
+        self.tool = tool
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_env(cls, tool: str) -> "ToolCachePolicy":
+        return cls(
+            tool,
+            _tool_setting(tool, "CACHE_TTL", mcp_cache.ttl),
+            int(_tool_setting(tool, "CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES)),
+        )
+
+
+_policies: Dict[str, ToolCachePolicy] = {}
+
+
+def cache_policy(tool: str) -> Optional[ToolCachePolicy]:
+    """The tool's cache policy, or None when its results must not be cached (the default)."""
+    if tool not in CACHED_TOOLS:
+        return None
+    if tool not in _policies:
+        _policies[tool] = ToolCachePolicy.from_env(tool)
+    return _policies[tool]
+
+
+def cache_key(tool: str, tool_input: Dict[str, Any]) -> str:
+    """Key over the tool name and its input as canonical JSON, so key order and spacing don't matter."""
+    canonical = json.dumps(tool_input, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    digest = hashlib.sha256(f"{tool}\x00{canonical}".encode("utf-8")).hexdigest()
+    return f"{CACHE_NAMESPACE}:{tool}:{digest}"
+
+
+def cache_status(status: str) -> str:
+    """A Cache-Status header value, e.g. cache_status("hit") or cache_status("fwd=miss")."""
+    return f"{CACHE_STATUS_NAME}; {status}"
+
+
+class McpToolCall:
+    """
+    A tool call whose response headers have arrived. It holds one of the
+    client's concurrency slots until `close` runs, which closes the response
+    and frees the slot exactly once however many times it is called.
+    """
+
+    def __init__(self, client: "McpClient", tool: str, response: httpx.Response):
+        self.client = client
+        self.tool = tool
+        self.response = response
+        self.closed = False
+
+    async def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.response.aclose()
+        finally:
+            self.client._release()
+
+
+class McpClient:
+    """
+    Shared client for the MCP server.
+
+    A call first takes one of MAX_CONCURRENCY slots, holding it until its
+    response body has been fully streamed to the caller (or the caller
+    went away). The tool's timeout, shortened by the request deadline,
+    bounds the wait for the response to start; the body then streams for
+    as long as the server keeps sending.
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        self.url = url or MCP_SERVER_URL
+        limits = httpx.Limits(
+            max_connections=MAX_CONCURRENCY,
+            max_keepalive_connections=MAX_CONCURRENCY,
+            keepalive_expiry=60.0,
+        )
+        self._client = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(DEFAULT_TOOL_TIMEOUT, connect=3.0))
+        self._slots = asyncio.Semaphore(MAX_CONCURRENCY)
+        self.in_flight = 0
+
+    async def _acquire(self, tool: str):
+        max_wait = QUEUE_TIMEOUT
+        time_left = resilience.remaining()
+        if time_left is not None:
+            max_wait = min(max_wait, time_left)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), max(0.0, max_wait))
+        except asyncio.TimeoutError:
+            REQUESTS.inc(tool=_tool_label(tool), outcome="rejected")
+            raise UpstreamUnavailableError("The MCP server is at capacity; try again shortly.", retry_after=1.0)
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def _timeout(self, tool: str) -> float:
+        timeout = tool_timeout(tool)
+        time_left = resilience.remaining()
+        if time_left is not None:
+            timeout = min(timeout, time_left)
+        if timeout <= 0:
+            raise DeadlineExceededError(f"The MCP tool {tool} timed out.")
+        return timeout
+
+    async def invoke(self, tool: str, tool_input: dict) -> McpToolCall:
+        """
+        Starts a tool call and returns once the response headers arrive, with
+        the body unread. Stream it with `iter_body`; the caller must also
+        make sure the call's `close` runs (e.g. as the response's background
+        task), since a generator cut short by a disconnect may never finish.
+        """
+        label = _tool_label(tool)
+        timeout = self._timeout(tool)
+        await self._acquire(tool)
+        started_at = time.perf_counter()
+        try:
+            request = self._client.build_request(
+                "POST",
+                self.url,
+                json={"toolName": tool, "input": tool_input},
+                timeout=httpx.Timeout(timeout, connect=min(timeout, 3.0)),
+            )
+            # The client timeout applies per read; wait_for bounds the wait for the headers.
+            response = await asyncio.wait_for(self._client.send(request, stream=True), timeout)
+        except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+            self._release()
+            REQUESTS.inc(tool=label, outcome="timeout")
+            raise DeadlineExceededError(f"The MCP tool {tool} timed out after {timeout:.1f}s.") from e
+        except httpx.HTTPError as e:
+            self._release()
+            REQUESTS.inc(tool=label, outcome="error")
+            raise McpServerError(f"Error calling MCP server: {e}") from e
+        except BaseException:
+            self._release()
+            raise
+        LATENCY.observe(time.perf_counter() - started_at, tool=label)
+
+        if response.is_error:
+            try:
+                body = (await response.aread()).decode("utf-8", errors="replace")
+            except httpx.HTTPError:
+                body = ""
+            finally:
+                await response.aclose()
+                self._release()
+            REQUESTS.inc(tool=label, outcome="error")
+            raise McpServerError(f"Error calling MCP server: {response.status_code} {body[:500]}".rstrip())
+        return McpToolCall(self, tool, response)
+
+    async def iter_body(
+        self,
+        call: McpToolCall,
+        policy: Optional[ToolCachePolicy] = None,
+        key: Optional[str] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Yields the call's response body as it arrives, then closes the call.
+        With a cache policy and key, a complete body within the policy's
+        size limit is also stored in the MCP cache.
+        """
+        tool, response = call.tool, call.response
+        label = _tool_label(tool)
+        # Collect the body for the cache while it stays small enough to store.
+        collected = [] if policy is not None and key is not None else None
+        size = 0
+        try:
+            async for chunk in response.aiter_bytes():
+                if collected is not None:
+                    size += len(chunk)
+                    if size <= policy.max_bytes:
+                        collected.append(chunk)
+                    else:
+                        collected = None
+                yield chunk
+            REQUESTS.inc(tool=label, outcome="ok")
+            if collected is not None:
+                await self._store(key, policy, b"".join(collected), response.headers.get("content-type"))
+        except httpx.HTTPError as e:
+            # The status line has already been sent; all we can do is cut the stream short.
+            REQUESTS.inc(tool=label, outcome="error")
+            logger.error(f"MCP tool {tool} response broke off mid-stream: {e}")
+        finally:
+            await call.close()
+
+    async def _store(self, key: str, policy: ToolCachePolicy, body: bytes, media_type: Optional[str]):
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            return # Entries are stored as text so they survive the disk backend.
+        await mcp_cache.set(key, {"body": text, "media_type": media_type or "application/json"}, policy.ttl)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "url": self.url,
+            "max_concurrency": MAX_CONCURRENCY,
+            "in_flight": self.in_flight,
+            "queue_timeout": QUEUE_TIMEOUT,
+            "default_tool_timeout": DEFAULT_TOOL_TIMEOUT,
+            "cache": {
+                **mcp_cache.stats(),
+                "tools": {
+                    tool: {"ttl": policy.ttl, "max_bytes": policy.max_bytes}
+                    for tool, policy in ((tool, cache_policy(tool)) for tool in sorted(CACHED_TOOLS))
+                },
+            },
+        }
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+_client: Optional[McpClient] = None
+
+
+def _collect_in_flight():
+    return [({}, _client.in_flight if _client is not None else 0)]
+
+
+REGISTRY.collector("mcp_tool_calls_in_flight", "MCP tool calls currently holding a concurrency slot.", "gauge", _collect_in_flight)
+
+
+def get_client() -> McpClient:
+    """Returns the shared MCP client, creating it on first use."""
+    global _client
+    if _client is None:
+        _client = McpClient()
+    return _client
+
+
+async def close_client():
+    """Closes the shared client's connection pool. Called on application shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
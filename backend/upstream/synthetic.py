@@ -0,0 +1,297 @@
+# File: backend/upstream/synthetic.py
+"""
+Deterministic stand-in responses for the OpenAI and Mapbox APIs and radar feeds.
+
+Responses are shaped like the real APIs closely enough for the agents to
+parse them, and are derived from the request (a hash of the place name,
+the number of days in the prompt, ...) so repeated runs see the same data.
+"""
+import re
+import json
+import math
+import time
+import hashlib
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote
+import httpx
+from geo.geometry import DEFAULT_ROAD_FACTOR, PROFILE_SPEEDS, encode_polyline, haversine_m
+
+# Switzerland's bounding box (lon, lat), used for synthetic geocoding results.
+SWISS_BBOX = (5.96, 45.82, 10.49, 47.81)
+STREAM_CHUNK_CHARS = 24
+
+SAMPLE_ACTIVITIES = [
+    ("09:00", "Breakfast with a lake view", "A calm start with local pastries and coffee.", 45),
+    ("11:00", "Guided old town walk", "See the historic centre with a private guide.", 120),
+    ("13:00", "Lunch at a traditional Stübli", "Regional dishes in a cosy setting.", 80),
+    ("15:00", "Cable car to a panorama point", "Sweeping Alpine views on a clear afternoon.", 95),
+    ("19:30", "Dinner at a Michelin-starred restaurant", "An elegant finish to the day.", 260),
+]
+SAMPLE_SENTENCES = [
+    "Switzerland offers a wonderful mix of lakes, mountains and historic towns.",
+    "Trains run frequently and connect the major cities within a few hours.",
+    "Late spring and early autumn are pleasant times to visit.",
+    "Booking mountain excursions a few days ahead is recommended in high season.",
+    "Many luxury hotels can arrange private transfers from the airport.",
+]
+
+_DAYS_RE = re.compile(r"\b(\d{1,2})[-\s]?(?:days?|nights?)\b", re.IGNORECASE)
+_RIDE_RE = re.compile(r"\b(?:ride|taxi|cab|transfer|pick me up)\b", re.IGNORECASE)
+_FROM_TO_RE = re.compile(r"\bfrom\s+(.+?)\s+to\s+(.+?)(?:[.?!]|$)", re.IGNORECASE)
+
+
+def _seed(*parts: str) -> int:
+    return int.from_bytes(hashlib.sha256("\x1f".join(parts).encode("utf-8")).digest()[:8], "big")
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4))
+
+# --- OpenAI ---
+
+def _last_message(messages: List[dict], role: str) -> str:
+    for message in reversed(messages):
+        if message.get("role") == role and isinstance(message.get("content"), str):
+            return message["content"]
+    return ""
+
+
+def _itinerary(prompt: str, explain: bool = False) -> str:
+    match = _DAYS_RE.search(prompt)
+    days = min(int(match.group(1)), 14) if match else 3
+    itinerary = []
+    for day in range(1, days + 1):
+        activities = [
+            {"time": t, "description": description, "reason": reason, "price": price}
+            for t, description, reason, price in SAMPLE_ACTIVITIES
+        ]
+        itinerary.append({"day": day, "title": f"Day {day} in Switzerland", "activities": activities})
+    payload = {"itinerary_draft": itinerary}
+    if explain:
+        payload["explanation"] = f"Based on your request, we are suggesting a {days}-day plan mixing culture, scenery and fine dining."
+    return json.dumps(payload)
+
+
+def _ride_tool_call(prompt: str) -> dict:
+    match = _FROM_TO_RE.search(prompt)
+    pickup, destination = (match.group(1), match.group(2)) if match else ("my current position", "Zurich HB")
+    return {
+        "id": f"call_{_seed(prompt) % 10**12:012d}",
+        "type": "function",
+        "function": {
+            "name": "book_ride",
+            "arguments": json.dumps({"pickup_location": pickup.strip(), "destination_location": destination.strip()}),
+        },
+    }
+
+
+def _text(prompt: str, max_tokens: Optional[int]) -> str:
+    budget_chars = (max_tokens or 120) * 4
+    start = _seed(prompt) % len(SAMPLE_SENTENCES)
+    sentences = []
+    for i in range(len(SAMPLE_SENTENCES)):
+        sentence = SAMPLE_SENTENCES[(start + i) % len(SAMPLE_SENTENCES)]
+        if sentences and len(" ".join(sentences + [sentence])) > budget_chars:
+            break
+        sentences.append(sentence)
+    return " ".join(sentences)
+
+
+def _completion_message(body: dict) -> Tuple[Optional[str], Optional[List[dict]]]:
+    """Picks a plausible answer for the request from its system prompt, tools and format."""
+    messages = body.get("messages", [])
+    system = _last_message(messages, "system")
+    prompt = _last_message(messages, "user")
+    json_mode = (body.get("response_format") or {}).get("type") in ("json_object", "json_schema")
+
+    if body.get("tools") and _RIDE_RE.search(prompt):
+        return None, [_ride_tool_call(prompt)]
+    if "itinerary_draft" in system:
+        return _itinerary(prompt, explain='"explanation"' in system), None
+    if json_mode and '"results"' in system:
+        count = sum(1 for line in prompt.splitlines() if line.strip())
+        results = [{"index": i, "mood": "Neutral", "color_suggestion": "#808080"} for i in range(count)]
+        return json.dumps({"results": results}), None
+    if json_mode and "color_suggestion" in system:
+        return json.dumps({"mood": "Neutral", "color_suggestion": "#808080"}), None
+    if json_mode:
+        return json.dumps({"response": _text(prompt, body.get("max_tokens"))}), None
+    if "title" in system.lower():
+        return "Swiss Alpine Getaway", None
+    return _text(prompt, body.get("max_tokens")), None
+
+
+def _usage(body: dict, content: str) -> dict:
+    prompt_tokens = sum(_estimate_tokens(str(m.get("content") or "")) for m in body.get("messages", []))
+    completion_tokens = _estimate_tokens(content)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+def openai_chat_completion(body: dict) -> Tuple[dict, List[dict]]:
+    """Returns (completion, stream chunks) for a chat completion request body."""
+    content, tool_calls = _completion_message(body)
+    model = body.get("model", "gpt-4o-mini")
+    completion_id = f"chatcmpl-synthetic-{_seed(json.dumps(body, sort_keys=True)) % 10**12:012d}"
+    created = int(time.time())
+    usage = _usage(body, content or json.dumps(tool_calls))
+    finish_reason = "tool_calls" if tool_calls else "stop"
+
+    message = {"role": "assistant", "content": content}
+    if tool_calls:
+        message["tool_calls"] = tool_calls
+    completion = {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+        "usage": usage,
+    }
+
+    def chunk(delta: dict, finish: Optional[str] = None, chunk_usage: Optional[dict] = None) -> dict:
+        choices = [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish, "logprobs": None}]
+        return {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": choices, "usage": chunk_usage}
+
+    chunks = [chunk({"role": "assistant", "content": ""})]
+    if tool_calls:
+        chunks.append(chunk({"tool_calls": [{"index": 0, **tool_calls[0]}]}))
+    for start in range(0, len(content or ""), STREAM_CHUNK_CHARS):
+        chunks.append(chunk({"content": content[start:start + STREAM_CHUNK_CHARS]}))
+    chunks.append(chunk({}, finish=finish_reason))
+    if (body.get("stream_options") or {}).get("include_usage"):
+        chunks.append(chunk({}, chunk_usage=usage))
+    return completion, chunks
+
+# --- Mapbox ---
+
+def geocode_coordinates(query: str) -> Tuple[float, float]:
+    """A stable (lon, lat) inside Switzerland for a place name."""
+    digest = hashlib.sha256(" ".join(query.lower().split()).encode("utf-8")).digest()
+    min_lon, min_lat, max_lon, max_lat = SWISS_BBOX
+    lon = min_lon + (max_lon - min_lon) * int.from_bytes(digest[:4], "big") / 0xFFFFFFFF
+    lat = min_lat + (max_lat - min_lat) * int.from_bytes(digest[4:8], "big") / 0xFFFFFFFF
+    return round(lon, 6), round(lat, 6)
+
+
+def mapbox_geocoding(query: str, params: Dict[str, str]) -> dict:
+    query = unquote(query)
+    lon, lat = geocode_coordinates(query)
+    feature = {
+        "id": f"place.{_seed(query) % 10**9}",
+        "type": "Feature",
+        "place_type": ["place"],
+        "relevance": 1,
+        "text": query,
+        "place_name": f"{query}, Switzerland",
+        "center": [lon, lat],
+        "geometry": {"type": "Point", "coordinates": [lon, lat]},
+    }
+    return {"type": "FeatureCollection", "query": query.lower().split(), "features": [feature], "attribution": "synthetic"}
+
+
+def mapbox_directions(profile: str, coordinates: str, params: Dict[str, str]) -> dict:
+    points = [tuple(float(v) for v in pair.split(",")) for pair in unquote(coordinates).split(";")]
+    speed = PROFILE_SPEEDS.get(profile, PROFILE_SPEEDS["driving"])
+
+    geometry_points: List[List[float]] = []
+    legs = []
+    for start, end in zip(points, points[1:]):
+        distance = haversine_m(start, end) * DEFAULT_ROAD_FACTOR
+        legs.append({"distance": round(distance, 1), "duration": round(distance / speed, 1), "summary": "", "steps": [], "weight": round(distance / speed, 1)})
+        # Roughly one vertex every 500 m, like a simplified road geometry.
+        steps = max(2, min(500, int(distance / 500)))
+        for i in range(0 if not geometry_points else 1, steps + 1):
+            t = i / steps
+            geometry_points.append([round(start[0] + (end[0] - start[0]) * t, 6), round(start[1] + (end[1] - start[1]) * t, 6)])
+
+    distance = sum(leg["distance"] for leg in legs)
+    duration = sum(leg["duration"] for leg in legs)
+    if params.get("geometries") == "polyline":
+        geometry = encode_polyline(geometry_points)
+    elif params.get("geometries") == "polyline6":
+        geometry = encode_polyline(geometry_points, precision=6)
+    else:
+        geometry = {"type": "LineString", "coordinates": geometry_points}
+    route = {
+        "distance": round(distance, 1),
+        "duration": round(duration, 1),
+        "weight": round(duration, 1),
+        "weight_name": "auto",
+        "geometry": geometry,
+        "legs": legs,
+    }
+    waypoints = [{"name": "", "location": [p[0], p[1]], "distance": 0} for p in points]
+    return {"code": "Ok", "routes": [route], "waypoints": waypoints, "uuid": "synthetic"}
+
+def mapbox_matrix(profile: str, coordinates: str, params: Dict[str, str]) -> dict:
+    points = [tuple(float(v) for v in pair.split(",")) for pair in unquote(coordinates).split(";")]
+    speed = PROFILE_SPEEDS.get(profile, PROFILE_SPEEDS["driving"])
+
+    def indexes(name: str) -> List[int]:
+        value = params.get(name, "all")
+        return list(range(len(points))) if value == "all" else [int(i) for i in value.split(";")]
+
+    sources, destinations = indexes("sources"), indexes("destinations")
+    distances = [[round(haversine_m(points[i], points[j]) * DEFAULT_ROAD_FACTOR, 1) for j in destinations] for i in sources]
+    response = {
+        "code": "Ok",
+        "sources": [{"name": "", "location": list(points[i]), "distance": 0} for i in sources],
+        "destinations": [{"name": "", "location": list(points[j]), "distance": 0} for j in destinations],
+        "durations": [[round(d / speed, 1) for d in row] for row in distances],
+    }
+    if "distance" in params.get("annotations", "duration").split(","):
+        response["distances"] = distances
+    return response
+
+# --- Radar Feeds ---
+
+def radar_feed_snapshot(request: httpx.Request) -> dict:
+    """A generic feed snapshot that changes with the requested URL and the hour, like a live feed would."""
+    url = str(request.url)
+    hour = str(int(time.time() // 3600))
+    seed = _seed(url, hour)
+    return {
+        "source": request.url.host,
+        "query": dict(request.url.params),
+        "value": seed % 1000,
+        "updated_at": int(hour) * 3600,
+    }
+
+# --- Dispatch ---
+
+_GEOCODING_PATH_RE = re.compile(r"^/geocoding/v5/[^/]+/(.+)\.json$")
+_DIRECTIONS_PATH_RE = re.compile(r"^/directions/v5/mapbox/([^/]+)/(.+?)(?:\.json)?$")
+_MATRIX_PATH_RE = re.compile(r"^/directions-matrix/v1/mapbox/([^/]+)/(.+?)(?:\.json)?$")
+
+
+def respond(service: str, request: httpx.Request, body: bytes) -> Tuple[int, dict, List[dict]]:
+    """
+    Builds a synthetic response for `request`.
+
+    Returns (status code, JSON body, stream chunks). The chunk list is only
+    used for streaming chat completions.
+    """
+    path = request.url.path
+    params = dict(request.url.params)
+    if service == "openai" and path.endswith("/chat/completions"):
+        completion, chunks = openai_chat_completion(json.loads(body or b"{}"))
+        return 200, completion, chunks
+    if service == "mapbox":
+        match = _GEOCODING_PATH_RE.match(path)
+        if match:
+            return 200, mapbox_geocoding(match.group(1), params), []
+        match = _DIRECTIONS_PATH_RE.match(path)
+        if match:
+            try:
+                return 200, mapbox_directions(match.group(1), match.group(2), params), []
+            except ValueError:
+                return 422, {"code": "InvalidInput", "message": "Coordinates are invalid."}, []
+        match = _MATRIX_PATH_RE.match(path)
+        if match:
+            try:
+                return 200, mapbox_matrix(match.group(1), match.group(2), params), []
+            except (ValueError, IndexError):
+                return 422, {"code": "InvalidInput", "message": "Coordinates or indexes are invalid."}, []
+    if service == "radar":
+        return 200, radar_feed_snapshot(request), []
+    return 404, {"message": f"No synthetic {service} response for {request.method} {path}"}, []
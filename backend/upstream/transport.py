@@ -0,0 +1,260 @@
+# File: backend/upstream/transport.py
+"""
+Pluggable upstream layer for the OpenAI and Mapbox HTTP clients.
+
+UPSTREAM_MODE selects how outbound calls are served:
+
+    live       real APIs (default)
+    record     real APIs; every response is also written to a fixture file
+    replay     recorded fixtures; misses fall back to synthetic responses
+               (or fail, with UPSTREAM_REPLAY_FALLBACK=error)
+    synthetic  generated responses only, no network and no API keys needed
+
+Replayed and synthetic responses are delayed according to UPSTREAM_LATENCY
+(see upstream.latency), overridable per service with UPSTREAM_LATENCY_OPENAI
+and UPSTREAM_LATENCY_MAPBOX, so load tests see realistic upstream timing
+without spending real quota.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import base64
+import hashlib
+import logging
+from typing import List, Optional
+from urllib.parse import urlencode
+import httpx
+from dotenv import load_dotenv
+from metrics.registry import REGISTRY
+from upstream import synthetic
+from upstream.latency import LatencyDistribution
+
+# --- Setup ---
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+MODES = ("live", "record", "replay", "synthetic")
+# Query parameters that must never end up in a fixture or its key.
+SECRET_PARAMS = {"access_token", "api_key", "key"}
+# Headers that no longer apply once the body has been read and decoded.
+DROPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+STREAM_FIRST_CHUNK_SHARE = 0.3
+
+RESPONSES = REGISTRY.counter(
+    "upstream_stub_responses_total",
+    "Upstream responses served by the record/replay layer, by service and source (recorded, replayed, synthetic, missing).",
+    ("service", "source"),
+)
+
+
+def get_mode() -> str:
+    mode = os.getenv("UPSTREAM_MODE", "live").lower()
+    if mode not in MODES:
+        logger.warning(f"Unknown UPSTREAM_MODE {mode!r}; using live upstreams")
+        return "live"
+    return mode
+
+
+def is_offline() -> bool:
+    """True when upstream calls never reach the real APIs, so API keys are optional."""
+    return get_mode() in ("replay", "synthetic")
+
+
+def fixture_key(request: httpx.Request, body: bytes) -> str:
+    """
+    Stable key for a request: method, host, path, sorted query (minus secrets)
+    and the canonical JSON body. Header differences are ignored.
+    """
+    params = sorted((k, v) for k, v in request.url.params.multi_items() if k not in SECRET_PARAMS)
+    try:
+        canonical_body = json.dumps(json.loads(body), sort_keys=True, separators=(",", ":")) if body else ""
+    except ValueError:
+        canonical_body = body.decode("utf-8", errors="replace")
+    material = "\n".join([request.method, request.url.host, request.url.path, urlencode(params), canonical_body])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _sanitized_url(request: httpx.Request) -> str:
+    params = [(k, v) for k, v in request.url.params.multi_items() if k not in SECRET_PARAMS]
+    return str(request.url.copy_with(query=urlencode(params).encode("ascii") or None))
+
+
+class _ChunkStream(httpx.AsyncByteStream):
+    """Yields server-sent-event chunks with a delay between them, like a live token stream."""
+
+    def __init__(self, chunks: List[bytes], first_delay: float, chunk_delay: float):
+        self.chunks = chunks
+        self.first_delay = first_delay
+        self.chunk_delay = chunk_delay
+
+    async def __aiter__(self):
+        for i, chunk in enumerate(self.chunks):
+            delay = self.first_delay if i == 0 else self.chunk_delay
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield chunk
+
+
+class UpstreamTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that records, replays or synthesizes upstream responses.
+
+    Fixtures are JSON files under `{fixtures_dir}/{service}/{key}.json` holding
+    the sanitized request, the decoded response and the time the real call took.
+    Recording reads each response fully before returning it, so streamed
+    completions arrive in one piece while recording.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        mode: str,
+        fixtures_dir: str,
+        latency: Optional[LatencyDistribution] = None,
+        replay_fallback: str = "synthetic",
+        inner: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.service = service
+        self.mode = mode
+        self.directory = os.path.join(fixtures_dir, service)
+        # None replays each fixture with its recorded latency.
+        self.latency = latency
+        self.replay_fallback = replay_fallback
+        self.inner = inner
+        if mode == "record" and inner is None:
+            self.inner = httpx.AsyncHTTPTransport()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        key = fixture_key(request, body)
+        if self.mode == "record":
+            return await self._record(request, body, key)
+
+        if self.mode == "replay":
+            fixture = await asyncio.to_thread(self._load, key)
+            if fixture is not None:
+                RESPONSES.inc(service=self.service, source="replayed")
+                return await self._replay(fixture)
+            if self.replay_fallback != "synthetic":
+                RESPONSES.inc(service=self.service, source="missing")
+                logger.warning(f"No {self.service} fixture for {request.method} {_sanitized_url(request)} ({key})")
+                return httpx.Response(404, json={"error": {"message": f"No recorded {self.service} fixture for this request ({key})."}})
+
+        RESPONSES.inc(service=self.service, source="synthetic")
+        return await self._synthesize(request, body)
+
+    # --- Record ---
+
+    async def _record(self, request: httpx.Request, body: bytes, key: str) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        elapsed = time.perf_counter() - started
+
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in DROPPED_HEADERS}
+        fixture = {
+            "request": {"method": request.method, "url": _sanitized_url(request), "body": body.decode("utf-8", errors="replace")},
+            "response": {"status": response.status_code, "headers": headers},
+            "elapsed": round(elapsed, 4),
+        }
+        try:
+            fixture["response"]["body"] = content.decode("utf-8")
+        except UnicodeDecodeError:
+            fixture["response"]["body_b64"] = base64.b64encode(content).decode("ascii")
+        await asyncio.to_thread(self._save, key, fixture)
+        RESPONSES.inc(service=self.service, source="recorded")
+        return httpx.Response(response.status_code, headers=headers, content=content)
+
+    def _save(self, key: str, fixture: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(fixture, f, indent=2)
+        os.replace(tmp_path, self._path(key))
+
+    # --- Replay ---
+
+    def _load(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._path(key), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    async def _replay(self, fixture: dict) -> httpx.Response:
+        delay = self.latency.sample() if self.latency else fixture.get("elapsed", 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        recorded = fixture["response"]
+        if "body_b64" in recorded:
+            content = base64.b64decode(recorded["body_b64"])
+        else:
+            content = recorded.get("body", "").encode("utf-8")
+        return httpx.Response(recorded["status"], headers=recorded["headers"], content=content)
+
+    # --- Synthetic ---
+
+    async def _synthesize(self, request: httpx.Request, body: bytes) -> httpx.Response:
+        status, payload, chunks = synthetic.respond(self.service, request, body)
+        delay = self.latency.sample() if self.latency else 0.0
+        streaming = status == 200 and chunks and json.loads(body or b"{}").get("stream")
+        if not streaming:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            return httpx.Response(status, json=payload)
+
+        events = [f"data: {json.dumps(chunk)}\n\n".encode("utf-8") for chunk in chunks] + [b"data: [DONE]\n\n"]
+        first_delay = delay * STREAM_FIRST_CHUNK_SHARE
+        chunk_delay = (delay - first_delay) / max(1, len(events) - 1)
+        return httpx.Response(
+            200,
+            headers={"content-type": "text/event-stream"},
+            stream=_ChunkStream(events, first_delay, chunk_delay),
+        )
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+
+def _latency_for(service: str, rng: random.Random) -> Optional[LatencyDistribution]:
+    spec = os.getenv(f"UPSTREAM_LATENCY_{service.upper()}") or os.getenv("UPSTREAM_LATENCY")
+    if not spec or spec.strip().lower() == "recorded":
+        return None
+    try:
+        return LatencyDistribution.parse(spec, rng)
+    except ValueError as e:
+        logger.warning(f"{e} Using no added latency for {service}.")
+        return None
+
+
+def build_transport(service: str, **transport_kwargs) -> Optional[httpx.AsyncBaseTransport]:
+    """
+    Returns the transport for an upstream service's httpx client, or None in
+    live mode so the client keeps its default transport.
+
+    `transport_kwargs` (e.g. `limits`) configure the real transport used while recording.
+    """
+    mode = get_mode()
+    if mode == "live":
+        return None
+    seed = os.getenv("UPSTREAM_SEED")
+    rng = random.Random(f"{seed}:{service}") if seed else random.Random()
+    inner = httpx.AsyncHTTPTransport(**transport_kwargs) if mode == "record" else None
+    logger.info(f"Serving {service} upstream calls in {mode} mode")
+    return UpstreamTransport(
+        service,
+        mode,
+        fixtures_dir=os.getenv("UPSTREAM_FIXTURES_DIR", os.path.join("fixtures", "upstream")),
+        latency=_latency_for(service, rng),
+        replay_fallback=os.getenv("UPSTREAM_REPLAY_FALLBACK", "synthetic").lower(),
+        inner=inner,
+    )